@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+@description: Benchmark of the Output-Format Engine. Converts synthetic float output into every bit depth (with and without
+              TPDF-Dither), writes it as .wav and reports the written bytes/sec and the realtime factor for each format.
+@usage: python benchmarks/bench_formats.py [--seconds 120] [--samplerate 48000] [--blocksize 65536] [--json results.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from midiAuralize.formats import BIT_DEPTHS, SampleConverter
+from midiAuralize.wav import WavWriter
+
+def benchFormat(audio_output, path, samplerate, bitdepth, blocksize, dither): # converts & writes audio_output once, returns [seconds, bytes]
+    start_time = time.perf_counter()
+    converter = SampleConverter(bitdepth, audio_output.shape[0], blocksize, dither, seed=0)
+    nframes = audio_output.shape[1]
+    with WavWriter(path, samplerate, audio_output.shape[0], converter.sampwidth, nframes, format_tag=converter.format_tag) as writer:
+        for start in range(0, nframes, blocksize):
+            writer.write(converter.convert(audio_output[:, start:start+blocksize]))
+    elapsed = time.perf_counter() - start_time
+    return [elapsed, os.path.getsize(path)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the Output-Format Engine")
+    parser.add_argument("--seconds", type=float, default=120., help="length of the synthetic output (default: 120)")
+    parser.add_argument("--samplerate", type=int, default=48000)
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--blocksize", type=int, default=65536)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per format, the fastest one is reported (default: 3)")
+    parser.add_argument("--json", help="stores the results in a .json-File")
+    args = parser.parse_args()
+
+    nframes = int(args.seconds * args.samplerate)
+    rng = np.random.default_rng(0)
+    audio_output = (rng.standard_normal((args.channels, nframes), dtype=np.float32) * 0.3).clip(-1.2, 1.2) # includes some clipping
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.wav")
+        for bitdepth in BIT_DEPTHS:
+            for dither in ([False, True] if bitdepth in ("8", "16", "24") else [False]):
+                elapsed, size = min(benchFormat(audio_output, path, args.samplerate, bitdepth, args.blocksize, dither) for i in range(args.repeat))
+                results.append({"bitdepth": bitdepth, "dither": dither, "seconds": elapsed, "bytes": size,
+                                "bytes_per_sec": size / elapsed, "realtime_factor": args.seconds / elapsed})
+                print(f"{bitdepth:>4} bit{' + dither' if dither else '         '}: {size / elapsed / 1048576:8.1f} MB/s, "
+                      f"{args.seconds / elapsed:8.1f}x realtime")
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump({"settings": vars(args), "results": results}, json_file, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+@description: Benchmark of the full render pipeline (tempo rewrite, MIDI load, render, conversion, .wav write, hashing,
+              protocol write) on a reproducible synthetic MIDI corpus, from short & sparse to long & dense piano-roll files.
+              Real VST-Instruments aren't needed: a Faust-Synth in the dawdreamer RenderEngine or a numpy oscillator
+              stand-in (no plugin host at all) is rendered instead. Reports files/sec, realtime factor, peak RSS and the
+              seconds per stage, the results can be stored as .json and compared with the results of another commit.
+@usage: python benchmarks/bench_pipeline.py [--instrument faust|numpy] [--files 2] [--scale 1.0] [--long] [--json results.json]
+        [--formats flac,mp3] [--compare baseline.json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+import mido
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from midiAuralize.core import Auralizer
+from midiAuralize.protocol import ProtocolStore, PROTOCOL_FILE
+
+TEMPO = 120 # BPM of the corpus, the pipeline rewrites it to the same value
+TICKS_PER_BEAT = 480 # the processed MIDI-Files of the pipeline use the mido default
+CORPUS = [ # [class, seconds, notes per second]
+    ["short-sparse", 10, 1],
+    ["short-dense", 10, 20],
+    ["medium-sparse", 300, 1],
+    ["medium-dense", 300, 20]
+    ]
+LONG_CORPUS = [["long-dense", 7200, 20]] # multi-hour files, only with --long
+STAGES = ["read", "cache", "tempo", "load", "render", "convert", "write", "encode", "protocol"]
+
+FAUST_DSP = """
+import("stdfaust.lib");
+freq = hslider("freq", 440, 20, 20000, 0.01);
+gain = hslider("gain", 0.5, 0, 1, 0.01);
+gate = button("gate");
+envelope = en.adsr(0.005, 0.3, 0.4, 0.5, gate) * gain;
+process = (os.triangle(freq) + 0.3 * os.osc(2 * freq)) * envelope * 0.3 <: _, _;
+"""
+
+def makeMidi(path, seconds, density, rng): # writes a piano-roll style MIDI-File with density notes per second (chords, sustain pedal)
+    events = [] # [seconds, order, message], note_off before note_on at the same time
+    t = 0.
+    while True:
+        t += rng.expovariate(density)
+        if t >= seconds:
+            break
+        root = rng.randint(36, 84)
+        for pitch in sorted({root + rng.choice([0, 3, 4, 7, 12]) for i in range(rng.randint(1, 4))}):
+            length = min(rng.uniform(0.05, 2.), seconds - t)
+            velocity = rng.randint(20, 120)
+            events.append([t, 1, mido.Message('note_on', note=pitch, velocity=velocity)])
+            events.append([t + length, 0, mido.Message('note_off', note=pitch, velocity=0)])
+    for pedal in range(0, int(seconds), 8):
+        events.append([float(pedal), 0, mido.Message('control_change', control=64, value=127)])
+        events.append([pedal + 6., 0, mido.Message('control_change', control=64, value=0)])
+    events.sort(key=lambda i: (i[0], i[1]))
+
+    mid = mido.MidiFile(ticks_per_beat=TICKS_PER_BEAT)
+    track = mido.MidiTrack()
+    mid.tracks.append(track)
+    track.append(mido.MetaMessage('set_tempo', tempo=mido.bpm2tempo(TEMPO), time=0))
+    ticks_per_second = TICKS_PER_BEAT * TEMPO / 60.
+    last_tick = 0
+    for seconds_event, order, msg in events:
+        tick = int(round(seconds_event * ticks_per_second))
+        track.append(msg.copy(time=tick - last_tick))
+        last_tick = tick
+    track.append(mido.MetaMessage('end_of_track', time=0))
+    mid.save(path)
+    return mid.length
+
+def makeCorpus(folder, corpus, files, scale, seed): # generates files MIDI-Files per class, returns [[path, class, MIDI length in seconds]]
+    rng = random.Random(seed)
+    midifiles = []
+    for name, seconds, density in corpus:
+        for i in range(files):
+            path = os.path.join(folder, f"{name}_{i:03d}.mid")
+            midifiles.append([path, name, makeMidi(path, seconds * scale, density, rng)])
+    return midifiles
+
+class OscillatorProcessor: # numpy stand-in of a plugin processor: decaying sine partials per note, sustain pedal is ignored
+    def __init__(self, samplerate):
+        self.samplerate = samplerate
+        self.notes = [] # [start, end, pitch, velocity] in seconds
+        length = int(2.5 * samplerate) # max. note length incl. release
+        t = np.arange(length, dtype=np.float32) / samplerate
+        envelope = np.exp(-3. * t, dtype=np.float32)
+        freqs = 440. * 2**((np.arange(128, dtype=np.float32) - 69) / 12.)
+        self.tables = (np.sin(2 * np.pi * freqs[:, None] * t[None, :]) * envelope * 0.1).astype(np.float32) # 128 x length
+
+    def load_midi(self, path, clear_previous=True, beats=False, all_events=True):
+        self.notes = []
+        started = {}
+        t = 0.
+        for msg in mido.MidiFile(path):
+            t += msg.time
+            if msg.type == 'note_on' and msg.velocity > 0:
+                started[msg.note] = [t, msg.velocity]
+            elif msg.type in ('note_on', 'note_off') and msg.note in started:
+                start, velocity = started.pop(msg.note)
+                self.notes.append([start, t, msg.note, velocity])
+        return True
+
+    def render(self, nframes):
+        audio = np.zeros((2, nframes), dtype=np.float32)
+        table_length = self.tables.shape[1]
+        for start, end, pitch, velocity in self.notes:
+            start_frame = int(start * self.samplerate)
+            length = min(int((end - start + 0.5) * self.samplerate), table_length, nframes - start_frame)
+            if length > 0:
+                audio[:, start_frame:start_frame+length] += self.tables[pitch, :length] * (velocity / 127.)
+        return audio
+
+class OscillatorEngine: # numpy stand-in of the dawdreamer RenderEngine for an OscillatorProcessor
+    def __init__(self, samplerate, processor):
+        self.samplerate = samplerate
+        self.processor = processor
+        self.audio = None
+
+    def load_graph(self, graph):
+        return True
+
+    def render(self, seconds):
+        self.audio = self.processor.render(int(round(seconds * self.samplerate)))
+        return True
+
+    def get_audio(self):
+        return self.audio
+
+def loadStandIn(auralizer, instrument): # loads the stand-in instrument into the Auralizer
+    if instrument == "numpy":
+        processor = OscillatorProcessor(auralizer.samplerate)
+        auralizer.engine = OscillatorEngine(auralizer.samplerate, processor)
+        return auralizer.loadProcessor("numpy-oscillator", processor, "bench-1")
+    faust = auralizer.engine.make_faust_processor("faust")
+    faust.num_voices = 16
+    faust.set_dsp_string(FAUST_DSP)
+    if hasattr(faust, "compile"):
+        faust.compile()
+    return auralizer.loadProcessor("faust-synth", faust, "bench-1")
+
+def peakMemory(): # peak resident memory of this process in bytes, None if it can't be determined
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError: # Windows
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset
+
+def gitCommit(): # commit of the benchmarked tree, None outside of a git repository
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def summarize(files, elapsed): # totals of the benchmarked files: files/sec, realtime factor & seconds per stage
+    audio_seconds = sum(i["seconds"] for i in files)
+    return {"files": len(files), "seconds": elapsed, "audio_seconds": audio_seconds,
+            "files_per_sec": len(files) / elapsed, "realtime_factor": audio_seconds / elapsed,
+            "stages": {stage: sum(i["stages"].get(stage, 0.) for i in files) for stage in STAGES}}
+
+def compare(results, baseline_path): # prints the ratio of the current results to the results of another run
+    with open(baseline_path) as json_file:
+        baseline = json.load(json_file)
+    print(f"\nCompared to {baseline.get('commit') or baseline_path} (> 1: faster):")
+    for name in ["files_per_sec", "realtime_factor"]:
+        print(f"{name:>16}: {results['total'][name] / baseline['results']['total'][name]:6.2f}x")
+    for stage in STAGES:
+        current, before = results['total']['stages'][stage], baseline['results']['total']['stages'].get(stage, 0.)
+        if current > 0 and before > 0:
+            print(f"{stage:>16}: {before / current:6.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the render pipeline")
+    parser.add_argument("--instrument", choices=["faust", "numpy"], default="faust", help="stand-in instrument (default: faust)")
+    parser.add_argument("--files", type=int, default=2, help="MIDI-Files per corpus class (default: 2)")
+    parser.add_argument("--scale", type=float, default=1., help="factor for the length of all corpus files (default: 1.0)")
+    parser.add_argument("--long", action="store_true", help="adds multi-hour files to the corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--samplerate", type=int, default=44100)
+    parser.add_argument("--bitdepth", default="16")
+    parser.add_argument("--chunksize", type=int, default=1024)
+    parser.add_argument("--blocksize", type=int, default=65536)
+    parser.add_argument("--hash", default="md5", help="hash algorithm (default: md5)")
+    parser.add_argument("--formats", default="", help="additional output formats encoded with ffmpeg, e.g. flac,mp3 (default: none)")
+    parser.add_argument("--json", help="stores the results in a .json-File")
+    parser.add_argument("--compare", help=".json-File of an earlier run to compare with")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in ["corpus", "output", "db"]:
+            os.mkdir(os.path.join(tmp, i))
+        midifiles = makeCorpus(os.path.join(tmp, "corpus"), CORPUS + (LONG_CORPUS if args.long else []), args.files, args.scale, args.seed)
+        auralizer = Auralizer(os.path.join(tmp, "vst"), os.path.join(tmp, "output"), args.samplerate, args.bitdepth, args.chunksize,
+                              args.blocksize, args.hash, formats=args.formats)
+        loadStandIn(auralizer, args.instrument)
+        protocol = ProtocolStore(os.path.join(tmp, "db", PROTOCOL_FILE))
+
+        files = []
+        start_time = time.perf_counter()
+        for midi, name, seconds in midifiles:
+            file_start = time.perf_counter()
+            outpath, hash_audio, entry = auralizer.auralize(midi, TEMPO, {}, auralizer.pluginVersion())
+            stages = dict(auralizer.timings)
+            protocol_start = time.perf_counter()
+            protocol.add(hash_audio, entry)
+            stages["protocol"] = time.perf_counter() - protocol_start
+            file_elapsed = time.perf_counter() - file_start
+            files.append({"class": name, "seconds": entry["tail"] + seconds, "elapsed": file_elapsed,
+                          "bytes": os.path.getsize(outpath), "stages": stages})
+            print(f"{os.path.basename(midi):>24}: {file_elapsed:8.2f} s, {files[-1]['seconds'] / file_elapsed:8.1f}x realtime")
+        elapsed = time.perf_counter() - start_time
+        protocol.close()
+
+    results = {"total": summarize(files, elapsed), "peak_rss": peakMemory(),
+               "classes": {name: summarize([i for i in files if i["class"] == name], sum(i["elapsed"] for i in files if i["class"] == name))
+                           for name in dict.fromkeys(i["class"] for i in files)}}
+    total = results["total"]
+    print(f"\n{total['files']} files in {total['seconds']:.2f} s: {total['files_per_sec']:.2f} files/sec, "
+          f"{total['realtime_factor']:.1f}x realtime, peak RSS {(results['peak_rss'] or 0) / 1048576:.0f} MB")
+    for stage in STAGES:
+        print(f"{stage:>16}: {total['stages'][stage]:8.2f} s ({total['stages'][stage] / total['seconds'] * 100:5.1f} %)")
+
+    if args.compare:
+        compare(results, args.compare)
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump({"settings": vars(args), "commit": gitCommit(), "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                       "results": results, "files": files}, json_file, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+@description: Startup benchmark of the GUI. Launches midiAuralizer.py repeatedly with MIDIAURALIZER_BENCHMARK_STARTUP set,
+              the app quits as soon as the first Instrument is loaded and reports the seconds since its start until the
+              imports are done, the first window is shown and the app is ready. The import of the Render Core is measured separately.
+@usage: python benchmarks/bench_startup.py [--repeat 5] [--json results.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MARKS = ["imports", "window", "ready"]
+
+def runApp(): # starts the GUI once and returns its startup marks {mark: seconds}
+    env = dict(os.environ, MIDIAURALIZER_BENCHMARK_STARTUP="1")
+    output = subprocess.run([sys.executable, os.path.join(ROOT, "midiAuralizer.py")], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    for line in reversed(output.splitlines()):
+        if line.startswith("{"):
+            return json.loads(line)
+    raise RuntimeError("midiAuralizer.py didn't report its startup times:\n" + output)
+
+def timeImport(module): # seconds a fresh interpreter needs to import module (interpreter startup excluded)
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return float(output.split()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup benchmark of the GUI")
+    parser.add_argument("--repeat", type=int, default=5, help="number of app starts, the median is reported (default: 5)")
+    parser.add_argument("--json", help="stores the results in a .json-File")
+    args = parser.parse_args()
+
+    runs = [runApp() for i in range(args.repeat)]
+    results = {mark: statistics.median(run[mark] for run in runs) for mark in MARKS}
+    results["import_core"] = statistics.median(timeImport("midiAuralize.core") for i in range(args.repeat))
+    for mark, seconds in results.items():
+        print(f"{mark:>12}: {seconds * 1000:8.1f} ms")
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump({"settings": vars(args), "created": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results, "runs": runs},
+                      json_file, indent=4)
+
+if __name__ == "__main__":
+    main()
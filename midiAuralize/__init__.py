@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""
+@description: GUI-independent Core of midiAuralizer. The Qt-Application (midiAuralizer.py) and the Commandline-Version
+              (python -m midiAuralize / midiAuralizer render) both run their Auralizations through this package.
+@license: GNU GPLv3
+"""
+version = "0.0.1"
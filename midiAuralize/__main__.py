@@ -0,0 +1,5 @@
+import sys
+from .cli import main
+
+if __name__ == "__main__": # guard is needed, worker processes re-import this module
+    sys.exit(main())
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+@description: Content-addressed Render-Cache. A render is identified by a canonical digest of everything that determines
+              its output (MIDI hash, plugin name & version, parameters, tempo, samplerate, bit depth, ...). Rendered files
+              are hardlinked into the cache folder, so a repeated render is restored from there instead of rendered again.
+              The cache folder is kept below a size limit by evicting the least recently used files.
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import sqlite3
+
+CACHE_FILE = "cache.sqlite"
+CACHE_SIZE = 10240 # default size limit of the cache folder in MB
+
+def renderKey(**inputs): # returns the canonical digest of all render inputs
+    canonical = json.dumps(inputs, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('UTF-8')).hexdigest()
+
+def linkFile(source, target): # hardlinks source to target, copies it if linking isn't possible (e.g. other drive)
+    if os.path.exists(target):
+        if os.path.samefile(source, target):
+            return
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+class RenderCache: # index of cached renders in an SQLite-Database, the files are located in cache_path
+    def __init__(self, db_path, cache_path, max_size=CACHE_SIZE):
+        self.cache_path = cache_path
+        self.max_size = int(max_size) * 1048576
+        os.makedirs(cache_path, exist_ok=True)
+        # shared by parallel workers, used by the GUI- and the Auralization-Thread (never at the same time)
+        self.connection = sqlite3.connect(os.path.join(db_path, CACHE_FILE), timeout=60, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS renders (key TEXT PRIMARY KEY, filename TEXT NOT NULL, size INTEGER NOT NULL,
+                                   hash TEXT NOT NULL, entry TEXT NOT NULL, last_used REAL NOT NULL)""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS idx_renders_last_used ON renders (last_used)")
+        if "outputs" not in [i[1] for i in self.connection.execute("PRAGMA table_info(renders)")]: # caches created before the output encoders
+            self.connection.execute("ALTER TABLE renders ADD COLUMN outputs TEXT")
+        self.connection.commit()
+
+    def lookup(self, key): # returns [cached file, audio hash, protocol entry, cached encoded outputs] of a render or None
+        row = self.connection.execute("SELECT filename, size, hash, entry, outputs FROM renders WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        cached_path = os.path.join(self.cache_path, row[0])
+        outputs = [os.path.join(self.cache_path, i) for i in json.loads(row[4] or "[]")]
+        files = [cached_path] + outputs
+        if not all(map(os.path.exists, files)) or sum(map(os.path.getsize, files)) != row[1]: # removed or modified outside of the cache
+            self.remove(key)
+            return None
+        with self.connection:
+            self.connection.execute("UPDATE renders SET last_used = ? WHERE key = ?", (time.time(), key))
+        return [cached_path, row[2], json.loads(row[3]), outputs]
+
+    def store(self, key, outpath, hash_audio, entry, outputs=()): # adds a rendered file and its encoded outputs (optional) to the cache
+        # and evicts old renders if necessary
+        filename = key + os.path.splitext(outpath)[1]
+        linkFile(outpath, os.path.join(self.cache_path, filename))
+        size = os.path.getsize(outpath)
+        output_filenames = []
+        for output in outputs:
+            output_filenames.append(key + os.path.splitext(output)[1])
+            linkFile(output, os.path.join(self.cache_path, output_filenames[-1]))
+            size += os.path.getsize(output)
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO renders (key, filename, size, hash, entry, last_used, outputs) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                    (key, filename, size, hash_audio, json.dumps(entry), time.time(), json.dumps(output_filenames)))
+        self.evict()
+
+    def remove(self, key):
+        row = self.connection.execute("SELECT filename, outputs FROM renders WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return
+        for filename in [row[0]] + json.loads(row[1] or "[]"):
+            cached_path = os.path.join(self.cache_path, filename)
+            if os.path.exists(cached_path):
+                os.remove(cached_path)
+        with self.connection:
+            self.connection.execute("DELETE FROM renders WHERE key = ?", (key,))
+
+    def size(self): # total size of all cached files in bytes
+        return self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM renders").fetchone()[0]
+
+    def evict(self): # removes the least recently used renders until the cache fits into max_size
+        total = self.size()
+        if total <= self.max_size:
+            return
+        for key, size in self.connection.execute("SELECT key, size FROM renders ORDER BY last_used").fetchall():
+            self.remove(key)
+            total -= size
+            if total <= self.max_size:
+                break
+
+    def close(self):
+        self.connection.close()
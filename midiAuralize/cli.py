@@ -0,0 +1,498 @@
+# -*- coding: utf-8 -*-
+"""
+@description: Commandline-Version of midiAuralizer, e.g.
+              midiAuralizer render "D:/scans/**/*.mid" --instrument "Pianoteq 6 (64-bit)" --tempo 390 --outdir D:/renders
+"""
+import argparse
+import json
+import os
+import sys
+from . import version
+from .hashes import HASH_ALGORITHMS, DEFAULT_HASH
+from .cache import CACHE_SIZE
+from .protocol import EXPORT_FORMATS
+from .options import BIT_DEPTHS, ADAPTIVE_TAIL, parseBitDepth, duplicateOutputs
+from .encoders import OUTPUT_FORMATS, EncoderError, parseFormats, findFFmpeg
+
+COMMANDS = ["render", "sweep", "watch", "protocol", "scan", "verify"]
+
+def loadJson(path, default): # loads a .json-File, returns default if it doesn't exist
+    if not os.path.exists(path):
+        return default
+    with open(path, encoding='UTF-8') as json_file:
+        return json.load(json_file)
+
+def buildParser(): # creates the argument parser for all commands
+    parser = argparse.ArgumentParser(prog="midiAuralizer", description="Renders MIDI-Files through VST-Instruments without the GUI.")
+    parser.add_argument("--version", action="version", version=f"midiAuralizer {version}")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    options = argparse.ArgumentParser(add_help=False) # options shared by render & sweep
+    options.add_argument("-r", "--samplerate", type=int, help="samplerate in Hz (default: from settings.json)")
+    options.add_argument("-b", "--bitdepth", choices=BIT_DEPTHS, help="bit depth, 32f: 32-bit float (default: from settings.json)")
+    options.add_argument("--dither", action="store_true", help="add TPDF-Dither to 8- to 24-bit output")
+    options.add_argument("-f", "--formats", type=parseFormats, help=f"additional output formats encoded with ffmpeg from the same render, e.g. flac,mp3 ({', '.join(OUTPUT_FORMATS)}, default: from settings.json or none)")
+    options.add_argument("-o", "--outdir", help="output folder (default: from settings.json)")
+    options.add_argument("--vstpath", help="folder of the VST-Instruments (default: from settings.json)")
+    options.add_argument("--chunksize", type=int, help="block size of the RenderEngine (default: from settings.json)")
+    options.add_argument("--blocksize", type=int, default=65536, help="frames converted & written to the .wav at once, bounds the memory of the conversion (default: 65536)")
+    options.add_argument("--hash", choices=HASH_ALGORITHMS, help="hash algorithm for the protocol (default: from settings.json or md5)")
+    options.add_argument("--tail", choices=["fixed", "adaptive"], help="fixed: render 5 s after the last MIDI-Event, adaptive: render until silence (default: from settings.json or fixed)")
+    options.add_argument("--tail-threshold", type=float, help="adaptive tail: level in dBFS that counts as silence (default: -80)")
+    options.add_argument("--tail-hold", type=float, help="adaptive tail: seconds the output has to stay below the threshold (default: 0.5)")
+    options.add_argument("--tail-max", type=float, help="adaptive tail: max. seconds rendered after the last MIDI-Event (default: 30)")
+    options.add_argument("--force", action="store_true", help="render all files, even if an identical render is in the cache")
+    options.add_argument("--no-cache", action="store_true", help="disable the render cache")
+    options.add_argument("--cachedir", help="folder of the render cache (default: from settings.json or ./cache)")
+    options.add_argument("--cache-size", type=int, help="size limit of the render cache in MB (default: from settings.json or 10240)")
+    options.add_argument("--db", default=os.path.join(os.getcwd(), "db"), help="folder with settings.json and protocol.json (default: ./db)")
+    options.add_argument("--reset-state", action="store_true", help="restore the Instrument-Parameters before every file (one plugin state load per file)")
+    options.add_argument("-j", "--workers", type=int, default=1, help="number of render processes, each with its own RenderEngine (0: all cores, default: 1)")
+    options.add_argument("--no-metrics", action="store_true", help="don't write the metrics log of the batch (<db>/metrics/*.jsonl)")
+
+    render = subparsers.add_parser("render", parents=[options], help="auralize MIDI-Files through a VST-Instrument")
+    render.add_argument("inputs", nargs="+", help="MIDI-Files, folders or glob patterns (e.g. scans/**/*.mid)")
+    render.add_argument("-i", "--instrument", required=True, help="name of the VST-Instrument (.dll-Filename without extension)")
+    render.add_argument("-t", "--tempo", type=int, default=390, help="tempo in BPM (default: 390)")
+    render.add_argument("--no-state", action="store_true", help="don't apply the Instrument-Parameters saved in settings.json")
+    render.add_argument("--profile", action="store_true", help="capture the first file with cProfile & tracemalloc (<db>/profiles), renders in a single process")
+    render.set_defaults(func=cmdRender)
+
+    sweep = subparsers.add_parser("sweep", parents=[options], help="auralize MIDI-Files through several Instruments & parameter variants (e.g. for datasets)")
+    sweep.add_argument("inputs", nargs="+", help="MIDI-Files, folders or glob patterns (e.g. scans/**/*.mid)")
+    sweep.add_argument("-s", "--spec", required=True, help=".json-File with the instruments, a grid and/or a list of parameter variants (see midiAuralize/sweep.py)")
+    sweep.add_argument("-i", "--instrument", action="append", help="VST-Instrument to sweep, can be repeated (default: instruments of the spec)")
+    sweep.add_argument("-t", "--tempo", type=int, default=390, help="tempo in BPM (default: 390)")
+    sweep.add_argument("--no-state", action="store_true", help="apply the overrides to the Instruments' defaults instead of the parameters saved in settings.json")
+    sweep.set_defaults(func=cmdSweep)
+
+    watch = subparsers.add_parser("watch", parents=[options], help="watch folders and auralize new or changed MIDI-Files until stopped (Ctrl+C)")
+    watch.add_argument("folders", nargs="+", help="input folders, MIDI-Files are rendered once they have been written completely")
+    watch.add_argument("-i", "--instrument", required=True, help="name of the VST-Instrument (.dll-Filename without extension)")
+    watch.add_argument("-t", "--tempo", type=int, default=390, help="tempo in BPM (default: 390)")
+    watch.add_argument("--no-state", action="store_true", help="don't apply the Instrument-Parameters saved in settings.json")
+    watch.add_argument("--settle", type=float, default=2.0, help="seconds a file has to stay unchanged before it is queued (default: 2)")
+    watch.add_argument("--poll", type=float, default=2.0, help="seconds between two scans of the folders if they are polled (default: 2)")
+    watch.add_argument("--polling", action="store_true", help="poll the folders even if watchdog is installed (e.g. for network drives)")
+    watch.add_argument("--no-recursive", action="store_true", help="don't watch the subfolders")
+    watch.add_argument("--once", action="store_true", help="render the queued jobs & the files of the folders, then exit")
+    watch.set_defaults(func=cmdWatch)
+
+    protocol = subparsers.add_parser("protocol", help="manage the protocol database")
+    protocol_commands = protocol.add_subparsers(dest="protocol_command")
+    protocol_commands.required = True
+    migrate = protocol_commands.add_parser("migrate", help="import a protocol.json into the protocol database (done automatically once)")
+    migrate.add_argument("json", nargs="?", help="protocol.json to import (default: <db>/protocol.json)")
+    migrate.add_argument("--db", default=os.path.join(os.getcwd(), "db"), help="folder of the protocol database (default: ./db)")
+    migrate.set_defaults(func=cmdMigrate)
+    compact = protocol_commands.add_parser("compact", help="store the parameter sets of older entries once and shrink the database (done automatically once)")
+    compact.add_argument("--db", default=os.path.join(os.getcwd(), "db"), help="folder of the protocol database (default: ./db)")
+    compact.set_defaults(func=cmdCompact)
+    export = protocol_commands.add_parser("export", help="export the protocol entries matching the filters as CSV or JSONL (one entry per line)")
+    export.add_argument("output", help=".csv- or .jsonl-File, - writes to the console")
+    export.add_argument("--format", choices=EXPORT_FORMATS, help="export format (default: from the file extension, csv for the console)")
+    export.add_argument("--midi", help="MIDI-Filename, wildcards * and ? are allowed (e.g. \"scan_12*.mid\")")
+    export.add_argument("--midi-hash", help="hashcode of the MIDI-File")
+    export.add_argument("--plugin", help="name of the VST-Instrument")
+    export.add_argument("--plugin-version", help="version of the VST-Instrument")
+    export.add_argument("--tempo", type=float, help="tempo in BPM")
+    export.add_argument("--samplerate", type=int, help="samplerate in Hz")
+    export.add_argument("--since", help="rendered on or after this date/time, e.g. 2024-01-31 or \"2024-01-31 12:00\"")
+    export.add_argument("--before", help="rendered before this date/time")
+    export.add_argument("--db", default=os.path.join(os.getcwd(), "db"), help="folder of the protocol database (default: ./db)")
+    export.set_defaults(func=cmdExport)
+
+    scan = subparsers.add_parser("scan", help="update the plugin index of the VST-Path, only new or changed .dll-Files are scanned")
+    scan.add_argument("--vstpath", help="folder of the VST-Instruments (default: from settings.json)")
+    scan.add_argument("--db", default=os.path.join(os.getcwd(), "db"), help="folder of the plugin index (default: ./db)")
+    scan.add_argument("-j", "--workers", type=int, default=0, help="number of scan processes (0: all cores, default: 0)")
+    scan.add_argument("--no-probe", action="store_true", help="only index files & versions, don't load the plugins to read their parameters")
+    scan.add_argument("--full", action="store_true", help="scan all plugins again, even if they haven't changed")
+    scan.set_defaults(func=cmdScan)
+
+    verify = subparsers.add_parser("verify", help="verify all rendered files of a folder (and its subfolders) against the protocol")
+    verify.add_argument("folder", help="folder with the rendered .wav-Files, e.g. a delivered archive")
+    verify.add_argument("--db", default=os.path.join(os.getcwd(), "db"), help="folder of the protocol database & the hash cache (default: ./db)")
+    verify.add_argument("--hash", choices=HASH_ALGORITHMS, action="append", help="hash algorithm to match, can be repeated (default: the algorithms used in the protocol)")
+    verify.add_argument("-j", "--workers", type=int, default=0, help="number of hashing threads (0: all cores, default: 0)")
+    verify.add_argument("--report", help=".csv-File listing the result of every file")
+    verify.add_argument("--no-cache", action="store_true", help="hash all files again, even if path, size & modification time are unchanged")
+    verify.set_defaults(func=cmdVerify)
+    return parser
+
+def renderConfig(args, settings): # returns the arguments of the Auralizers (see parallel.auralizeParallel) from the options & settings.json
+    audioSettings = settings.get('audioSettings', {})
+    pathSettings = settings.get('pathSettings', {})
+
+    samplerate = args.samplerate or int(audioSettings.get('samplerate', 44100))
+    bitdepth = parseBitDepth(args.bitdepth or audioSettings.get('bitdepth', 16))
+    dither = args.dither or bool(audioSettings.get('dither', False))
+    chunksize = args.chunksize or int(audioSettings.get('chunksize', 1024))
+    hash_algorithm = args.hash or audioSettings.get('hashalgorithm', DEFAULT_HASH)
+    formats = args.formats if args.formats is not None else parseFormats(audioSettings.get('formats', []))
+    tail = None
+    if (args.tail or audioSettings.get('tailmode', "fixed")) == "adaptive":
+        tail = {"threshold": args.tail_threshold if args.tail_threshold is not None else float(audioSettings.get('tailthreshold', ADAPTIVE_TAIL['threshold'])),
+                "hold": args.tail_hold if args.tail_hold is not None else float(audioSettings.get('tailhold', ADAPTIVE_TAIL['hold'])),
+                "max": args.tail_max if args.tail_max is not None else float(audioSettings.get('tailmax', ADAPTIVE_TAIL['max']))}
+    cache_size = args.cache_size if args.cache_size is not None else int(audioSettings.get('cachesize', CACHE_SIZE))
+    cache = None
+    if not args.no_cache and cache_size > 0:
+        cache = {"db_path": args.db, "cache_path": args.cachedir or pathSettings.get('cachepath') or os.path.join(os.getcwd(), "cache"),
+                 "max_size": cache_size}
+    vstpath = args.vstpath or pathSettings.get('vstpath', "C:\\VstPlugins\\")
+    outdir = args.outdir or pathSettings.get('outpath') or os.path.join(os.getcwd(), "output")
+    return {"vst_path": vstpath, "out_path": outdir, "samplerate": samplerate, "bitdepth": bitdepth, "chunksize": chunksize,
+            "blocksize": args.blocksize, "hash_algorithm": hash_algorithm, "cache": cache, "force": args.force,
+            "tail": tail, "dither": dither, "reset_state": args.reset_state, "formats": formats}
+
+def checkOutputs(midifiles): # reports MIDI-Files that would be rendered to the same output file, False if there are any
+    duplicates = duplicateOutputs(midifiles)
+    for name, files in duplicates.items():
+        print(f"{', '.join(files)} would be rendered to the same file {name}.", file=sys.stderr)
+    if duplicates:
+        print("Rename these MIDI-Files or render them in separate batches (with different output folders).", file=sys.stderr)
+    return not duplicates
+
+def loadInstrument(auralizer, instrument, parameters): # loads the Instrument of a batch, reports an unknown Instrument or missing .dll-File, False if it failed
+    try:
+        auralizer.loadInstrument(instrument, parameters)
+    except RuntimeError as e:
+        print(f"Instrument {instrument} could not be loaded from {auralizer.vst_path}: {e}", file=sys.stderr)
+        return False
+    return True
+
+def describeConfig(config): # samplerate, bit depth & output formats for the console
+    return f"{config['samplerate']} Hz, {config['bitdepth']} bit" + "".join(", " + i for i in config["formats"])
+
+def cmdRender(args): # auralizes all inputs with one Auralizer and writes the protocol
+    from .core import Auralizer, expandInputs
+    from .parallel import auralizeParallel, countWorkers
+    from .protocol import openProtocol
+    from .plugins import PluginIndex, PLUGIN_EXTENSION
+    from .metrics import MetricsLog, METRICS_FOLDER, PROFILE_FOLDER
+    from datetime import datetime
+
+    os.makedirs(args.db, exist_ok=True)
+    settings = loadJson(os.path.join(args.db, "settings.json"), {})
+    config = renderConfig(args, settings)
+    if config["formats"]:
+        try:
+            findFFmpeg()
+        except EncoderError as e:
+            print(e)
+            return 1
+    os.makedirs(config["out_path"], exist_ok=True)
+    protocol = openProtocol(args.db)
+    plugin_index = PluginIndex(args.db)
+
+    midifiles = expandInputs(args.inputs)
+    if not midifiles:
+        print("No MIDI-File found for the given inputs.")
+        return 1
+    if not checkOutputs(midifiles):
+        return 1
+
+    parameters = settings.get('pluginSettings', {}).get(args.instrument)
+    apply_parameters = not args.no_state and bool(parameters)
+    workers = 1 if args.profile else countWorkers(args.workers, len(midifiles))
+    auralizer = None
+    if workers == 1 or not apply_parameters: # the parent only needs an Instrument to render or to read its parameters
+        auralizer = Auralizer(**config, plugin_index=plugin_index)
+        if not loadInstrument(auralizer, args.instrument, parameters if apply_parameters else None):
+            return 1
+        if not apply_parameters:
+            parameters = auralizer.getPluginParameters()
+
+    plugin_version = None
+    if workers > 1: # the workers load the Instrument, a missing .dll-File is reported before the pool is started
+        try:
+            plugin_version = plugin_index.version(os.path.join(config["vst_path"], args.instrument + PLUGIN_EXTENSION))
+        except RuntimeError as e:
+            print(f"Instrument {args.instrument} could not be loaded from {config['vst_path']}: {e}", file=sys.stderr)
+            return 1
+
+    metrics = None
+    if not args.no_metrics:
+        metrics = MetricsLog(os.path.join(args.db, METRICS_FOLDER), instrument=args.instrument, files=len(midifiles), tempo=args.tempo,
+                             samplerate=config["samplerate"], bitdepth=config["bitdepth"], workers=workers)
+    failed = []
+    def onEntry(outpath, hash_audio, entry):
+        protocol.add(hash_audio, entry)
+        if metrics is not None:
+            metrics.entry(outpath, entry)
+        if 'cache' in entry:
+            print(f"Cached   {entry['midi']['filename']} -> {outpath}")
+        else:
+            print(f"Rendered {entry['midi']['filename']} -> {outpath}")
+    def onError(midi, error):
+        if metrics is not None:
+            metrics.error(midi, error)
+        failed.append(midi)
+        print(f"Failed {midi}: {error}")
+
+    print(f"Auralizing {len(midifiles)} MIDI-Files on {args.instrument} ({describeConfig(config)}, {args.tempo} BPM, {workers} processes)...")
+    if workers > 1:
+        auralized = auralizeParallel(config, args.instrument, midifiles, args.tempo, parameters, plugin_version, workers=workers,
+                                     apply_parameters=apply_parameters, onEntry=onEntry, onError=onError)
+    else:
+        profile = None
+        if args.profile:
+            profile = os.path.join(args.db, PROFILE_FOLDER, f"{datetime.now():%Y-%m-%d_%H-%M-%S}_{os.path.basename(midifiles[0])[:-4]}")
+            print(f"Profiling {midifiles[0]} -> {profile}.prof / .txt")
+        auralized = auralizer.auralizeBatch(midifiles, args.tempo, parameters, onEntry=onEntry, onError=onError, profile=profile)
+    if metrics is not None:
+        metrics.close()
+        print(f"Metrics: {metrics.path}")
+    protocol.close()
+    plugin_index.close()
+    print(f"Auralization finished: {len(auralized)} rendered, {len(failed)} failed.")
+    return 1 if failed else 0
+
+def cmdSweep(args): # auralizes all inputs with every variant of the sweep spec and writes one protocol entry per variant
+    from .core import Auralizer, expandInputs
+    from .sweep import loadSweep, expandVariants, runSweep, planJobs
+    from .parallel import countWorkers
+    from .protocol import openProtocol
+    from .plugins import PluginIndex
+    from .metrics import MetricsLog, METRICS_FOLDER
+
+    os.makedirs(args.db, exist_ok=True)
+    settings = loadJson(os.path.join(args.db, "settings.json"), {})
+    config = renderConfig(args, settings)
+    try:
+        spec = loadSweep(args.spec)
+        variants = expandVariants(spec)
+        if config["formats"]:
+            findFFmpeg()
+    except (OSError, ValueError, EncoderError) as e:
+        print(e)
+        return 1
+    instruments = args.instrument or spec.get("instruments", [])
+    if not instruments:
+        print("No Instrument given, add --instrument or \"instruments\" to the spec.")
+        return 1
+    midifiles = expandInputs(args.inputs)
+    if not midifiles:
+        print("No MIDI-File found for the given inputs.")
+        return 1
+    if not checkOutputs(midifiles):
+        return 1
+    os.makedirs(config["out_path"], exist_ok=True)
+    protocol = openProtocol(args.db)
+    plugin_index = PluginIndex(args.db)
+    base_parameters = {} if args.no_state else {i: settings.get('pluginSettings', {}).get(i) for i in instruments}
+    jobs = len(planJobs(instruments, variants, len(midifiles)))
+    workers = countWorkers(args.workers, jobs)
+
+    metrics = None
+    if not args.no_metrics:
+        metrics = MetricsLog(os.path.join(args.db, METRICS_FOLDER), instruments=instruments, variants=variants, files=len(midifiles),
+                             tempo=args.tempo, samplerate=config["samplerate"], bitdepth=config["bitdepth"], workers=workers)
+    failed = []
+    def onEntry(outpath, hash_audio, entry):
+        protocol.add(hash_audio, entry)
+        if metrics is not None:
+            metrics.entry(outpath, entry)
+        print(f"{'Cached  ' if 'cache' in entry else 'Rendered'} {entry['midi']['filename']} [{entry['plugin']['name']}: {entry['sweep']['variant']}] -> {outpath}")
+    def onError(midi, error):
+        if metrics is not None:
+            metrics.error(midi, error)
+        failed.append(midi)
+        print(f"Failed {midi}: {error}")
+
+    print(f"Sweeping {len(midifiles)} MIDI-Files x {len(variants)} variants x {len(instruments)} Instruments "
+          f"({describeConfig(config)}, {args.tempo} BPM, {workers} processes)...")
+    auralizer = Auralizer(**config, plugin_index=plugin_index) if workers == 1 else None
+    auralized = runSweep(config, instruments, variants, midifiles, args.tempo, base_parameters, workers, auralizer, onEntry, onError)
+    if metrics is not None:
+        metrics.close()
+        print(f"Metrics: {metrics.path}")
+    protocol.close()
+    plugin_index.close()
+    print(f"Sweep finished: {len(auralized)} rendered, {len(failed)} failed.")
+    return 1 if failed else 0
+
+def cmdWatch(args): # renders the MIDI-Files of the watched folders with one loaded Instrument, jobs are kept in <db>/watch.sqlite
+    from .core import Auralizer
+    from .protocol import openProtocol
+    from .plugins import PluginIndex
+    from .metrics import MetricsLog, METRICS_FOLDER
+    from .watch import JobQueue, WatchDaemon, Observer, WATCH_QUEUE_FILE
+
+    missing = [i for i in args.folders if not os.path.isdir(i)]
+    if missing:
+        print(f"{', '.join(missing)} not found.")
+        return 1
+    os.makedirs(args.db, exist_ok=True)
+    settings = loadJson(os.path.join(args.db, "settings.json"), {})
+    config = renderConfig(args, settings)
+    if config["formats"]:
+        try:
+            findFFmpeg()
+        except EncoderError as e:
+            print(e)
+            return 1
+    os.makedirs(config["out_path"], exist_ok=True)
+    protocol = openProtocol(args.db)
+    plugin_index = PluginIndex(args.db)
+    jobs = JobQueue(args.db)
+
+    parameters = settings.get('pluginSettings', {}).get(args.instrument)
+    apply_parameters = not args.no_state and bool(parameters)
+    auralizer = Auralizer(**config, plugin_index=plugin_index)
+    if not loadInstrument(auralizer, args.instrument, parameters if apply_parameters else None):
+        return 1
+    if not apply_parameters:
+        parameters = auralizer.getPluginParameters()
+    daemon = WatchDaemon(auralizer, jobs, [os.path.abspath(i) for i in args.folders], args.instrument, args.tempo, parameters,
+                         recursive=not args.no_recursive, settle=args.settle, poll=args.poll, polling=args.polling)
+
+    metrics = None
+    if not args.no_metrics:
+        metrics = MetricsLog(os.path.join(args.db, METRICS_FOLDER), instrument=args.instrument, folders=args.folders, tempo=args.tempo,
+                             samplerate=config["samplerate"], bitdepth=config["bitdepth"], workers=1)
+    rendered = []
+    failed = []
+    def onEntry(outpath, hash_audio, entry):
+        protocol.add(hash_audio, entry)
+        if metrics is not None:
+            metrics.entry(outpath, entry)
+        rendered.append(outpath)
+        print(f"{'Cached  ' if 'cache' in entry else 'Rendered'} {entry['midi']['filename']} -> {outpath}")
+    def onError(midi, error):
+        if metrics is not None:
+            metrics.error(midi, error)
+        failed.append(midi)
+        print(f"Failed {midi}: {error}")
+
+    mode = "polling every {} s".format(args.poll) if daemon.watcher.polling else "watchdog events"
+    print(f"Watching {', '.join(args.folders)} for {args.instrument} ({describeConfig(config)}, {args.tempo} BPM, {mode}), "
+          f"queue: {os.path.join(args.db, WATCH_QUEUE_FILE)}{'' if Observer is not None or args.polling else ' (pip install watchdog for events)'}...")
+    if jobs.resumed:
+        print(f"{jobs.resumed} unfinished jobs resumed.")
+    try:
+        daemon.run(once=args.once, onEntry=onEntry, onError=onError, onJob=lambda midi: print(f"Auralizing {midi}..."))
+    except KeyboardInterrupt:
+        print("Stopped, unfinished jobs are resumed on the next start.")
+    finally:
+        if metrics is not None:
+            metrics.close()
+        counts = jobs.counts()
+        jobs.close()
+        protocol.close()
+        plugin_index.close()
+    print(f"Watch finished: {len(rendered)} rendered, {len(failed)} failed, {counts.get('pending', 0)} pending, {counts.get('failed', 0)} failed in total.")
+    return 1 if failed else 0
+
+def cmdMigrate(args): # imports a protocol.json into the protocol database
+    from .protocol import ProtocolStore, PROTOCOL_FILE, LEGACY_PROTOCOL_FILE
+
+    json_path = args.json or os.path.join(args.db, LEGACY_PROTOCOL_FILE)
+    if not os.path.exists(json_path):
+        print(f"{json_path} not found.")
+        return 1
+    store = ProtocolStore(os.path.join(args.db, PROTOCOL_FILE))
+    migrated = store.migrate(json_path)
+    print(f"{migrated} entries migrated from {json_path}, the protocol contains {len(store)} audio hashes.")
+    store.close()
+    return 0
+
+def cmdCompact(args): # replaces embedded parameter sets by references to the parameter table
+    from .protocol import ProtocolStore, PROTOCOL_FILE
+
+    path = os.path.join(args.db, PROTOCOL_FILE)
+    if not os.path.exists(path):
+        print(f"{path} not found.")
+        return 1
+    size = os.path.getsize(path)
+    store = ProtocolStore(path)
+    compacted = store.compact()
+    store.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    print(f"{compacted} entries compacted, {store.parameterSets()} parameter sets stored, {size / 1048576:.1f} MB -> {os.path.getsize(path) / 1048576:.1f} MB.")
+    store.close()
+    return 0
+
+def cmdExport(args): # streams the filtered protocol entries into a .csv- or .jsonl-File
+    from .protocol import openProtocol
+
+    export_format = args.format or ("jsonl" if args.output.lower().endswith(".jsonl") else "csv")
+    protocol = openProtocol(args.db)
+    filters = {"midi_filename": args.midi, "midi_hash": args.midi_hash, "plugin_name": args.plugin, "plugin_version": args.plugin_version,
+               "tempo": args.tempo, "samplerate": args.samplerate, "since": args.since, "before": args.before}
+    if args.output == "-":
+        count = protocol.export(sys.stdout, export_format, **filters)
+    else:
+        with open(args.output, "w", encoding='UTF-8', newline="") as export_file:
+            count = protocol.export(export_file, export_format, **filters)
+        print(f"{count} protocol entries exported to {args.output}.")
+    protocol.close()
+    return 0
+
+def cmdScan(args): # updates the plugin index, probes the parameters of new & changed plugins on a process pool
+    from .plugins import PluginIndex
+
+    os.makedirs(args.db, exist_ok=True)
+    settings = loadJson(os.path.join(args.db, "settings.json"), {})
+    vstpath = args.vstpath or settings.get('pathSettings', {}).get('vstpath', "C:\\VstPlugins\\")
+    if not os.path.isdir(vstpath):
+        print(f"VST-Path {vstpath} not found.")
+        return 1
+    def onPlugin(info):
+        if info['error']:
+            print(f"Failed  {info['name']}: {info['error']}")
+        elif info['parameters'] is None:
+            print(f"Indexed {info['name']} {info['version']}")
+        else:
+            print(f"Indexed {info['name']} {info['version']}: {len(info['parameters'])} parameters, {info['inputs']} in / {info['outputs']} out")
+    plugin_index = PluginIndex(args.db)
+    scanned = plugin_index.update(vstpath, probe=not args.no_probe, workers=args.workers, full=args.full, onPlugin=onPlugin)
+    print(f"{len(scanned)} plugins scanned, the index of {vstpath} contains {len(plugin_index.instruments(vstpath))} plugins.")
+    plugin_index.close()
+    return 1 if any(i['error'] for i in scanned) else 0
+
+def cmdVerify(args): # hashes all files of a folder in parallel and matches them against the protocol
+    import csv
+    import time
+    from .protocol import openProtocol
+    from .verify import HashCache, verifyFiles, RESULTS
+
+    if not os.path.isdir(args.folder):
+        print(f"{args.folder} not found.")
+        return 1
+    os.makedirs(args.db, exist_ok=True)
+    protocol = openProtocol(args.db)
+    cache = None if args.no_cache else HashCache(args.db)
+    start = time.perf_counter()
+    try:
+        results = verifyFiles(protocol, args.folder, algorithms=args.hash, workers=args.workers, cache=cache)
+    except ValueError as e: # hash algorithm not available
+        print(e)
+        return 1
+    finally:
+        protocol.close()
+        if cache is not None:
+            cache.close()
+    for result in ["modified", "unknown"]:
+        for path, hash_audio in results[result]:
+            print(f"{result.capitalize():11}{path}")
+    for path, error in results["unreadable"]:
+        print(f"Unreadable {path}: {error}", file=sys.stderr)
+    if args.report:
+        with open(args.report, "w", encoding='UTF-8', newline="") as report_file:
+            writer = csv.writer(report_file)
+            writer.writerow(["result", "path", "hash", "error"])
+            for result in RESULTS:
+                if result == "unreadable":
+                    writer.writerows([result, path, "", error] for path, error in results[result])
+                else:
+                    writer.writerows([result, path, hash_audio, ""] for path, hash_audio in results[result])
+        print(f"Report: {args.report}")
+    print(f"{sum(len(i) for i in results.values())} files verified in {time.perf_counter() - start:.1f} s: "
+          + ", ".join(f"{len(results[i])} {i}" for i in RESULTS) + ".")
+    return 1 if results["modified"] or results["unreadable"] else 0
+
+def main(argv=None): # entry point of the Commandline-Version
+    args = buildParser().parse_args(argv)
+    return args.func(args)
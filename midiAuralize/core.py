@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+"""
+@description: Render Core of midiAuralizer. Loads a VST-Instrument into a single dawdreamer RenderEngine and auralizes
+              MIDI-Files with it, independent of the Qt-GUI. Every successful Auralization returns its Protocol-Entry.
+"""
+import os
+import io
+import glob
+import time
+import tempfile
+from collections import OrderedDict
+from datetime import datetime
+import mido
+import dawdreamer as daw
+import numpy as np
+from .wav import WavWriter
+from .hashes import DEFAULT_HASH, newHash, hashBytes
+from .cache import RenderCache, renderKey, linkFile
+from .formats import SampleConverter
+from .encoders import StreamEncoder, EncoderError, OUTPUT_FORMATS, parseFormats, findFFmpeg
+from .options import parseBitDepth, outputName, TAIL, ADAPTIVE_TAIL
+from .metrics import profileCall
+from .plugins import ProcessorCache, PLUGIN_CACHE, PLUGIN_EXTENSION, listInstruments, getPluginVersion
+
+CHANNELS = 2
+FILESIZE_THRESHOLD = 500 # threshold in bytes for checking the successful processing (simple)
+BLOCKSIZE = 65536 # frames converted & written at once
+STATE_CACHE = 16 # plugin states of applied parameter sets kept in the scratch folder
+
+class AuralizationError(Exception): # raised if a MIDI-File could not be auralized, the message is shown to the user
+    pass
+
+class AuralizationCancelled(Exception): # raised after the current block if a running Auralization has been cancelled
+    pass
+
+def expandInputs(patterns): # resolves MIDI-Files, folders and glob patterns (e.g. scans/**/*.mid) to a list of MIDI-Files
+    midifiles = []
+    found = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "*.mid")
+        for i in sorted(glob.glob(pattern, recursive=True)):
+            if os.path.isfile(i) and i not in found:
+                found.add(i)
+                midifiles.append(i)
+    return midifiles
+
+def setTempo(midi_bytes, tempo): # sets Tempo of a MIDI-File in memory and returns the processed MidiFile
+    mid = mido.MidiFile(file=io.BytesIO(midi_bytes))
+    new_mid = mido.MidiFile()
+    new_track = mido.MidiTrack()
+    new_mid.tracks.append(new_track)
+    for i, track in enumerate(mid.tracks):
+        for msg in track:
+            if msg.type == 'set_tempo':
+                new_tempo = int(mido.bpm2tempo(tempo))
+                msg.tempo = new_tempo
+            new_track.append(msg)
+    return new_mid
+
+def prepareMidi(midi, tempo, hash_algorithm=DEFAULT_HASH): # reads, hashes & tempo-processes a MIDI-File once, so it can be rendered many times
+    # returns {path, tempo, hash, hashalgorithm, data: processed MIDI-File as bytes, length in seconds}, see Auralizer.auralize(prepared=...)
+    with open(midi, "rb") as midi_file:
+        midi_bytes = midi_file.read()
+    mid = setTempo(midi_bytes, tempo)
+    data = io.BytesIO()
+    mid.save(file=data)
+    return {"path": midi, "tempo": tempo, "hash": hashBytes(midi_bytes, hash_algorithm), "hashalgorithm": hash_algorithm,
+            "data": data.getvalue(), "length": mid.length}
+
+def addTiming(timings, stage, start): # adds the seconds since start to timings[stage], returns the current time
+    now = time.perf_counter()
+    timings[stage] = timings.get(stage, 0.) + now - start
+    return now
+
+def findTailEnd(audio_output, start, threshold, hold_frames): # returns the frame after the last one above threshold (dBFS) from start on
+    # None if the output isn't below the threshold for at least hold_frames at its end
+    level = 10**(threshold / 20.)
+    tail_end = start
+    for block_start in range(start, audio_output.shape[1], BLOCKSIZE):
+        loud = np.flatnonzero((np.abs(audio_output[:, block_start:block_start+BLOCKSIZE]) > level).any(axis=0))
+        if len(loud):
+            tail_end = block_start + loud[-1] + 1
+    if audio_output.shape[1] - tail_end < hold_frames:
+        return None
+    return tail_end
+
+def renderTail(engine, midi_endtime, samplerate, tail, guess): # renders past the last MIDI-Event until the output stays below the threshold
+    # starts with a tail of guess seconds and renders once more with the max. tail if that wasn't long enough (the engine can't continue a render),
+    # returns the output trimmed after its last sample above the threshold and the length of the tail in seconds
+    end_frame = int(round(midi_endtime * samplerate))
+    hold_frames = int(tail['hold'] * samplerate)
+    tail_length = min(guess, tail['max'])
+    while True:
+        assert(engine.render(midi_endtime + tail_length))
+        audio_output = engine.get_audio()
+        tail_end = findTailEnd(audio_output, end_frame, tail['threshold'], hold_frames)
+        if tail_end is not None or tail_length >= tail['max']:
+            break
+        tail_length = tail['max']
+    if tail_end is None: # still sounding after the max. tail
+        tail_end = audio_output.shape[1]
+    return [audio_output[:, :tail_end], (tail_end - end_frame) / samplerate]
+
+def writeAudio(audio_output, file_path, samplerate, bitdepth, channels=CHANNELS, blocksize=BLOCKSIZE, hash_algorithm=DEFAULT_HASH, dither=False,
+               onBlock=None, timings=None, encoders=None):
+    # writes the rendered output as .wav and returns the hashcode of the written file, onBlock(frames written, frames) is called after every block,
+    # the seconds spent converting and writing (incl. hashing) are added to timings["convert"] and timings["write"] (optional),
+    # every converted block is also passed to the StreamEncoders of additional output formats (optional), they are finished by the caller
+    if timings is None:
+        timings = {}
+
+    # Handle channel configuration
+    mixdown = False
+    if audio_output.shape[0] != channels:
+        if channels == 2 and audio_output.shape[0] > 2:
+            # If stereo is required, select the first two channels
+            audio_output = audio_output[:2, :]
+        elif channels == 1:
+            # If mono is required, mix down the channels (blockwise)
+            mixdown = True
+        else:
+            raise ValueError("Unsupported channel configuration. Available channels: {}".format(audio_output.shape[0]))
+
+    # Clip, scale, dither & convert the audio output block by block into preallocated buffers
+    converter = SampleConverter(bitdepth, channels, blocksize, dither)
+    nframes = audio_output.shape[1]
+    with WavWriter(file_path, samplerate, channels, converter.sampwidth, nframes, format_tag=converter.format_tag,
+                   hasher=newHash(hash_algorithm)) as writer:
+        for start in range(0, nframes, blocksize):
+            block_start = time.perf_counter()
+            block = audio_output[:, start:start+blocksize]
+            if mixdown:
+                block = np.mean(block, axis=0, keepdims=True)
+            frames = converter.convert(block)
+            block_start = addTiming(timings, "convert", block_start)
+            writer.write(frames)
+            if encoders:
+                data = frames.tobytes() # the buffer of the converter is reused for the next block
+                for encoder in encoders:
+                    encoder.write(data)
+            addTiming(timings, "write", block_start)
+            if onBlock is not None:
+                onBlock(writer.frames_written, nframes)
+    return writer.hexdigest()
+
+class Auralizer: # renders MIDI-Files through one VST-Instrument, the RenderEngine is reused for every file of a batch
+    def __init__(self, vst_path, out_path, samplerate=44100, bitdepth=16, chunksize=1024, blocksize=BLOCKSIZE, hash_algorithm=DEFAULT_HASH,
+                 cache=None, force=False, tail=None, dither=False, plugin_cache=PLUGIN_CACHE, plugin_memory=None, plugin_index=None,
+                 reset_state=False, formats=None):
+        # cache holds the arguments of a RenderCache (db_path, cache_path, max_size), force renders even if a cached render exists,
+        # tail enables the adaptive tail (see ADAPTIVE_TAIL), otherwise TAIL seconds are rendered after the last MIDI-Event,
+        # bitdepth is 8, 16, 24, 32 or "32f" (float), dither adds TPDF-Dither to 8- to 24-bit output,
+        # plugin_cache is the number of Instruments kept loaded for fast switching, plugin_memory their memory limit in MB (optional),
+        # plugin_index is a PluginIndex that provides the plugin versions and learns the parameters of loaded Instruments (optional),
+        # reset_state restores the parameters (as plugin state) before every file, so no file depends on the previous one,
+        # formats are additional output formats (flac, mp3, opus) encoded from the same render as the .wav, see encoders.py
+        self.vst_path = vst_path
+        self.out_path = out_path
+        self.samplerate = int(samplerate)
+        self.bitdepth = parseBitDepth(bitdepth)
+        self.dither = dither
+        self.chunksize = int(chunksize)
+        self.blocksize = int(blocksize)
+        self.hash_algorithm = hash_algorithm
+        newHash(hash_algorithm) # fails early if the algorithm isn't available
+        self.tail = tail
+        self.tail_guess = TAIL # first tail rendered in adaptive mode, adapted to the tails of the loaded Instrument
+        self.engine = daw.RenderEngine(self.samplerate, self.chunksize)
+        self.processors = ProcessorCache(self.engine, plugin_cache, plugin_memory)
+        self.plugin_index = plugin_index
+        self.reset_state = reset_state
+        self.schemas = {} # (instrument, version) -> parameter schema, see parameterSchema()
+        self.schema = None
+        self.states = OrderedDict() # digest of (instrument, version, parameters) -> state file, see setParameters()
+        self.timings = {} # seconds per stage of the last auralize()
+        self.processor_version = None # version of a processor loaded through loadProcessor()
+        self.instrument = None
+        self.synth = None
+        self.cache = None
+        self.force = force
+        self.setCache(cache)
+        self.setFormats(formats)
+        self.onBlock = None # progress callback onBlock(frames written, frames) of the current file
+        self.cancelled = False
+        # dawdreamer only loads MIDI from a path: processed MIDI-Files are passed through a private scratch file, never next to the input
+        self.scratch = tempfile.TemporaryDirectory(prefix="midiAuralizer_")
+        self.scratch_midi = os.path.join(self.scratch.name, "processing.mid")
+
+    def setCache(self, cache): # opens the RenderCache described by cache, None disables caching
+        if self.cache is not None:
+            self.cache.close()
+        self.cache = RenderCache(**cache) if cache else None
+
+    def setFormats(self, formats): # sets the additional output formats, raises EncoderError if ffmpeg isn't available
+        formats = parseFormats(formats)
+        self.ffmpeg = findFFmpeg() if formats else None
+        self.formats = formats
+
+    def loadInstrument(self, instrument, parameters=None): # loads an Instrument into the engine and applies saved parameters (optional)
+        # recently used Instruments are taken from the ProcessorCache, they keep the parameters they were left with
+        path = os.path.join(self.vst_path, instrument + PLUGIN_EXTENSION)
+        self.synth = self.processors.get(instrument, path)
+        if self.plugin_index is not None:
+            self.plugin_index.describe(path, self.synth)
+        if instrument != self.instrument:
+            self.tail_guess = TAIL
+        self.instrument = instrument
+        self.processor_version = None
+        self.schema = self.parameterSchema(path)
+        if parameters:
+            self.setParameters(parameters)
+        return self.synth
+
+    def loadProcessor(self, instrument, processor, version): # renders with a processor that isn't a VST-Instrument (e.g. a Faust-Synth of the benchmarks)
+        self.synth = processor
+        self.instrument = instrument
+        self.processor_version = version
+        self.tail_guess = TAIL
+        self.schema = {"key": (instrument, version), "names": [], "index": {}, "defaults": {}}
+        return self.synth
+
+    def preloadInstrument(self, instrument): # loads an Instrument into the ProcessorCache in the background, returns the thread
+        return self.processors.preload(instrument, os.path.join(self.vst_path, instrument + PLUGIN_EXTENSION))
+
+    def pluginVersion(self): # version of the loaded Instrument, read from the PluginIndex if available
+        if self.processor_version is not None:
+            return self.processor_version
+        if self.plugin_index is not None:
+            return self.plugin_index.version(os.path.join(self.vst_path, self.instrument + PLUGIN_EXTENSION))
+        return getPluginVersion(self.instrument, self.vst_path)
+
+    def parameterSchema(self, path): # returns names, {name: index} & default values of the loaded Instrument, built once per plugin version
+        version = self.pluginVersion()
+        key = (self.instrument, version)
+        if key not in self.schemas:
+            names = self.plugin_index.get(path)["parameters"] if self.plugin_index is not None else None
+            if names is None:
+                names = [self.synth.get_parameter_name(i) for i in range(self.synth.get_plugin_parameter_size())]
+            # the first load of a version in this session is a fresh processor, its values are the defaults
+            self.schemas[key] = {"key": key, "names": names, "index": {name: i for i, name in enumerate(names)},
+                                 "defaults": {name: self.synth.get_parameter(i) for i, name in enumerate(names)}}
+        return self.schemas[key]
+
+    def setParameters(self, parameters): # applies a dict of {parameter name: value} to the loaded Instrument
+        # the resulting plugin state is kept in the scratch folder, applying the same parameters again is a single load_state
+        key = renderKey(plugin=self.schema["key"], parameters=parameters)
+        if key in self.states:
+            self.states.move_to_end(key)
+            self.synth.load_state(self.states[key])
+            return
+        index = self.schema["index"]
+        for name, value in parameters.items():
+            if name in index:
+                self.synth.set_parameter(index[name], value)
+        state_path = os.path.join(self.scratch.name, f"{key}.state")
+        self.synth.save_state(state_path)
+        self.states[key] = state_path
+        if len(self.states) > STATE_CACHE:
+            os.remove(self.states.popitem(last=False)[1])
+
+    def resetParameters(self): # sets all parameters of the loaded Instrument to their defaults
+        self.setParameters(self.schema["defaults"])
+
+    def loadMidi(self, mid): # feeds a processed MidiFile (or the bytes of a prepared one) to the loaded Instrument
+        if isinstance(mid, bytes):
+            with open(self.scratch_midi, "wb") as midi_file:
+                midi_file.write(mid)
+        else:
+            mid.save(self.scratch_midi)
+        self.synth.load_midi(self.scratch_midi, clear_previous=True, beats=False, all_events=True)
+
+    def getPluginParameters(self): # returns plugin parameters, the names are taken from the parameter schema
+        return {name: self.synth.get_parameter(i) for i, name in enumerate(self.schema["names"])}
+
+    def auralize(self, midi, tempo, parameters, plugin_version, prepared=None): # renders a single MIDI-File, returns [outpath, audio hash, protocol entry]
+        # prepared is the result of prepareMidi() for this MIDI-File & tempo (optional), it isn't read & processed again
+        self.timings = {}
+        stage_start = time.perf_counter()
+        if prepared is not None and (prepared["tempo"], prepared["hashalgorithm"]) != (tempo, self.hash_algorithm):
+            prepared = None
+        if prepared is None:
+            with open(midi, "rb") as midi_file:
+                midi_bytes = midi_file.read()
+            hash_midi = hashBytes(midi_bytes, self.hash_algorithm)
+        else:
+            hash_midi = prepared["hash"]
+        outpath = os.path.join(self.out_path, outputName(midi))
+        stage_start = addTiming(self.timings, "read", stage_start)
+        if self.cache is not None:
+            key = renderKey(midi=hash_midi, plugin=self.instrument, version=plugin_version, parameters=parameters, tempo=tempo,
+                            samplerate=self.samplerate, bitdepth=self.bitdepth, dither=self.dither, channels=CHANNELS,
+                            tail=self.tail or TAIL, hashalgorithm=self.hash_algorithm, **({"formats": self.formats} if self.formats else {}))
+            cached = None if self.force else self.cache.lookup(key)
+            if cached is not None:
+                restored = self.restoreCached(cached, key, midi, outpath)
+                addTiming(self.timings, "cache", stage_start)
+                restored[2]["performance"] = self.performance(cached[2].get("performance", {}).get("audio_seconds", 0.))
+                return restored
+            stage_start = addTiming(self.timings, "cache", stage_start)
+
+        if os.path.exists(outpath):
+            os.remove(outpath) # the old output may be hardlinked into the cache, it must not be overwritten in place
+        if prepared is None:
+            mid = setTempo(midi_bytes, tempo)
+            midi_endtime = mid.length
+        else:
+            mid = prepared["data"]
+            midi_endtime = prepared["length"]
+        stage_start = addTiming(self.timings, "tempo", stage_start)
+        with self.processors.lock: # no Instrument is preloaded into the engine while it renders
+            if self.reset_state:
+                self.setParameters(parameters)
+            self.loadMidi(mid)
+            graph = [(self.synth, [])]
+            self.engine.load_graph(graph)
+            stage_start = addTiming(self.timings, "load", stage_start)
+            if self.tail is None:
+                assert(self.engine.render(midi_endtime+TAIL))
+                audio_output = self.engine.get_audio()
+                tail_length = TAIL
+            else:
+                audio_output, tail_length = renderTail(self.engine, midi_endtime, self.samplerate, self.tail, self.tail_guess)
+                self.tail_guess = tail_length * 1.5 + self.tail['hold'] # the next file most likely has a similar tail
+            addTiming(self.timings, "render", stage_start)
+        encoders = []
+        try:
+            for output_format in self.formats: # every format is encoded by its own ffmpeg process while the .wav is written
+                encoders.append(StreamEncoder(output_format, os.path.splitext(outpath)[0] + OUTPUT_FORMATS[output_format][0],
+                                              self.samplerate, CHANNELS, self.bitdepth, self.ffmpeg))
+            hash_audio = writeAudio(audio_output, outpath, self.samplerate, self.bitdepth, blocksize=self.blocksize,
+                                    hash_algorithm=self.hash_algorithm, dither=self.dither, onBlock=self.blockWritten, timings=self.timings,
+                                    encoders=encoders)
+            stage_start = time.perf_counter()
+            outputs = [{"format": "wav", "filename": os.path.basename(outpath), "hash": hash_audio}]
+            for encoder in encoders:
+                outputs.append({"format": encoder.format, "filename": os.path.basename(encoder.path), "hash": encoder.finish(self.hash_algorithm)})
+            addTiming(self.timings, "encode", stage_start)
+        except BaseException as e:
+            for path in [outpath] + [encoder.path for encoder in encoders]: # no partial or incomplete outputs
+                if os.path.exists(path):
+                    os.remove(path)
+            for encoder in encoders:
+                encoder.abort()
+            if isinstance(e, (EncoderError, OSError)):
+                raise AuralizationError(str(e)) from e
+            raise
+        timestamp = datetime.now()
+
+        if not os.path.exists(outpath):
+            raise AuralizationError("Output File has not been created. Auralization failed!")
+        if os.path.getsize(outpath) <= FILESIZE_THRESHOLD:
+            raise AuralizationError(f"Output-File {os.path.basename(outpath)} seems to be corrupted or empty.")
+
+        entry = {
+            "filename": os.path.basename(outpath),
+            "created": str(timestamp),
+            "samplerate": str(self.samplerate),
+            "bitdepth": str(self.bitdepth),
+            "dither": self.dither,
+            "hashalgorithm": self.hash_algorithm,
+            "outputs": outputs,
+            "midi": {
+                "filename": os.path.basename(midi),
+                "tempo": tempo,
+                "hash": hash_midi
+                },
+            "tempo": str(tempo),
+            "tail": round(tail_length, 3),
+            "plugin": {
+                "name": str(self.instrument),
+                "version": plugin_version,
+                "parameters": parameters},
+            "performance": self.performance(audio_output.shape[1] / self.samplerate)
+            }
+        if self.cache is not None:
+            stage_start = time.perf_counter()
+            self.cache.store(key, outpath, hash_audio, entry, [encoder.path for encoder in encoders])
+            addTiming(self.timings, "cache", stage_start)
+        return [outpath, hash_audio, entry]
+
+    def performance(self, audio_seconds): # seconds per stage, duration & realtime factor of the last auralize() for its protocol entry
+        seconds = sum(self.timings.values())
+        return {"stages": {stage: round(stage_seconds, 4) for stage, stage_seconds in self.timings.items()},
+                "seconds": round(seconds, 4),
+                "render_seconds": round(self.timings.get("render", 0.), 4),
+                "audio_seconds": round(audio_seconds, 4),
+                "realtime_factor": round(audio_seconds / seconds, 2) if seconds else None}
+
+    def restoreCached(self, cached, key, midi, outpath): # links a cached render to outpath and returns a protocol entry referencing it
+        cached_path, hash_audio, cached_entry, cached_outputs = cached
+        linkFile(cached_path, outpath)
+        basename = os.path.splitext(outpath)[0]
+        for cached_output in cached_outputs: # encoded outputs are cached with the extension of their format
+            linkFile(cached_output, basename + os.path.splitext(cached_output)[1])
+        entry = dict(cached_entry)
+        entry["filename"] = os.path.basename(outpath)
+        if "outputs" in cached_entry:
+            entry["outputs"] = [dict(i, filename=os.path.basename(basename) + os.path.splitext(i["filename"])[1]) for i in cached_entry["outputs"]]
+        entry["created"] = str(datetime.now())
+        entry["midi"] = dict(cached_entry["midi"], filename=os.path.basename(midi))
+        entry["cache"] = {"key": key, "filename": cached_entry["filename"], "created": cached_entry["created"]}
+        return [outpath, hash_audio, entry]
+
+    def blockWritten(self, frames_written, frames): # stops after the current block if cancelled, reports the progress otherwise
+        if self.cancelled:
+            raise AuralizationCancelled()
+        if self.onBlock is not None:
+            self.onBlock(frames_written, frames)
+
+    def cancel(self): # cancels a running batch after the current block, can be called from another thread
+        self.cancelled = True
+
+    def auralizeBatch(self, midifiles, tempo, parameters, onEntry=None, onError=None, onFile=None, profile=None): # auralizes all midifiles and returns the paths of the rendered files
+        # onEntry(outpath, hash_audio, entry) is called after every successful Auralization, onError(midi, error) after every failed one,
+        # onFile(index, midi) before every file, profile is the path (without extension) of a cProfile & tracemalloc capture of the first file
+        plugin_version = self.pluginVersion()
+        auralized_files = []
+        self.cancelled = False
+        for index, midi in enumerate(midifiles):
+            if self.cancelled:
+                break
+            if onFile is not None:
+                onFile(index, midi)
+            try:
+                if profile and index == 0:
+                    outpath, hash_audio, entry = profileCall(profile, self.auralize, midi, tempo, parameters, plugin_version)
+                else:
+                    outpath, hash_audio, entry = self.auralize(midi, tempo, parameters, plugin_version)
+            except AuralizationCancelled:
+                break
+            except AuralizationError as e:
+                if onError is not None:
+                    onError(midi, e)
+                continue
+            auralized_files.append(outpath)
+            if onEntry is not None:
+                onEntry(outpath, hash_audio, entry)
+        return auralized_files
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+@description: Compressed Output-Encoders. Every additional format (FLAC, MP3, Opus) is encoded by its own ffmpeg process,
+              fed from a worker thread with the same converted blocks that are written to the .wav, so the .wav doesn't have
+              to be read & decoded again for the post-processing. The encoded files are hashed for the protocol.
+"""
+import os
+import queue
+import shutil
+import threading
+import subprocess
+from .hashes import DEFAULT_HASH, hashFile
+
+OUTPUT_FORMATS = { # format: [extension, ffmpeg output arguments]
+    "flac": [".flac", ["-c:a", "flac", "-compression_level", "5", "-f", "flac"]],
+    "mp3": [".mp3", ["-c:a", "libmp3lame", "-b:a", "320k", "-f", "mp3"]],
+    "opus": [".opus", ["-c:a", "libopus", "-b:a", "192k", "-ar", "48000", "-f", "opus"]] # Opus only supports 48 kHz (and below)
+    }
+RAW_FORMATS = {8: "u8", 16: "s16le", 24: "s24le", 32: "s32le", "32f": "f32le"} # ffmpeg input format of the converted samples
+QUEUE_BLOCKS = 8 # blocks buffered per encoder, bounds the memory if an encoder is slower than the render
+
+class EncoderError(Exception): # raised if ffmpeg isn't available or an output couldn't be encoded
+    pass
+
+def parseFormats(formats): # returns a list of output formats from a list or a comma-separated string, e.g. "flac, mp3"
+    if isinstance(formats, str):
+        formats = formats.split(",")
+    formats = [i.strip().lower() for i in (formats or []) if i.strip()]
+    for i in formats:
+        if i not in OUTPUT_FORMATS:
+            raise ValueError("Unsupported output format: {}".format(i))
+    return list(dict.fromkeys(formats))
+
+def findFFmpeg():
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise EncoderError("Output formats {} need ffmpeg on the PATH.".format(", ".join(OUTPUT_FORMATS)))
+    return ffmpeg
+
+class StreamEncoder: # encodes interleaved sample blocks into one output file with an ffmpeg process
+    def __init__(self, output_format, path, samplerate, channels, bitdepth, ffmpeg=None):
+        arguments = OUTPUT_FORMATS[output_format][1]
+        self.format = output_format
+        self.path = path
+        self.part_path = path + ".part" # an aborted encoder never leaves a truncated output
+        self.process = subprocess.Popen([ffmpeg or findFFmpeg(), "-y", "-loglevel", "error", "-f", RAW_FORMATS[bitdepth], "-ar", str(samplerate),
+                                         "-ac", str(channels), "-i", "pipe:0"] + arguments + [self.part_path],
+                                        stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        self.blocks = queue.Queue(QUEUE_BLOCKS)
+        self.error = None
+        self.thread = threading.Thread(target=self.feed, daemon=True)
+        self.thread.start()
+
+    def feed(self): # worker thread: writes the queued blocks to ffmpeg, None closes the input
+        while True:
+            block = self.blocks.get()
+            if block is None:
+                break
+            if self.error is None: # after an error the queue is only drained, so write() never blocks
+                try:
+                    self.process.stdin.write(block)
+                except OSError as e: # ffmpeg has stopped, its error is reported by finish()
+                    self.error = e
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+
+    def write(self, data): # queues a block of converted samples (bytes), blocks while the encoder is QUEUE_BLOCKS behind
+        self.blocks.put(data)
+
+    def finish(self, hash_algorithm=DEFAULT_HASH): # waits for the encoder, returns the hashcode of the encoded file
+        self.blocks.put(None)
+        self.thread.join()
+        stderr = self.process.stderr.read().decode(errors='replace').strip()
+        self.process.wait()
+        self.process.stderr.close()
+        if self.process.returncode != 0 or self.error is not None:
+            self.removePart()
+            raise EncoderError(f"{self.format} encoding of {os.path.basename(self.path)} failed: {stderr or self.error}")
+        os.replace(self.part_path, self.path)
+        return hashFile(self.path, (hash_algorithm,))[hash_algorithm]
+
+    def abort(self): # stops the encoder without an output
+        self.process.kill()
+        while True: # unblocks the worker thread
+            try:
+                self.blocks.get_nowait()
+            except queue.Empty:
+                break
+        self.blocks.put(None)
+        self.thread.join()
+        self.process.wait()
+        self.process.stderr.close()
+        self.removePart()
+
+    def removePart(self):
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+@description: Output-Format Engine. Converts blocks of the rendered float output into interleaved PCM- or float-samples,
+              using preallocated buffers for clipping, scaling, optional TPDF-Dither and the packing of true 24-bit samples.
+"""
+import numpy as np
+from .wav import WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT
+from .options import BIT_DEPTHS, parseBitDepth
+
+class SampleConverter: # converts float blocks (channels x frames) into interleaved samples (frames x channels) of the bit depth
+    def __init__(self, bitdepth, channels, blocksize, dither=False, seed=None):
+        self.bitdepth = parseBitDepth(bitdepth)
+        self.channels = int(channels)
+        self.blocksize = int(blocksize)
+        self.dither = bool(dither) and self.bitdepth in (8, 16, 24) # 32-bit is far below any analog noise floor
+        self.rng = np.random.default_rng(seed)
+        shape = (self.blocksize, self.channels)
+
+        if self.bitdepth == "32f":
+            self.format_tag = WAVE_FORMAT_IEEE_FLOAT
+            self.sampwidth = 4
+            self.work = np.empty(shape, dtype='<f4')
+            return
+        self.format_tag = WAVE_FORMAT_PCM
+        self.sampwidth = self.bitdepth // 8
+        self.max_val = 2**(self.bitdepth - 1) - 1
+        self.work = np.empty(shape, dtype=np.float64 if self.bitdepth == 32 else np.float32) # float32 is exact up to 24 bit
+        if self.dither:
+            self.noise = np.empty(shape, dtype=self.work.dtype)
+        if self.bitdepth == 8:
+            self.out = np.empty(shape, dtype=np.uint8) # 8-bit .wav is unsigned
+        elif self.bitdepth == 16:
+            self.out = np.empty(shape, dtype='<i2')
+        else:
+            self.out = np.empty(shape, dtype='<i4')
+            if self.bitdepth == 24:
+                self.packed = np.empty((self.blocksize, self.channels, 3), dtype=np.uint8)
+                self.out_bytes = self.out.view(np.uint8).reshape(self.blocksize, self.channels, 4) # little-endian: low 3 bytes first
+
+    def convert(self, block): # returns the converted block as array (frames x channels [x 3]), valid until the next call
+        frames = block.shape[1]
+        work = self.work[:frames]
+        np.copyto(work, block.T) # interleaving copy into the contiguous buffer
+        if self.bitdepth == "32f":
+            return work
+
+        np.multiply(work, self.max_val, out=work)
+        if self.dither: # TPDF: difference of two uniform distributions, +-1 LSB
+            noise = self.noise[:frames]
+            self.rng.random(out=noise, dtype=noise.dtype)
+            np.add(work, noise, out=work)
+            self.rng.random(out=noise, dtype=noise.dtype)
+            np.subtract(work, noise, out=work)
+        np.rint(work, out=work)
+        np.clip(work, -self.max_val - 1, self.max_val, out=work)
+
+        out = self.out[:frames]
+        if self.bitdepth == 8:
+            np.add(work, 128, out=work)
+        np.copyto(out, work, casting='unsafe')
+        if self.bitdepth == 24:
+            packed = self.packed[:frames]
+            np.copyto(packed, self.out_bytes[:frames, :, :3])
+            return packed
+        return out
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+@description: Hash algorithms for the identification of Audio- & MIDI-Files. md5 is kept for compatibility with existing
+              protocols, blake2b (hashlib) and xxhash (optional package, xxh3 128 bit) are faster alternatives.
+"""
+import hashlib
+
+HASH_ALGORITHMS = ["md5", "blake2b", "xxhash"]
+DEFAULT_HASH = "md5" # protocols without a "hashalgorithm" have been hashed with md5
+BLOCKSIZE = 1048576 # bytes read at once when hashing files
+
+def newHash(algorithm): # returns a new hash object with update() & hexdigest()
+    if algorithm == "xxhash":
+        try:
+            import xxhash
+        except ImportError:
+            raise ValueError("Hash algorithm xxhash needs the xxhash package (pip install xxhash).")
+        return xxhash.xxh3_128()
+    if algorithm not in HASH_ALGORITHMS:
+        raise ValueError("Unsupported hash algorithm: {}".format(algorithm))
+    return hashlib.new(algorithm)
+
+def availableAlgorithms(): # returns all hash algorithms that can be used in this environment
+    algorithms = []
+    for algorithm in HASH_ALGORITHMS:
+        try:
+            newHash(algorithm)
+        except ValueError:
+            continue
+        algorithms.append(algorithm)
+    return algorithms
+
+def hashBytes(data, algorithm=DEFAULT_HASH): # returns the hashcode of data that is already in memory
+    hash_data = newHash(algorithm)
+    hash_data.update(data)
+    return hash_data.hexdigest()
+
+def hashFile(path, algorithms=(DEFAULT_HASH,), blocksize=BLOCKSIZE): # reads a file once and returns {algorithm: hashcode} for all algorithms
+    hashes = {algorithm: newHash(algorithm) for algorithm in algorithms}
+    with open(path, "rb") as file:
+        fb = file.read(blocksize)
+        while len(fb) > 0:
+            for hash_file in hashes.values():
+                hash_file.update(fb)
+            fb = file.read(blocksize)
+    return {algorithm: hash_file.hexdigest() for algorithm, hash_file in hashes.items()}
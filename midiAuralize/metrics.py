@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+@description: Metrics of midiAuralizer. Every batch writes a structured log (one JSON object per line) with the seconds per
+              stage, render duration and realtime factor of every file, so slow batches can be analysed afterwards.
+              A single Auralization can additionally be captured with cProfile & tracemalloc.
+"""
+import os
+import io
+import json
+import time
+import pstats
+import cProfile
+import tracemalloc
+from datetime import datetime
+
+METRICS_FOLDER = "metrics"
+PROFILE_FOLDER = "profiles"
+
+class MetricsLog: # JSONL-Log of one batch, written line by line so an aborted batch keeps its metrics
+    def __init__(self, folder, **batch):
+        os.makedirs(folder, exist_ok=True)
+        self.start_time = time.perf_counter()
+        self.path = os.path.join(folder, f"{datetime.now():%Y-%m-%d_%H-%M-%S}_{os.getpid()}.jsonl")
+        self.file = open(self.path, "a", encoding='UTF-8')
+        self.totals = {"files": 0, "rendered": 0, "cached": 0, "failed": 0, "audio_seconds": 0., "stages": {}}
+        self.write("batch_start", **batch)
+
+    def write(self, event, **values):
+        self.file.write(json.dumps(dict(event=event, time=str(datetime.now()), **values), separators=(',', ':')) + "\n")
+        self.file.flush()
+
+    def entry(self, outpath, entry): # logs a rendered or restored file with the performance of its protocol entry
+        performance = entry.get("performance", {})
+        cached = "cache" in entry
+        self.totals["files"] += 1
+        self.totals["cached" if cached else "rendered"] += 1
+        self.totals["audio_seconds"] += performance.get("audio_seconds", 0.)
+        for stage, seconds in performance.get("stages", {}).items():
+            self.totals["stages"][stage] = self.totals["stages"].get(stage, 0.) + seconds
+        self.write("file", midi=entry["midi"]["filename"], output=outpath, cached=cached, **performance)
+
+    def error(self, midi, error):
+        self.totals["files"] += 1
+        self.totals["failed"] += 1
+        self.write("error", midi=midi, error=str(error))
+
+    def close(self, cancelled=False): # logs the totals of the batch
+        if self.file.closed:
+            return
+        elapsed = time.perf_counter() - self.start_time
+        self.write("batch_end", seconds=round(elapsed, 4), cancelled=cancelled,
+                   files_per_sec=round(self.totals["files"] / elapsed, 4) if elapsed else None,
+                   realtime_factor=round(self.totals["audio_seconds"] / elapsed, 4) if elapsed else None,
+                   **dict(self.totals, stages={stage: round(seconds, 4) for stage, seconds in self.totals["stages"].items()}))
+        self.file.close()
+
+def profileCall(path, function, *args, **kwargs): # runs function with cProfile & tracemalloc, writes <path>.prof and a summary to <path>.txt
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    profiler = cProfile.Profile()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    profiler.enable()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if not tracing:
+            tracemalloc.stop()
+        profiler.dump_stats(path + ".prof")
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(30)
+        summary.write(f"\ntracemalloc: {current / 1048576:.1f} MB allocated, peak {peak / 1048576:.1f} MB\n")
+        for stat in snapshot.statistics("lineno")[:20]:
+            summary.write(f"{stat}\n")
+        with open(path + ".txt", "w", encoding='UTF-8') as summary_file:
+            summary_file.write(summary.getvalue())
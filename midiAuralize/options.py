@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+@description: Render options shared by the GUI, the Commandline-Version and the Render Core. This module doesn't import
+              dawdreamer, numpy or mido, so the GUI can show its window before the Render Core is loaded.
+"""
+import os
+
+BIT_DEPTHS = ["8", "16", "24", "32", "32f"] # 32f: 32-bit float
+TAIL = 5. # seconds rendered after the last MIDI-Event (fixed tail)
+ADAPTIVE_TAIL = {"threshold": -80., "hold": 0.5, "max": 30.} # dBFS, seconds below threshold, max. seconds after the last MIDI-Event
+
+def parseBitDepth(bitdepth): # returns 8, 16, 24, 32 or "32f" for values from settings, CLI or GUI
+    bitdepth = str(bitdepth).strip().lower()
+    if bitdepth in ("32f", "float", "32float"):
+        return "32f"
+    if bitdepth not in BIT_DEPTHS:
+        raise ValueError("Unsupported bit depth: {}".format(bitdepth))
+    return int(bitdepth)
+
+def outputName(midi): # filename of the .wav rendered from a MIDI-File
+    return os.path.splitext(os.path.basename(midi))[0] + ".wav"
+
+def duplicateOutputs(midifiles): # returns {output filename: [MIDI-Files]} of the MIDI-Files that would be rendered to the same file
+    outputs = {}
+    for midi in midifiles:
+        outputs.setdefault(outputName(midi).lower(), []).append(midi) # Windows filenames are case-insensitive
+    return {name: files for name, files in outputs.items() if len(files) > 1}
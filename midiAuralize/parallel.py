@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+@description: Parallel Auralization on a process pool. Every worker builds its own Auralizer (RenderEngine & plugin processor)
+              and applies the saved parameters once, then takes MIDI-Files from the shared task queue of the pool.
+              Results & protocol entries are sent back to the parent process, which stays the only writer of the protocol.
+"""
+import os
+import multiprocessing
+from .core import Auralizer, AuralizationError
+
+_auralizer = None # Auralizer of the current worker process
+_job = None
+_init_error = None
+
+def initWorker(config, job): # builds the Auralizer of a worker process once, loading errors are reported by every task
+    global _auralizer, _job, _init_error
+    _job = job
+    try:
+        _auralizer = Auralizer(**config)
+        _auralizer.loadInstrument(job['instrument'], job['parameters'] if job['apply_parameters'] else None)
+    except Exception as e:
+        _init_error = f"Instrument {job['instrument']} could not be loaded: {e}"
+
+def renderTask(midi): # renders a single MIDI-File in a worker process, returns [midi, outpath, hash_audio, entry, error]
+    if _init_error is not None:
+        return [midi, None, None, None, _init_error]
+    try:
+        outpath, hash_audio, entry = _auralizer.auralize(midi, _job['tempo'], _job['parameters'], _job['plugin_version'])
+    except AuralizationError as e:
+        return [midi, None, None, None, str(e)]
+    return [midi, outpath, hash_audio, entry, None]
+
+def countWorkers(workers, jobs): # number of worker processes, 0 or None uses all cores
+    if not workers:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, jobs))
+
+def auralizeParallel(config, instrument, midifiles, tempo, parameters, plugin_version, workers=None, apply_parameters=True,
+                     onEntry=None, onError=None): # auralizes midifiles on a process pool and returns the paths of the rendered files
+    # config holds the arguments of the workers' Auralizers (vst_path, out_path, samplerate, bitdepth, chunksize, blocksize, hash_algorithm, cache, force, tail, dither, reset_state, formats), the callbacks are the same as in Auralizer.auralizeBatch
+    job = {
+        "instrument": instrument,
+        "tempo": tempo,
+        "parameters": parameters,
+        "plugin_version": plugin_version,
+        "apply_parameters": apply_parameters
+        }
+    auralized_files = []
+    context = multiprocessing.get_context("spawn") # VST-Hosts are not fork-safe
+    with context.Pool(countWorkers(workers, len(midifiles)), initializer=initWorker, initargs=(config, job)) as pool:
+        for midi, outpath, hash_audio, entry, error in pool.imap_unordered(renderTask, midifiles, chunksize=1):
+            if error is not None:
+                if onError is not None:
+                    onError(midi, AuralizationError(error))
+                continue
+            auralized_files.append(outpath)
+            if onEntry is not None:
+                onEntry(outpath, hash_audio, entry)
+    return auralized_files
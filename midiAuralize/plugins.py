@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+@description: VST-Instruments of midiAuralizer.
+              Plugin-Index: persistent inventory of the VST-Path (name, size & mtime, version, parameter names, channels) in an
+              SQLite-Database, only new or changed .dll-Files are scanned again. Probing the parameters instantiates every
+              plugin, so a full scan runs on a process pool.
+              Plugin-Processor Cache: instantiated VST-Instruments stay loaded in the RenderEngine, keyed by the path and
+              modification time of their .dll-File, so switching back to a recently used Instrument doesn't load it again.
+              The least recently used processors are dropped if the count or memory limit is exceeded.
+"""
+import os
+import json
+import sqlite3
+import threading
+import multiprocessing
+from collections import OrderedDict
+from .hashes import hashBytes
+
+try:
+    import psutil
+except ImportError: # without psutil only the count limit is applied
+    psutil = None
+
+try:
+    from win32api import GetFileVersionInfo, LOWORD, HIWORD
+except ImportError: # version resources are only available for Windows-DLLs
+    GetFileVersionInfo = None
+
+PLUGIN_EXTENSION = ".dll"
+PLUGIN_CACHE = 4 # default number of Instruments kept loaded
+PLUGIN_INDEX_FILE = "plugins.sqlite"
+
+def listInstruments(vst_path): # returns the names of all VST-Instruments located in vst_path
+    instruments = []
+    if os.path.exists(vst_path):
+        for i in os.listdir(vst_path):
+            if i[-4:] == PLUGIN_EXTENSION:
+                instruments.append(i[:-4])
+    return instruments
+
+def getFileVersion(path): # gets the version resource of a .dll-File, "unknown" if it has none
+    if GetFileVersionInfo is None:
+        return "unknown"
+    try:
+        info = GetFileVersionInfo(path, "\\")
+    except Exception: # pywintypes.error: no version resource
+        return "unknown"
+    ms = info['FileVersionMS']
+    ls = info['FileVersionLS']
+    version = f"{HIWORD (ms)}.{LOWORD (ms)}.{HIWORD (ls)}.{LOWORD (ls)}"
+    return version
+
+def getPluginVersion(instrument, vst_path): # gets plugin version from the VSTs .dll-File
+    return getFileVersion(os.path.join(vst_path, instrument + PLUGIN_EXTENSION))
+
+def normPath(path): # paths are compared case-insensitive & absolute on Windows
+    return os.path.normcase(os.path.abspath(path))
+
+def describeProcessor(processor): # returns parameter names & channel layout of an instantiated plugin
+    return {"parameters": [processor.get_parameter_name(i) for i in range(processor.get_plugin_parameter_size())],
+            "inputs": processor.get_num_input_channels(),
+            "outputs": processor.get_num_output_channels()}
+
+def scanPlugin(task): # scans [path, probe] and returns its index row, probing instantiates the plugin in its own RenderEngine
+    path, probe = task
+    stat = os.stat(path)
+    info = {"path": normPath(path), "folder": normPath(os.path.dirname(path)), "name": os.path.basename(path)[:-len(PLUGIN_EXTENSION)],
+            "size": stat.st_size, "mtime": stat.st_mtime, "version": getFileVersion(path),
+            "parameters": None, "inputs": None, "outputs": None, "error": None}
+    if probe:
+        try:
+            import dawdreamer as daw
+            engine = daw.RenderEngine(44100, 1024)
+            info.update(describeProcessor(engine.make_plugin_processor(info["name"], path)))
+        except Exception as e:
+            info["error"] = str(e)
+    return info
+
+class PluginIndex: # inventory of the VST-Paths in db/plugins.sqlite
+    COLUMNS = ["path", "folder", "name", "size", "mtime", "version", "parameters", "inputs", "outputs", "error"]
+
+    def __init__(self, db_path):
+        self.lock = threading.Lock() # shared by the GUI-, Loader- & Auralization-Threads
+        self.connection = sqlite3.connect(os.path.join(db_path, PLUGIN_INDEX_FILE), timeout=60, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS plugins (path TEXT PRIMARY KEY, folder TEXT NOT NULL, name TEXT NOT NULL,
+                                   size INTEGER NOT NULL, mtime REAL NOT NULL, version TEXT, parameters TEXT, inputs INTEGER,
+                                   outputs INTEGER, error TEXT)""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS idx_plugins_folder ON plugins (folder)")
+        self.connection.commit()
+
+    def store(self, info):
+        row = dict(info, parameters=None if info["parameters"] is None else json.dumps(info["parameters"]))
+        with self.lock, self.connection:
+            self.connection.execute(f"INSERT OR REPLACE INTO plugins ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                                    [row[i] for i in self.COLUMNS])
+
+    def get(self, path): # returns the index row of a .dll-File or None
+        with self.lock:
+            row = self.connection.execute(f"SELECT {', '.join(self.COLUMNS)} FROM plugins WHERE path = ?", (normPath(path),)).fetchone()
+        if row is None:
+            return None
+        info = dict(zip(self.COLUMNS, row))
+        if info["parameters"] is not None:
+            info["parameters"] = json.loads(info["parameters"])
+        return info
+
+    def update(self, vst_path, probe=False, workers=1, full=False, onPlugin=None): # scans new & changed .dll-Files of vst_path, returns their rows
+        # probe also scans unprobed plugins, full scans all plugins again, onPlugin(info) is called after every scanned plugin
+        folder = normPath(vst_path)
+        with self.lock:
+            indexed = {path: [size, mtime, parameters, error] for path, size, mtime, parameters, error in self.connection.execute(
+                "SELECT path, size, mtime, parameters, error FROM plugins WHERE folder = ?", (folder,))}
+        tasks = []
+        found = set()
+        if os.path.isdir(vst_path):
+            for entry in os.scandir(vst_path): # the stat results come with the directory listing on Windows
+                if not entry.name.endswith(PLUGIN_EXTENSION) or not entry.is_file():
+                    continue
+                path = normPath(entry.path)
+                found.add(path)
+                stat = entry.stat()
+                row = indexed.get(path)
+                if full or row is None or row[:2] != [stat.st_size, stat.st_mtime] or (probe and row[2] is None and row[3] is None):
+                    tasks.append([entry.path, probe])
+        with self.lock, self.connection:
+            self.connection.executemany("DELETE FROM plugins WHERE path = ?", [(i,) for i in indexed if i not in found])
+
+        scanned = []
+        if probe and workers != 1 and len(tasks) > 1: # every probe runs in a separate process, a crashing plugin doesn't stop the scan
+            context = multiprocessing.get_context("spawn")
+            with context.Pool(min(workers or os.cpu_count() or 1, len(tasks))) as pool:
+                results = pool.imap_unordered(scanPlugin, tasks, chunksize=1)
+                for info in results:
+                    self.store(info)
+                    scanned.append(info)
+                    if onPlugin is not None:
+                        onPlugin(info)
+        else:
+            for task in tasks:
+                info = scanPlugin(task)
+                self.store(info)
+                scanned.append(info)
+                if onPlugin is not None:
+                    onPlugin(info)
+        return scanned
+
+    def instruments(self, vst_path): # returns the names of all indexed Instruments of vst_path
+        with self.lock:
+            return [i[0] for i in self.connection.execute("SELECT name FROM plugins WHERE folder = ? ORDER BY name", (normPath(vst_path),))]
+
+    def current(self, path): # returns the up-to-date row of a .dll-File, scans it again if it has changed
+        info = self.get(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            raise RuntimeError('Unable to load plugin.') # same error as the RenderEngine
+        if info is None or [info["size"], info["mtime"]] != [stat.st_size, stat.st_mtime]:
+            info = scanPlugin([path, False])
+            self.store(info)
+        return info
+
+    def version(self, path): # version of a .dll-File without reading its version resource again
+        return self.current(path)["version"]
+
+    def describe(self, path, processor): # stores parameter names & channels of a loaded plugin, if they aren't indexed yet
+        info = self.current(path)
+        if info["parameters"] is None:
+            info.update(describeProcessor(processor), error=None)
+            self.store(info)
+
+    def close(self):
+        self.connection.close()
+
+def processMemory(): # resident memory of this process in bytes, None if psutil isn't available
+    if psutil is None:
+        return None
+    return psutil.Process().memory_info().rss
+
+def processorName(name, path): # name of a processor in the RenderEngine, unique per .dll-File (Instruments of the same name can be in different folders)
+    return f"{name}_{hashBytes(os.path.normcase(os.path.abspath(path)).encode('UTF-8'), 'md5')[:8]}"
+
+class ProcessorCache: # LRU cache of plugin processors of one RenderEngine, thread-safe (preloading runs in the background)
+    def __init__(self, engine, max_count=PLUGIN_CACHE, max_memory=None):
+        self.engine = engine
+        self.lock = threading.RLock() # also held by the Render Core while the engine renders
+        self.processors = OrderedDict() # (path, mtime) -> [processor name, processor, memory in bytes]
+        self.current = None # key of the Instrument used by the Render Core, never evicted
+        self.preloading = None
+        self.setLimits(max_count, max_memory)
+
+    def setLimits(self, max_count=PLUGIN_CACHE, max_memory=None): # max_memory in MB, None or 0 for no memory limit
+        self.max_count = max(int(max_count), 1) # the current Instrument is always kept
+        self.max_memory = int(max_memory) * 1048576 if max_memory else None
+        with self.lock:
+            self.evict()
+
+    def get(self, name, path, current=True): # returns the processor of an Instrument, loads it if it isn't cached (or its .dll has changed)
+        if not os.path.isfile(path):
+            raise RuntimeError('Unable to load plugin.') # same error as the RenderEngine
+        key = (path, os.path.getmtime(path))
+        with self.lock:
+            if key not in self.processors:
+                for cached_key in [i for i in self.processors if i[0] == path]: # outdated .dll
+                    self.drop(cached_key)
+                memory_before = processMemory()
+                processor_name = processorName(name, path)
+                processor = self.engine.make_plugin_processor(processor_name, path)
+                memory = processMemory() - memory_before if memory_before is not None else 0
+                self.processors[key] = [processor_name, processor, max(memory, 0)]
+            self.processors.move_to_end(key)
+            if current:
+                self.current = key
+            self.evict()
+            return self.processors[key][1]
+
+    def preload(self, name, path): # loads an Instrument in a background thread, errors are ignored (it is loaded again when chosen)
+        def run():
+            try:
+                self.get(name, path, current=False)
+            except (RuntimeError, OSError):
+                pass
+        self.preloading = threading.Thread(target=run, daemon=True)
+        self.preloading.start()
+        return self.preloading
+
+    def memory(self): # estimated memory of all cached processors in bytes
+        return sum(i[2] for i in self.processors.values())
+
+    def evict(self): # drops the least recently used processors (except the current one) until both limits are met
+        for key in list(self.processors):
+            if len(self.processors) <= self.max_count and (self.max_memory is None or self.memory() <= self.max_memory):
+                break
+            if key != self.current:
+                self.drop(key)
+
+    def drop(self, key):
+        name = self.processors.pop(key)[0]
+        if hasattr(self.engine, "remove_processor") and name not in [i[0] for i in self.processors.values()]:
+            self.engine.remove_processor(name)
+
+    def clear(self):
+        with self.lock:
+            for key in list(self.processors):
+                self.drop(key)
+            self.current = None
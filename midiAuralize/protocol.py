@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+@description: Protocol-Store of midiAuralizer. Entries are appended to an SQLite-Database and looked up through an index
+              on the audio hash, so writing an entry doesn't re-serialize the whole protocol and reading one doesn't load it.
+              MIDI hash & filename, plugin name & version, tempo, samplerate, creation time, filename and hash algorithm are indexed
+              columns, filtered queries & exports (CSV, JSONL) stream from these indexes instead of scanning all entries.
+              Parameter sets are stored once in a content-addressed table, entries reference them by their canonical hash
+              ({"$ref": hash} instead of the parameters) and are resolved transparently when they are read.
+              An existing protocol.json is migrated once when the database is created.
+"""
+import os
+import re
+import csv
+import json
+import sqlite3
+import hashlib
+from collections import OrderedDict
+
+PROTOCOL_FILE = "protocol.sqlite"
+LEGACY_PROTOCOL_FILE = "protocol.json"
+INDEX_COLUMNS = { # indexed column: SQL type
+    "midi_hash": "TEXT",
+    "midi_filename": "TEXT",
+    "plugin_name": "TEXT",
+    "plugin_version": "TEXT",
+    "tempo": "REAL",
+    "samplerate": "INTEGER",
+    "created": "TEXT",
+    "filename": "TEXT",
+    "hashalgorithm": "TEXT"
+    }
+INDEXES = {"midi_hash": ["midi_hash"], "midi_filename": ["midi_filename"], "plugin": ["plugin_name", "plugin_version"],
+           "tempo": ["tempo"], "samplerate": ["samplerate"], "created": ["created"], "filename": ["filename"],
+           "hashalgorithm": ["hashalgorithm"]}
+EXPORT_FORMATS = ["csv", "jsonl"]
+PARAMETER_REF = re.compile(r'\{"\$ref":"([0-9a-f]{64})"\}') # reference of a parameter set in a stored entry
+PARAMETER_CACHE = 256 # resolved parameter sets kept in memory
+BATCH_SIZE = 1000 # entries read at once by upgrade() & compact()
+CSV_COLUMNS = ["hash", "hashalgorithm", "filename", "created", "midi_filename", "midi_hash", "tempo", "samplerate", "bitdepth", "tail",
+               "plugin_name", "plugin_version", "parameters"]
+
+def toNumber(value, number_type): # converts a value of a (legacy) entry, None if it isn't a number
+    try:
+        return number_type(value)
+    except (TypeError, ValueError):
+        return None
+
+def parameterKey(parameters): # canonical hash of a parameter set
+    return hashlib.sha256(json.dumps(parameters, sort_keys=True, separators=(',', ':')).encode('UTF-8')).hexdigest()
+
+def isReference(parameters):
+    return isinstance(parameters, dict) and list(parameters) == ["$ref"]
+
+def indexValues(entry): # returns the values of the indexed columns of a protocol entry, missing values (legacy entries) are None
+    midi = entry.get("midi") or {}
+    plugin = entry.get("plugin") or {}
+    return [midi.get("hash"), midi.get("filename"), plugin.get("name"), plugin.get("version"),
+            toNumber(midi.get("tempo", entry.get("tempo")), float), toNumber(entry.get("samplerate"), int), entry.get("created"),
+            entry.get("filename"), entry.get("hashalgorithm") or "md5"]
+
+def variantRecord(entry): # instrument, variant, overrides, filename & parameters (a stored reference) of a sweep entry
+    plugin = entry.get("plugin") or {}
+    return {"instrument": plugin.get("name"), "variant": entry["sweep"].get("variant"), "overrides": entry["sweep"].get("overrides"),
+            "filename": entry.get("filename"), "parameters": plugin.get("parameters")}
+
+class ProtocolStore: # append-only protocol, the latest entry of an audio hash is the valid one
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        # current marks the latest (valid) entry of every audio hash
+        self.connection.execute(f"""CREATE TABLE IF NOT EXISTS entries (id INTEGER PRIMARY KEY AUTOINCREMENT, hash TEXT NOT NULL, entry TEXT NOT NULL,
+                                    current INTEGER NOT NULL DEFAULT 1, {', '.join(f'{i} {j}' for i, j in INDEX_COLUMNS.items())})""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS idx_entries_hash ON entries (hash)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS parameter_sets (key TEXT PRIMARY KEY, parameters TEXT NOT NULL)")
+        self.parameter_sets = OrderedDict() # key -> JSON text of recently stored or resolved parameter sets
+        columns = [i[1] for i in self.connection.execute("PRAGMA table_info(entries)")]
+        if "current" not in columns or any(i not in columns for i in INDEX_COLUMNS):
+            self.upgrade(columns)
+        for name, columns in INDEXES.items():
+            self.connection.execute(f"CREATE INDEX IF NOT EXISTS idx_entries_{name} ON entries ({', '.join(columns)})")
+        self.connection.commit()
+
+    def upgrade(self, columns): # adds & fills the indexed columns of a protocol created before they existed
+        with self.connection:
+            if "current" not in columns:
+                self.connection.execute("ALTER TABLE entries ADD COLUMN current INTEGER NOT NULL DEFAULT 1")
+            for column, column_type in INDEX_COLUMNS.items():
+                if column not in columns:
+                    self.connection.execute(f"ALTER TABLE entries ADD COLUMN {column} {column_type}")
+            for rows in self.batches():
+                self.connection.executemany(f"UPDATE entries SET {', '.join(f'{i} = ?' for i in INDEX_COLUMNS)} WHERE id = ?",
+                                            [indexValues(json.loads(self.resolve(entry))) + [row_id] for row_id, entry in rows])
+            if "current" not in columns:
+                self.connection.execute("UPDATE entries SET current = 0 WHERE id NOT IN (SELECT MAX(id) FROM entries GROUP BY hash)")
+
+    def batches(self): # iterates over the stored entries in lists of BATCH_SIZE [id, entry], only one batch is held in memory
+        last_id = 0
+        while True:
+            rows = self.connection.execute("SELECT id, entry FROM entries WHERE id > ? ORDER BY id LIMIT ?", (last_id, BATCH_SIZE)).fetchall()
+            if not rows:
+                break
+            yield rows
+            last_id = rows[-1][0]
+
+    def insert(self, hash_audio, entry): # appends an entry inside of a transaction, the former entries of its hash aren't current anymore
+        stored = self.storeParameters(entry)
+        if isinstance(stored.get("sweep"), dict):
+            stored = self.sweepVariants(hash_audio, stored)
+        self.connection.execute("UPDATE entries SET current = 0 WHERE hash = ? AND current = 1", (hash_audio,))
+        self.connection.execute(f"INSERT INTO entries (hash, entry, {', '.join(INDEX_COLUMNS)}) VALUES (?, ?{', ?' * len(INDEX_COLUMNS)})",
+                                [hash_audio, json.dumps(stored, separators=(',', ':'))] + indexValues(entry))
+
+    def sweepVariants(self, hash_audio, entry): # sweep variants rendering identical audio share one entry, which lists all of them under sweep.variants
+        row = self.connection.execute("SELECT entry FROM entries WHERE hash = ? AND current = 1", (hash_audio,)).fetchone()
+        previous = json.loads(row[0]) if row is not None else {}
+        if not isinstance(previous.get("sweep"), dict):
+            return entry
+        variants = previous["sweep"].get("variants") or [variantRecord(previous)]
+        record = variantRecord(entry)
+        variants = [i for i in variants if [i.get("instrument"), i.get("variant")] != [record["instrument"], record["variant"]]] + [record]
+        if len(variants) == 1: # the same variant rendered again
+            return entry
+        return dict(entry, sweep=dict(entry["sweep"], variants=variants))
+
+    def storeParameters(self, entry): # stores the parameter set of an entry once, returns the entry referencing it
+        plugin = entry.get("plugin")
+        if not isinstance(plugin, dict) or not isinstance(plugin.get("parameters"), dict) or isReference(plugin["parameters"]):
+            return entry
+        key = parameterKey(plugin["parameters"])
+        if key not in self.parameter_sets:
+            text = json.dumps(plugin["parameters"], separators=(',', ':'))
+            self.connection.execute("INSERT OR IGNORE INTO parameter_sets (key, parameters) VALUES (?, ?)", (key, text))
+            self.cacheParameters(key, text)
+        return dict(entry, plugin=dict(plugin, parameters={"$ref": key}))
+
+    def cacheParameters(self, key, text):
+        self.parameter_sets[key] = text
+        self.parameter_sets.move_to_end(key)
+        if len(self.parameter_sets) > PARAMETER_CACHE:
+            self.parameter_sets.popitem(last=False)
+
+    def parameterText(self, key): # JSON text of a stored parameter set, null if it is missing
+        if key not in self.parameter_sets:
+            row = self.connection.execute("SELECT parameters FROM parameter_sets WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return "null"
+            self.cacheParameters(key, row[0])
+        return self.parameter_sets[key]
+
+    def resolve(self, text): # returns the stored JSON text of an entry with its parameter set instead of the reference
+        return PARAMETER_REF.sub(lambda match: self.parameterText(match.group(1)), text)
+
+    def add(self, hash_audio, entry): # appends a protocol entry
+        with self.connection:
+            self.insert(hash_audio, entry)
+
+    def get(self, hash_audio): # returns the entry of an audio hash, raises KeyError like the former protocol dict
+        row = self.connection.execute("SELECT entry FROM entries WHERE hash = ? ORDER BY id DESC LIMIT 1", (hash_audio,)).fetchone()
+        if row is None:
+            raise KeyError(hash_audio)
+        return json.loads(self.resolve(row[0]))
+
+    def __getitem__(self, hash_audio):
+        return self.get(hash_audio)
+
+    def __contains__(self, hash_audio):
+        return self.connection.execute("SELECT 1 FROM entries WHERE hash = ? LIMIT 1", (hash_audio,)).fetchone() is not None
+
+    def hasFilename(self, filename): # True if a file of this name has been rendered
+        return self.connection.execute("SELECT 1 FROM entries WHERE filename = ? LIMIT 1", (filename,)).fetchone() is not None
+
+    def hashAlgorithms(self): # hash algorithms used by the entries (md5 for entries without "hashalgorithm")
+        # skips through the index from one algorithm to the next, so it doesn't depend on the number of entries
+        algorithms = []
+        algorithm = self.connection.execute("SELECT MIN(hashalgorithm) FROM entries").fetchone()[0]
+        while algorithm is not None:
+            algorithms.append(algorithm)
+            algorithm = self.connection.execute("SELECT MIN(hashalgorithm) FROM entries WHERE hashalgorithm > ?", (algorithm,)).fetchone()[0]
+        return algorithms
+
+    def __len__(self): # number of distinct audio hashes
+        return self.connection.execute("SELECT COUNT(*) FROM entries WHERE current = 1").fetchone()[0]
+
+    def items(self): # iterates over [hash, entry] of the valid entries without loading the whole protocol
+        return self.query()
+
+    def select(self, midi_hash=None, midi_filename=None, plugin_name=None, plugin_version=None, tempo=None, samplerate=None, since=None, before=None):
+        # returns the WHERE clause & values of a filtered query of the valid entries,
+        # midi_filename may contain wildcards (* and ?), since & before are compared with the creation time (e.g. "2024-01-31")
+        conditions = ["current = 1"]
+        values = []
+        for column, value in [["midi_hash", midi_hash], ["plugin_name", plugin_name], ["plugin_version", plugin_version],
+                              ["tempo", tempo], ["samplerate", samplerate]]:
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                values.append(value)
+        if midi_filename is not None:
+            conditions.append("midi_filename GLOB ?" if any(i in midi_filename for i in "*?[") else "midi_filename = ?")
+            values.append(midi_filename)
+        if since is not None:
+            conditions.append("created >= ?")
+            values.append(str(since))
+        if before is not None:
+            conditions.append("created < ?")
+            values.append(str(before))
+        return " AND ".join(conditions), values
+
+    def query(self, raw=False, **filters): # iterates over [hash, entry] of the valid entries matching the filters (see select())
+        # streamed from the index of the most selective filter (in its order, otherwise in protocol order), raw returns the entries as JSON text
+        where, values = self.select(**filters)
+        order = " ORDER BY id" if len(values) == 0 else ""
+        for hash_audio, entry in self.connection.execute(f"SELECT hash, entry FROM entries WHERE {where}{order}", values):
+            entry = self.resolve(entry)
+            yield [hash_audio, entry if raw else json.loads(entry)]
+
+    def count(self, **filters): # number of valid entries matching the filters
+        where, values = self.select(**filters)
+        return self.connection.execute(f"SELECT COUNT(*) FROM entries WHERE {where}", values).fetchone()[0]
+
+    def export(self, file, export_format="csv", **filters): # streams the valid entries matching the filters into a text file, returns their number
+        count = 0
+        if export_format == "jsonl": # the stored JSON is written with its parameter set, without parsing it
+            for hash_audio, entry in self.query(raw=True, **filters):
+                file.write(f'{{"hash":{json.dumps(hash_audio)},"entry":{entry}}}\n')
+                count += 1
+            return count
+        if export_format != "csv":
+            raise ValueError(f"Unsupported export format: {export_format}")
+        writer = csv.writer(file)
+        writer.writerow(CSV_COLUMNS)
+        for hash_audio, entry in self.query(**filters):
+            midi = entry.get("midi") or {}
+            plugin = entry.get("plugin") or {}
+            writer.writerow([hash_audio, entry.get("hashalgorithm", "md5"), entry.get("filename"), entry.get("created"), midi.get("filename"),
+                             midi.get("hash"), midi.get("tempo", entry.get("tempo")), entry.get("samplerate"), entry.get("bitdepth"),
+                             entry.get("tail"), plugin.get("name"), plugin.get("version"), json.dumps(plugin.get("parameters"))])
+            count += 1
+        return count
+
+    def getMeta(self, key, default=None):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def setMeta(self, key, value):
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def migrate(self, json_path): # one-shot import of a protocol.json, returns the number of imported entries
+        if self.getMeta("migrated") == os.path.abspath(json_path):
+            return 0
+        with open(json_path, encoding='UTF-8') as json_file:
+            legacy_protocol = json.load(json_file)
+        with self.connection:
+            for hash_audio, entry in legacy_protocol.items():
+                self.insert(hash_audio, entry)
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", ("migrated", os.path.abspath(json_path)))
+        return len(legacy_protocol)
+
+    def compact(self, vacuum=True): # replaces the parameter sets embedded in older entries by references, returns the number of compacted entries
+        # vacuum shrinks the database file afterwards
+        compacted = 0
+        with self.connection:
+            for rows in self.batches():
+                updates = []
+                for row_id, text in rows:
+                    if PARAMETER_REF.search(text):
+                        continue
+                    entry = json.loads(text)
+                    stored = self.storeParameters(entry)
+                    if stored is not entry:
+                        updates.append([json.dumps(stored, separators=(',', ':')), row_id])
+                self.connection.executemany("UPDATE entries SET entry = ? WHERE id = ?", updates)
+                compacted += len(updates)
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", ("compacted", "1"))
+        if vacuum and compacted:
+            self.connection.execute("VACUUM")
+        return compacted
+
+    def parameterSets(self): # number of stored parameter sets
+        return self.connection.execute("SELECT COUNT(*) FROM parameter_sets").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+def openProtocol(db_path): # opens the protocol in the db-folder, migrates an existing protocol.json & compacts older entries once
+    store = ProtocolStore(os.path.join(db_path, PROTOCOL_FILE))
+    legacy_path = os.path.join(db_path, LEGACY_PROTOCOL_FILE)
+    if os.path.exists(legacy_path) and store.getMeta("migrated") is None:
+        store.migrate(legacy_path)
+    if store.getMeta("compacted") is None:
+        store.compact()
+    return store
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+@description: Parameter-Sweep of midiAuralizer, e.g. for dataset generation. Renders the same MIDI-Files through several
+              Instruments and a grid or list of parameter overrides (e.g. Condition, mic positions or reverb of Pianoteq).
+              Every MIDI-File is read, hashed and tempo-processed once, the (MIDI x variant) jobs are ordered by Instrument &
+              variant, so a parameter set is only applied when the variant changes, and distributed over one or more
+              RenderEngines. Every variant is written to <outdir>/<Instrument>/<variant> and gets its own protocol entry,
+              which lists the overridden parameters under "sweep". Variants rendering identical audio share the entry of their
+              audio hash, it lists all of them under "sweep"/"variants" (see ProtocolStore.sweepVariants).
+@spec: {"instruments": ["Pianoteq 6 (64-bit)"],
+        "grid": {"Condition": [0.0, 0.5, 1.0], "Reverb Switch": [0.0, 1.0]},
+        "variants": [{"name": "close", "parameters": {"Mic Position": 0.2}}, {"name": "far", "parameters": {"Mic Position": 0.9}}]}
+"""
+import os
+import re
+import json
+import itertools
+import multiprocessing
+from .core import Auralizer, AuralizationError, AuralizationCancelled, prepareMidi
+from .parallel import countWorkers
+
+def loadSweep(path): # loads a sweep spec from a .json-File
+    with open(path, encoding='UTF-8') as json_file:
+        return json.load(json_file)
+
+def variantName(overrides): # folder name of a variant, built from its overrides
+    if not overrides:
+        return "default"
+    name = "_".join(f"{parameter}={value}" for parameter, value in overrides.items())
+    return re.sub(r'[<>:"/\\|?*\s]+', "-", name)[:120] # valid on Windows
+
+def expandVariants(spec): # returns the variants [{name, overrides}] of a sweep spec: every entry of its list combined with every point of its grid
+    grid = spec.get("grid", {})
+    points = [dict(zip(grid, values)) for values in itertools.product(*grid.values())] # [{}] without a grid
+    variants = []
+    for preset in spec.get("variants") or [{}]:
+        for point in points:
+            overrides = dict(preset.get("parameters", {}), **point)
+            if preset.get("name"):
+                name = preset["name"] + ("_" + variantName(point) if point else "")
+            else:
+                name = variantName(overrides)
+            variants.append({"name": name, "overrides": overrides})
+    names = [i["name"] for i in variants]
+    if len(set(names)) != len(names):
+        raise ValueError("The variants of the sweep don't have unique names.")
+    return variants
+
+def planJobs(instruments, variants, count): # returns the (MIDI x variant) jobs [instrument, variant, MIDI index], grouped by Instrument & variant
+    return [[instrument, variant, index] for instrument in instruments for variant in variants for index in range(count)]
+
+class SweepRunner: # renders sweep jobs with one Auralizer, the Instrument & parameters are only changed with the variant
+    def __init__(self, auralizer, out_path, prepared, tempo, base_parameters=None):
+        # base_parameters holds the saved parameters per Instrument, the overrides are applied to them (or to the Instrument's defaults)
+        self.auralizer = auralizer
+        self.out_path = out_path
+        self.prepared = prepared
+        self.tempo = tempo
+        self.base_parameters = base_parameters or {}
+        self.current = None # (instrument, variant name) whose parameters are applied
+        self.failed = {} # (instrument, variant name) -> error, the variant isn't loaded again for its other files
+
+    def setVariant(self, instrument, variant):
+        key = (instrument, variant["name"])
+        if key == self.current:
+            return
+        if key in self.failed:
+            raise AuralizationError(self.failed[key])
+        try:
+            self.auralizer.loadInstrument(instrument)
+            unknown = [i for i in variant["overrides"] if i not in self.auralizer.schema["index"]]
+            if unknown:
+                raise AuralizationError(f"{instrument} has no parameter {', '.join(unknown)}.")
+            self.parameters = dict(self.base_parameters.get(instrument) or self.auralizer.schema["defaults"], **variant["overrides"])
+            self.auralizer.setParameters(self.parameters)
+        except (AuralizationError, RuntimeError) as e:
+            self.failed[key] = f"Variant {variant['name']} of {instrument} could not be loaded: {e}"
+            self.current = None
+            raise AuralizationError(self.failed[key])
+        self.plugin_version = self.auralizer.pluginVersion()
+        self.auralizer.out_path = os.path.join(self.out_path, instrument, variant["name"])
+        os.makedirs(self.auralizer.out_path, exist_ok=True)
+        self.current = key
+
+    def run(self, job): # renders a job [instrument, variant, MIDI index], returns [outpath, audio hash, protocol entry]
+        instrument, variant, index = job
+        self.setVariant(instrument, variant)
+        prepared = self.prepared[index]
+        outpath, hash_audio, entry = self.auralizer.auralize(prepared["path"], self.tempo, self.parameters, self.plugin_version, prepared=prepared)
+        entry["sweep"] = {"variant": variant["name"], "overrides": variant["overrides"]}
+        return [outpath, hash_audio, entry]
+
+_runner = None # SweepRunner of the current worker process
+_init_error = None
+
+def initSweepWorker(config, prepared, tempo, base_parameters): # builds the Auralizer of a worker process once
+    global _runner, _init_error
+    try:
+        _runner = SweepRunner(Auralizer(**config), config["out_path"], prepared, tempo, base_parameters)
+    except Exception as e:
+        _init_error = f"RenderEngine could not be created: {e}"
+
+def sweepTask(job): # renders a job in a worker process, returns [job, outpath, hash_audio, entry, error]
+    if _init_error is not None:
+        return [job, None, None, None, _init_error]
+    try:
+        return [job] + _runner.run(job) + [None]
+    except AuralizationError as e:
+        return [job, None, None, None, str(e)]
+
+def runSweep(config, instruments, variants, midifiles, tempo, base_parameters=None, workers=1, auralizer=None,
+             onEntry=None, onError=None, onJob=None): # renders all midifiles with every variant of every Instrument, returns the paths of the rendered files
+    # config holds the arguments of the Auralizers (see parallel.auralizeParallel), a single engine uses auralizer if given,
+    # onJob(index, jobs, midi) is called before every job of a single engine, the other callbacks are the same as in Auralizer.auralizeBatch
+    prepared = []
+    for midi in midifiles: # read, hashed & tempo-processed once for all variants & engines
+        try:
+            prepared.append(prepareMidi(midi, tempo, config["hash_algorithm"]))
+        except Exception as e: # unreadable MIDI-File
+            if onError is not None:
+                onError(midi, AuralizationError(f"MIDI-File could not be read: {e}"))
+    jobs = planJobs(instruments, variants, len(prepared))
+    auralized_files = []
+    def finished(job, outpath, hash_audio, entry, error):
+        if error is not None:
+            if onError is not None:
+                onError(prepared[job[2]]["path"], AuralizationError(error))
+            return
+        auralized_files.append(outpath)
+        if onEntry is not None:
+            onEntry(outpath, hash_audio, entry)
+
+    workers = countWorkers(workers, len(jobs))
+    if workers == 1:
+        runner = SweepRunner(auralizer or Auralizer(**config), config["out_path"], prepared, tempo, base_parameters)
+        runner.auralizer.cancelled = False
+        try:
+            for index, job in enumerate(jobs):
+                if runner.auralizer.cancelled:
+                    break
+                if onJob is not None:
+                    onJob(index, len(jobs), prepared[job[2]]["path"])
+                try:
+                    finished(job, *runner.run(job), None)
+                except AuralizationCancelled:
+                    break
+                except AuralizationError as e:
+                    finished(job, None, None, None, str(e))
+        finally:
+            runner.auralizer.out_path = config["out_path"]
+        return auralized_files
+
+    context = multiprocessing.get_context("spawn") # VST-Hosts are not fork-safe
+    chunksize = max(1, len(jobs) // (workers * 4)) # consecutive jobs of a chunk mostly share their variant
+    with context.Pool(workers, initializer=initSweepWorker, initargs=(config, prepared, tempo, base_parameters)) as pool:
+        for result in pool.imap_unordered(sweepTask, jobs, chunksize=chunksize):
+            finished(*result)
+    return auralized_files
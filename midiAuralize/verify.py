@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+@description: Bulk verification of rendered Audiofiles, e.g. of a delivered archive. Walks a directory tree, hashes the files
+              on a thread pool (memory-mapped, hashlib releases the GIL while hashing) and matches them against the protocol:
+              matched (hashcode found), modified (a file of this name has been rendered, but its content differs) or unknown.
+              Files that can't be read (locked, no permission, deleted during the run) are reported as unreadable.
+              Hashcodes are cached by path, size & modification time in db/verify.sqlite, so verifying an unchanged tree
+              again only reads the directory listing.
+"""
+import os
+import json
+import mmap
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .hashes import DEFAULT_HASH, newHash, availableAlgorithms, hashFile
+
+VERIFY_CACHE_FILE = "verify.sqlite"
+VERIFY_EXTENSIONS = (".wav",)
+MAP_BLOCKSIZE = 16777216 # bytes of the mapped file passed to the hashes at once
+RESULTS = ["matched", "modified", "unknown", "unreadable"]
+
+def hashMapped(path, algorithms): # hashes a file through a memory map, returns {algorithm: hashcode}
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0: # empty files can't be mapped
+            return hashFile(path, algorithms)
+        hashes = {algorithm: newHash(algorithm) for algorithm in algorithms}
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            for start in range(0, len(view), MAP_BLOCKSIZE):
+                block = view[start:start+MAP_BLOCKSIZE]
+                for hash_file in hashes.values():
+                    hash_file.update(block)
+                block.release()
+    return {algorithm: hash_file.hexdigest() for algorithm, hash_file in hashes.items()}
+
+def findFiles(folder, extensions=VERIFY_EXTENSIONS, errors=None): # yields [path, size, mtime] of all files with the extensions below folder
+    # folders that can't be listed are appended to errors as [path, error] (raised without errors)
+    try:
+        entries = list(os.scandir(folder))
+    except OSError as e:
+        if errors is None:
+            raise
+        errors.append([folder, e.strerror or str(e)])
+        return
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from findFiles(entry.path, extensions, errors)
+        elif entry.is_file() and entry.name.lower().endswith(extensions):
+            try:
+                stat = entry.stat() # comes with the directory listing on Windows
+            except OSError as e: # deleted in the meantime
+                if errors is None:
+                    raise
+                errors.append([entry.path, e.strerror or str(e)])
+                continue
+            yield [entry.path, stat.st_size, stat.st_mtime]
+
+class HashCache: # hashcodes of verified files, valid as long as path, size & mtime are unchanged
+    def __init__(self, db_path):
+        self.connection = sqlite3.connect(os.path.join(db_path, VERIFY_CACHE_FILE), timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime REAL NOT NULL, hashes TEXT NOT NULL)")
+        self.connection.commit()
+
+    def get(self, path, size, mtime, algorithms): # returns {algorithm: hashcode} or None if the file has changed or misses an algorithm
+        row = self.connection.execute("SELECT size, mtime, hashes FROM files WHERE path = ?", (os.path.abspath(path),)).fetchone()
+        if row is None or [row[0], row[1]] != [size, mtime]:
+            return None
+        hashes = json.loads(row[2])
+        return hashes if all(i in hashes for i in algorithms) else None
+
+    def store(self, files): # stores [[path, size, mtime, hashes]]
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO files (path, size, mtime, hashes) VALUES (?, ?, ?, ?)",
+                                        [[os.path.abspath(path), size, mtime, json.dumps(hashes)] for path, size, mtime, hashes in files])
+
+    def close(self):
+        self.connection.close()
+
+def verifyFiles(protocol, folder, algorithms=None, workers=None, cache=None, extensions=VERIFY_EXTENSIONS, onFile=None):
+    # verifies all files below folder, returns {"matched": [[path, hashcode]], "modified": [...], "unknown": [...], "unreadable": [[path, error]]},
+    # algorithms default to the ones used in the protocol, cache is a HashCache (optional), onFile(done, total, path) is called after every file
+    if algorithms is None:
+        algorithms = [i for i in protocol.hashAlgorithms() or availableAlgorithms() if i in availableAlgorithms()] or [DEFAULT_HASH]
+    results = {i: [] for i in RESULTS}
+    files = list(findFiles(folder, extensions, results["unreadable"]))
+    done = 0
+    def classify(path, hashes):
+        nonlocal done
+        for algorithm in algorithms:
+            if hashes[algorithm] in protocol:
+                results["matched"].append([path, hashes[algorithm]])
+                break
+        else:
+            result = "modified" if protocol.hasFilename(os.path.basename(path)) else "unknown"
+            results[result].append([path, hashes[algorithms[0]]])
+        done += 1
+        if onFile is not None:
+            onFile(done, len(files), path)
+
+    pending = []
+    for path, size, mtime in files:
+        hashes = cache.get(path, size, mtime, algorithms) if cache is not None else None
+        if hashes is None:
+            pending.append([path, size, mtime])
+        else:
+            classify(path, hashes)
+    hashed = []
+    with ThreadPoolExecutor(workers or os.cpu_count() or 1) as pool:
+        futures = {pool.submit(hashMapped, path, algorithms): [path, size, mtime] for path, size, mtime in pending}
+        for future in as_completed(futures):
+            path, size, mtime = futures[future]
+            try:
+                hashes = future.result()
+            except OSError as e: # the other files are still verified
+                results["unreadable"].append([path, e.strerror or str(e)])
+                done += 1
+                if onFile is not None:
+                    onFile(done, len(files), path)
+                continue
+            hashed.append([path, size, mtime, hashes])
+            classify(path, hashes)
+    if cache is not None and hashed:
+        cache.store(hashed)
+    for result in RESULTS:
+        results[result].sort()
+    return results
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+@description: Watch-Folder mode of midiAuralizer. Input folders are watched for new or changed MIDI-Files (watchdog, i.e.
+              ReadDirectoryChangesW on Windows & inotify on Linux, if installed, otherwise by polling the folders). A file is
+              queued once its size & modification time have been stable for a settle time, so partially written or copied
+              files aren't rendered. The jobs are kept in db/watch.sqlite and rendered one after another by one Auralizer,
+              whose Instrument stays loaded. After a crash or restart, unfinished jobs are queued again and finished jobs
+              are only rendered again if their file has changed.
+"""
+import os
+import time
+import queue
+import sqlite3
+from datetime import datetime
+from .core import AuralizationError, AuralizationCancelled
+from .options import outputName
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError: # without watchdog the folders are polled
+    Observer = None
+    FileSystemEventHandler = object
+
+WATCH_QUEUE_FILE = "watch.sqlite"
+WATCH_EXTENSIONS = (".mid", ".midi")
+SETTLE_TIME = 2.0 # seconds a file has to stay unchanged before it is queued
+POLL_INTERVAL = 2.0 # seconds between two scans of the folders without watchdog
+MAX_ATTEMPTS = 3 # a job that has failed (or crashed the daemon) this often isn't rendered again until its file changes
+
+def isMidi(path):
+    return path.lower().endswith(WATCH_EXTENSIONS)
+
+def scanFolder(folder, recursive=True): # yields [path, size, mtime] of all MIDI-Files in folder
+    for entry in os.scandir(folder):
+        if entry.is_dir(follow_symlinks=False):
+            if recursive:
+                yield from scanFolder(entry.path, recursive)
+        elif entry.is_file() and isMidi(entry.name):
+            stat = entry.stat()
+            yield [os.path.abspath(entry.path), stat.st_size, stat.st_mtime]
+
+class JobQueue: # persistent queue of render jobs, one job per MIDI-File, Instrument & tempo
+    def __init__(self, db_path):
+        self.connection = sqlite3.connect(os.path.join(db_path, WATCH_QUEUE_FILE), timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS jobs (
+            path TEXT NOT NULL, instrument TEXT NOT NULL, tempo REAL NOT NULL, name TEXT NOT NULL, size INTEGER NOT NULL, mtime REAL NOT NULL,
+            status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, error TEXT, output TEXT, queued TEXT NOT NULL, updated TEXT NOT NULL,
+            PRIMARY KEY (path, instrument, tempo))""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, queued)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS idx_jobs_name ON jobs (instrument, tempo, name)")
+        self.connection.commit()
+        self.resumed = self.resume()
+
+    def resume(self): # queues the jobs that were running when the daemon stopped, returns their number
+        now = datetime.now().isoformat(timespec='seconds')
+        with self.connection:
+            self.connection.execute("UPDATE jobs SET status = 'failed', error = 'stopped while rendering', updated = ? WHERE status = 'running' AND attempts >= ?",
+                                    (now, MAX_ATTEMPTS))
+            return self.connection.execute("UPDATE jobs SET status = 'pending', updated = ? WHERE status = 'running'", (now,)).rowcount
+
+    def enqueue(self, path, instrument, tempo, size, mtime): # queues a file, unless the same version of it has already been queued or rendered
+        now = datetime.now().isoformat(timespec='seconds')
+        with self.connection:
+            return self.connection.execute("""INSERT INTO jobs (path, instrument, tempo, name, size, mtime, status, queued, updated) VALUES (?, ?, ?, ?, ?, ?, 'pending', ?, ?)
+                ON CONFLICT (path, instrument, tempo) DO UPDATE SET size = excluded.size, mtime = excluded.mtime, status = 'pending', attempts = 0,
+                error = NULL, queued = excluded.queued, updated = excluded.updated WHERE size != excluded.size OR mtime != excluded.mtime""",
+                (path, instrument, tempo, outputName(path).lower(), size, mtime, now, now)).rowcount > 0
+
+    def conflict(self, path, instrument, tempo): # returns another MIDI-File of the queue that is rendered to the same output file, None if there is none
+        row = self.connection.execute("SELECT path FROM jobs WHERE instrument = ? AND tempo = ? AND name = ? AND path != ? LIMIT 1",
+                                      (instrument, tempo, outputName(path).lower(), path)).fetchone()
+        return row[0] if row is not None else None
+
+    def take(self, instrument, tempo): # marks the oldest pending job as running and returns [path, size, mtime], None if the queue is empty
+        with self.connection:
+            row = self.connection.execute("SELECT path, size, mtime FROM jobs WHERE status = 'pending' AND instrument = ? AND tempo = ? ORDER BY queued, path LIMIT 1",
+                                          (instrument, tempo)).fetchone()
+            if row is not None:
+                self.connection.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, updated = ? WHERE path = ? AND instrument = ? AND tempo = ?",
+                                        (datetime.now().isoformat(timespec='seconds'), row[0], instrument, tempo))
+        return list(row) if row is not None else None
+
+    def finish(self, path, instrument, tempo, output=None, error=None): # marks a running job as done, or as pending/failed after an error
+        status = "done" if error is None else "failed"
+        with self.connection:
+            if error is not None:
+                attempts = self.connection.execute("SELECT attempts FROM jobs WHERE path = ? AND instrument = ? AND tempo = ?", (path, instrument, tempo)).fetchone()
+                status = "pending" if attempts is not None and attempts[0] < MAX_ATTEMPTS else "failed"
+            now = datetime.now().isoformat(timespec='seconds')
+            self.connection.execute("UPDATE jobs SET status = ?, output = ?, error = ?, updated = ?, queued = CASE WHEN ? = 'pending' THEN ? ELSE queued END WHERE path = ? AND instrument = ? AND tempo = ?",
+                                    (status, output, error, now, status, now, path, instrument, tempo)) # a retried job goes to the end of the queue
+        return status
+
+    def release(self, path, instrument, tempo): # queues a running job again without counting the attempt (e.g. the daemon was stopped)
+        with self.connection:
+            self.connection.execute("UPDATE jobs SET status = 'pending', attempts = MAX(attempts - 1, 0) WHERE path = ? AND instrument = ? AND tempo = ? AND status = 'running'",
+                                    (path, instrument, tempo))
+
+    def counts(self): # number of jobs per status
+        return dict(self.connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def close(self):
+        self.connection.close()
+
+class Settler: # debounces changed files, a file is stable once its size & mtime haven't changed for settle seconds
+    def __init__(self, settle=SETTLE_TIME):
+        self.settle = settle
+        self.files = {} # path -> [size, mtime, monotonic time of the last change]
+
+    def add(self, path):
+        self.files.setdefault(path, [None, None, 0.0])
+
+    def stable(self): # returns [[path, size, mtime]] of the files that have settled and can be read
+        now = time.monotonic()
+        settled = []
+        for path, observed in list(self.files.items()):
+            try:
+                stat = os.stat(path)
+            except OSError: # deleted or renamed
+                del self.files[path]
+                continue
+            if [stat.st_size, stat.st_mtime] != observed[:2]:
+                self.files[path] = [stat.st_size, stat.st_mtime, now]
+                continue
+            if now - observed[2] < self.settle:
+                continue
+            if stat.st_size == 0: # created but never written, comes back through its next change
+                del self.files[path]
+                continue
+            try:
+                with open(path, "rb"): # still locked by the writer on Windows
+                    pass
+            except OSError:
+                continue
+            del self.files[path]
+            settled.append([path, stat.st_size, stat.st_mtime])
+        return settled
+
+class EventHandler(FileSystemEventHandler): # collects the paths of created, modified & moved MIDI-Files from the watchdog thread
+    def __init__(self, changes):
+        super().__init__()
+        self.changes = changes
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        path = getattr(event, "dest_path", None) or event.src_path
+        if isMidi(path):
+            self.changes.put(os.path.abspath(path))
+
+class FolderWatcher: # reports changed MIDI-Files of the input folders, through watchdog events or by polling
+    def __init__(self, folders, recursive=True, poll=POLL_INTERVAL, polling=False):
+        self.folders = folders
+        self.recursive = recursive
+        self.poll = poll
+        self.polling = polling or Observer is None
+        self.snapshot = {} # polling: path -> [size, mtime] of the last scan
+        self.last_scan = None
+        self.changes = queue.Queue()
+        self.observer = None
+
+    def start(self): # returns all MIDI-Files that are already in the folders
+        if not self.polling:
+            self.observer = Observer()
+            handler = EventHandler(self.changes)
+            for folder in self.folders:
+                self.observer.schedule(handler, folder, recursive=self.recursive)
+            self.observer.start()
+        return self.scan()
+
+    def scan(self): # returns the paths that are new or changed since the last scan
+        files = {}
+        for folder in self.folders:
+            for path, size, mtime in scanFolder(folder, self.recursive):
+                files[path] = [size, mtime]
+        changed = [path for path, observed in files.items() if self.snapshot.get(path) != observed]
+        self.snapshot = files
+        self.last_scan = time.monotonic()
+        return changed
+
+    def changed(self): # returns the paths changed since the last call
+        if self.polling:
+            return self.scan() if time.monotonic() - self.last_scan >= self.poll else []
+        paths = set()
+        while True:
+            try:
+                paths.add(self.changes.get_nowait())
+            except queue.Empty:
+                return list(paths)
+
+    def stop(self):
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+
+class WatchDaemon: # queues the settled MIDI-Files of the watched folders and renders them with a loaded Instrument
+    def __init__(self, auralizer, jobs, folders, instrument, tempo, parameters, recursive=True, settle=SETTLE_TIME, poll=POLL_INTERVAL, polling=False):
+        # auralizer has the Instrument & parameters loaded, jobs is a JobQueue
+        self.auralizer = auralizer
+        self.jobs = jobs
+        self.instrument = instrument
+        self.tempo = tempo
+        self.parameters = parameters
+        self.plugin_version = auralizer.pluginVersion()
+        self.watcher = FolderWatcher(folders, recursive, poll, polling)
+        self.settler = Settler(settle)
+        self.stopped = False
+
+    def stop(self): # stops the daemon after the current job
+        self.stopped = True
+        self.auralizer.cancelled = True
+
+    def queueSettled(self, onError=None): # debounces the changed files and queues the settled ones, returns the number of new jobs
+        # a file that would overwrite the output of another queued or rendered file isn't queued, but reported through onError(midi, error)
+        for path in self.watcher.changed():
+            self.settler.add(path)
+        queued = 0
+        for path, size, mtime in self.settler.stable():
+            other = self.jobs.conflict(path, self.instrument, self.tempo)
+            if other is not None:
+                if onError is not None:
+                    onError(path, AuralizationError(f"not queued, {other} is already rendered to {outputName(path)}"))
+                continue
+            queued += self.jobs.enqueue(path, self.instrument, self.tempo, size, mtime)
+        return queued
+
+    def run(self, tick=0.5, once=False, onEntry=None, onError=None, onJob=None): # renders queued jobs until stop() (once: until the queue and the folders are done)
+        # the callbacks are the same as in Auralizer.auralizeBatch, onJob(midi) is called before every job
+        self.stopped = False
+        self.auralizer.cancelled = False
+        for path in self.watcher.start():
+            self.settler.add(path)
+        try:
+            while not self.stopped:
+                self.queueSettled(onError)
+                job = self.jobs.take(self.instrument, self.tempo)
+                if job is None:
+                    if once and not self.settler.files:
+                        break
+                    time.sleep(tick)
+                    continue
+                self.render(job[0], onEntry, onError, onJob)
+        finally:
+            self.watcher.stop()
+
+    def render(self, midi, onEntry=None, onError=None, onJob=None):
+        if onJob is not None:
+            onJob(midi)
+        try:
+            outpath, hash_audio, entry = self.auralizer.auralize(midi, self.tempo, self.parameters, self.plugin_version)
+        except AuralizationCancelled:
+            self.jobs.release(midi, self.instrument, self.tempo)
+            return
+        except AuralizationError as e:
+            status = self.jobs.finish(midi, self.instrument, self.tempo, error=str(e))
+            if onError is not None:
+                onError(midi, AuralizationError(f"{e} ({'queued again' if status == 'pending' else 'failed'})"))
+            return
+        except BaseException: # e.g. KeyboardInterrupt, the job is queued again on the next start
+            self.jobs.release(midi, self.instrument, self.tempo)
+            raise
+        if onEntry is not None:
+            onEntry(outpath, hash_audio, entry) # the protocol is written before the job is done, a crash in between renders it again (or restores it from the cache)
+        self.jobs.finish(midi, self.instrument, self.tempo, output=outpath)
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+@description: Streaming .wav-Writer. The header is written first (the number of frames has to be known in advance),
+              afterwards the converted audio is appended block by block, so no full-size copy of the audio is needed.
+              The bytes are hashed while they are written, the file doesn't have to be read again for the protocol.
+"""
+import struct
+import numpy as np
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+
+class WavWriter: # writes interleaved audio blocks (frames x channels) into a .wav-File
+    def __init__(self, path, samplerate, channels, sampwidth, nframes, format_tag=WAVE_FORMAT_PCM, hasher=None):
+        self.path = path
+        self.samplerate = int(samplerate)
+        self.channels = int(channels)
+        self.sampwidth = int(sampwidth) # bytes per sample
+        self.nframes = int(nframes)
+        self.format_tag = format_tag
+        self.frames_written = 0
+        self.hasher = hasher # hash object (update/hexdigest) of all written bytes, optional
+        self.file = open(path, "wb")
+        self.writeBytes(self.header())
+
+    def header(self): # returns RIFF-, fmt- (and fact-) chunk plus the header of the data chunk
+        block_align = self.channels * self.sampwidth
+        data_size = self.nframes * block_align
+        if self.format_tag == WAVE_FORMAT_PCM:
+            fmt_chunk = struct.pack('<4sIHHIIHH', b'fmt ', 16, self.format_tag, self.channels, self.samplerate,
+                                    self.samplerate * block_align, block_align, self.sampwidth * 8)
+            fact_chunk = b''
+        else: # non-PCM formats need cbSize and a fact chunk
+            fmt_chunk = struct.pack('<4sIHHIIHHH', b'fmt ', 18, self.format_tag, self.channels, self.samplerate,
+                                    self.samplerate * block_align, block_align, self.sampwidth * 8, 0)
+            fact_chunk = struct.pack('<4sII', b'fact', 4, self.nframes)
+        pad = data_size % 2
+        riff_size = 4 + len(fmt_chunk) + len(fact_chunk) + 8 + data_size + pad
+        return struct.pack('<4sI4s', b'RIFF', riff_size, b'WAVE') + fmt_chunk + fact_chunk + struct.pack('<4sI', b'data', data_size)
+
+    def write(self, frames): # appends a block of interleaved frames, either an array (frames x channels) or raw bytes
+        if isinstance(frames, np.ndarray):
+            self.frames_written += frames.shape[0]
+            frames = np.ascontiguousarray(frames).data
+        else:
+            self.frames_written += len(frames) // (self.channels * self.sampwidth)
+        self.writeBytes(frames)
+
+    def writeBytes(self, data):
+        self.file.write(data)
+        if self.hasher is not None:
+            self.hasher.update(data)
+
+    def hexdigest(self): # hashcode of the complete file, available after close()
+        return self.hasher.hexdigest()
+
+    def close(self):
+        if self.file.closed:
+            return
+        if self.frames_written != self.nframes:
+            self.file.close()
+            raise ValueError(f"{self.path}: {self.frames_written} frames written, header declares {self.nframes}.")
+        if (self.nframes * self.channels * self.sampwidth) % 2:
+            self.writeBytes(b'\x00') # chunks are word-aligned
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.file.close()
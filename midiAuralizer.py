@@ -12,131 +12,157 @@ Created on Thu Aug  11 13:25:43 2022
 """
 version = "0.0.1"
 
+import time
+startup_time = time.perf_counter() # reference of the startup benchmark (benchmarks/bench_startup.py)
+
 from PyQt5.QtWidgets import (QLabel, QComboBox, QLineEdit, QPushButton, QFrame, QMainWindow, 
                              QDialog, QApplication, QWidget, QMenuBar, QMenu, QAction, QStatusBar, 
-                             QGridLayout, QDialogButtonBox, QFormLayout, QCheckBox, QFileDialog, QMessageBox)
+                             QGridLayout, QDialogButtonBox, QFormLayout, QCheckBox, QFileDialog, QMessageBox,
+                             QProgressBar, QHBoxLayout, QPlainTextEdit)
 from PyQt5.QtGui import QPixmap, QIntValidator, QDesktopServices, QIcon
 from PyQt5.QtCore import Qt
 from PyQt5 import QtCore
 import sys
 import json
+import multiprocessing
 import os
+from midiAuralize import cli
+from midiAuralize.options import ADAPTIVE_TAIL, BIT_DEPTHS, parseBitDepth, duplicateOutputs
+from midiAuralize.protocol import openProtocol, EXPORT_FORMATS
+from midiAuralize.hashes import DEFAULT_HASH, availableAlgorithms, hashFile
+from midiAuralize.cache import CACHE_SIZE as DEFAULT_CACHE_SIZE
+from midiAuralize.plugins import PLUGIN_CACHE, PluginIndex
+from midiAuralize.metrics import MetricsLog, METRICS_FOLDER, PROFILE_FOLDER
+from midiAuralize.encoders import OUTPUT_FORMATS, EncoderError, parseFormats
+from midiAuralize.verify import HashCache, verifyFiles, RESULTS as VERIFY_RESULTS
 from datetime import datetime
-import mido
-import hashlib
-from win32api import GetFileVersionInfo, LOWORD, HIWORD
-import dawdreamer as daw
-from scipy.io import wavfile
-import numpy as np
+# the Render Core (dawdreamer, numpy, mido) is imported by the Loader-Thread after the window has been shown
+startup_marks = {"imports": time.perf_counter() - startup_time}
 
 win_x = 300
 win_y = 300
 win_width = 520
-win_height = 400
+win_height = 450
 
 cwd = os.getcwd()
 cwd_css = cwd.replace("\\", "/")
 userpath = os.environ['USERPROFILE']
+DB_PATH = f"{cwd}\\db\\"
 SETTINGS_PATH = f"{cwd}\\db\\settings.json"
-PROTOCOL_PATH = f"{cwd}\\db\\protocol.json"
 
 json_settings = json.load(open(SETTINGS_PATH, encoding='UTF-8'))
-json_protocol = json.load(open(PROTOCOL_PATH, encoding='UTF-8'))
 
 VST_PATH = json_settings['pathSettings']['vstpath']
 OUT_PATH = json_settings['pathSettings']['outpath']
 STATES_PATH = json_settings['pathSettings']['statespath']
-
-CHANNELS = 2
-BITDEPTH = 16
+CACHE_PATH = json_settings['pathSettings'].get('cachepath', "")
 
 def jsonDump(json_target): # dumps data into target .json-File
     if json_target == "settings": 
         with open(SETTINGS_PATH, "w") as json_file:
             json.dump(json_settings, json_file, indent=4)
         json_file.close()
-    elif json_target == "protocol":
-        with open(PROTOCOL_PATH, "w") as json_file:
-            json.dump(json_protocol, json_file, indent=4)
-        json_file.close()
     else:
         print("JSON-Target not found.")
 
 def initResources(): # creates predefined .json-Files and folder structure if unavailable
-    global OUT_PATH, STATES_PATH
-    settings = {"audioSettings": {"samplerate": 44100, "bitdepth": 16, "chunksize": 1024, "loadstate": True},
-     "pathSettings": {"vstpath": "C:\\VstPlugins\\", "outpath": f"{cwd}\\output\\", "statespath": f"{cwd}\\states\\"},
+    global OUT_PATH, STATES_PATH, CACHE_PATH
+    settings = {"audioSettings": {"samplerate": 44100, "bitdepth": 16, "chunksize": 1024, "loadstate": True, "dither": False, "hashalgorithm": DEFAULT_HASH, "cachesize": DEFAULT_CACHE_SIZE,
+                                  "tailmode": "fixed", "tailthreshold": ADAPTIVE_TAIL['threshold'], "tailhold": ADAPTIVE_TAIL['hold'], "tailmax": ADAPTIVE_TAIL['max'],
+                                  "plugincache": PLUGIN_CACHE, "pluginmemory": 0, "preload": True, "formats": []},
+     "pathSettings": {"vstpath": "C:\\VstPlugins\\", "outpath": f"{cwd}\\output\\", "statespath": f"{cwd}\\states\\", "cachepath": f"{cwd}\\cache\\"},
      "pluginSettings": {}}
-    protocol = {}
-    for i in [f"{cwd}\\output\\", f"{cwd}\\states\\", f"{cwd}\\db\\"]:
+    for i in [f"{cwd}\\output\\", f"{cwd}\\states\\", f"{cwd}\\cache\\", f"{cwd}\\db\\"]:
         if not os.path.exists(i):
             os.mkdir(i)
     if not os.path.exists(SETTINGS_PATH):
         with open(SETTINGS_PATH, "w") as settings_file:
             json.dump(settings, settings_file, indent=4)
         settings_file.close()
-    if not os.path.exists(PROTOCOL_PATH):
-        with open(PROTOCOL_PATH, "w") as protocol_file:
-            json.dump(protocol, protocol_file, indent=4)
-        protocol_file.close()
     if not OUT_PATH:
         OUT_PATH = f"{cwd}\\output\\"
     if not STATES_PATH:
         STATES_PATH = f"{cwd}\\states\\"
+    if not CACHE_PATH:
+        CACHE_PATH = f"{cwd}\\cache\\"
 
 initResources()
+protocol = None # opened on first use, entries are queried by hash, the protocol is never loaded as a whole
+
+def getProtocol(): # returns the protocol, opens (migrates & compacts) it on first use
+    global protocol
+    if protocol is None:
+        protocol = openProtocol(DB_PATH)
+    return protocol
+
+plugin_index = PluginIndex(DB_PATH) # inventory of the VST-Path, only changed .dll-Files are scanned again
 
 
 BACKGROUND_MAIN = f"{cwd_css}/images/bgImage.png"
 ICON_PATH = f"{cwd}\\images\\icon.png"
 RESOURCES = [f"{cwd}\\images\\bgImage.png", f"{cwd}\\images\\MIDI_Drag.png", f"{cwd}\\images\\Audio_Drag.png", f"{cwd}\\images\\DropDownArrow.png",
-             ICON_PATH, SETTINGS_PATH, PROTOCOL_PATH]
+             ICON_PATH, SETTINGS_PATH]
 
 SAMPLERATE = int(json_settings['audioSettings']['samplerate'])
 tempo = 390 # default for DISKOS
-BIT_DEPTH = int(json_settings['audioSettings']['bitdepth'])
+BIT_DEPTH = parseBitDepth(json_settings['audioSettings']['bitdepth']) # 8, 16, 24, 32 or "32f" (32-bit float)
+DITHER = bool(json_settings['audioSettings'].get('dither', False))
 CHUNKSIZE = int(json_settings['audioSettings']['chunksize'])
 LOAD_STATE = bool(json_settings['audioSettings']['loadstate'])
+HASH_ALGORITHM = json_settings['audioSettings'].get('hashalgorithm', DEFAULT_HASH)
+CACHE_SIZE = int(json_settings['audioSettings'].get('cachesize', DEFAULT_CACHE_SIZE)) # in MB, 0 disables the Render-Cache
+TAIL_MODE = json_settings['audioSettings'].get('tailmode', "fixed") # fixed: 5 s after the last MIDI-Event, adaptive: until silence
+PLUGIN_CACHE_SIZE = int(json_settings['audioSettings'].get('plugincache', PLUGIN_CACHE)) # Instruments kept loaded for fast switching
+PLUGIN_MEMORY = int(json_settings['audioSettings'].get('pluginmemory', 0)) # memory limit of the loaded Instruments in MB, 0: no limit
+PRELOAD = bool(json_settings['audioSettings'].get('preload', True)) # preload the next Instrument of the list in the background
+FORMATS = parseFormats(json_settings['audioSettings'].get('formats', [])) # additional output formats encoded with ffmpeg (flac, mp3, opus)
+PROFILE = False # captures the first file of the next Auralization with cProfile & tracemalloc (set in the Preferences, not saved)
 
 instrument = None
 parameters = ""
 dict_parameters = {}
-        
-def getHashes(audiofile, midifile): # returns hashcodes for the corresponding audio- and midifiles
-    path_audio = audiofile
-    blocksize = 65536
-    hash_audio = hashlib.md5()
-    with open(path_audio, "rb") as file_audio:
-        fb = file_audio.read(blocksize)
-        while len(fb) > 0:
-            hash_audio.update(fb)
-            fb = file_audio.read(blocksize)
-    hash_audio = hash_audio.hexdigest()
-    file_audio.close()
-    
-    hash_midi = hashlib.md5()
-    with open(path_audio, "rb") as file_midi:
-        fb = file_midi.read(blocksize)
-        while len(fb) > 0:
-            hash_midi.update(fb)
-            fb = file_midi.read(blocksize)
-    hash_midi = hash_midi.hexdigest()
-    file_midi.close()
-    return [hash_audio, hash_midi]
 
-def getPluginVersion(instrument): # gets plugin version from the VSTs .dll-File
-    info = GetFileVersionInfo(f"{VST_PATH}{instrument}.dll", "\\")
-    ms = info['FileVersionMS']
-    ls = info['FileVersionLS']
-    version = f"{HIWORD (ms)}.{LOWORD (ms)}.{HIWORD (ls)}.{LOWORD (ls)}"
-    return version
+def cacheConfig(): # returns the arguments of the Render-Cache, None if it is disabled
+    if CACHE_SIZE <= 0:
+        return None
+    return {"db_path": DB_PATH, "cache_path": CACHE_PATH, "max_size": CACHE_SIZE}
+
+def tailConfig(): # returns the settings of the adaptive tail, None for the fixed tail
+    if TAIL_MODE != "adaptive":
+        return None
+    audioSettings = json_settings['audioSettings']
+    return {"threshold": float(audioSettings.get('tailthreshold', ADAPTIVE_TAIL['threshold'])),
+            "hold": float(audioSettings.get('tailhold', ADAPTIVE_TAIL['hold'])),
+            "max": float(audioSettings.get('tailmax', ADAPTIVE_TAIL['max']))}
+
+def createAuralizer(): # creates the Render Core with the current Preferences
+    from midiAuralize.core import Auralizer
+    return Auralizer(VST_PATH, OUT_PATH, SAMPLERATE, BIT_DEPTH, CHUNKSIZE, hash_algorithm=HASH_ALGORITHM, cache=cacheConfig(),
+                     tail=tailConfig(), dither=DITHER, plugin_cache=PLUGIN_CACHE_SIZE, plugin_memory=PLUGIN_MEMORY, plugin_index=plugin_index)
 
 def Start(): # starts the Application
     global mwin
     mwin = Main()
     mwin.setGeometry(win_x, win_y, win_width, win_height)
     mwin.show()
+    QtCore.QTimer.singleShot(0, lambda: startup_marks.setdefault("window", time.perf_counter() - startup_time)) # first pass of the event loop
     return mwin
+    
+class Loader(QtCore.QThread): # imports the Render Core, scans the VST-Path and loads the first Instrument while the window is already shown
+    ready = QtCore.pyqtSignal(object, list, str)
+    
+    def run(self): # every failure is passed to loadingFinished, the auralizer is None if the Render Core couldn't be created
+        auralizer = None
+        list_instruments = []
+        error = ""
+        try:
+            plugin_index.update(VST_PATH)
+            list_instruments = plugin_index.instruments(VST_PATH)
+            auralizer = createAuralizer()
+            auralizer.loadInstrument(list_instruments[0] if list_instruments else "")
+        except Exception as e: # e.g. a locked plugins.sqlite, an unreadable VST-Path or a missing plugin
+            error = str(e) or type(e).__name__
+        self.ready.emit(auralizer, list_instruments, error)
         
 class Main(QMainWindow):
     auralized_files = []
@@ -157,10 +183,6 @@ class Main(QMainWindow):
         self.layout = QGridLayout(self.centralWidget)
         
         self.list_instruments = []
-        if os.path.exists(VST_PATH):
-            for i in os.listdir(VST_PATH):
-                if i[-4:] == '.dll':
-                    self.list_instruments.append(i[:-4])
         
         self.midifiles = []
         self.img_dragMidi = QLabel(self)
@@ -171,8 +193,6 @@ class Main(QMainWindow):
         
         self.lbl_instrument = QLabel("Instrument")
         self.combo_instruments = QComboBox()
-        self.combo_instruments.addItems(self.list_instruments)
-        instrument = self.combo_instruments.currentText()
         self.combo_instruments.currentIndexChanged.connect(self.injectInstrumentChoice)
         if LOAD_STATE == True:
             self.combo_instruments.currentIndexChanged.connect(self.setLastParameters)
@@ -204,10 +224,58 @@ class Main(QMainWindow):
         self.layout.addWidget(self.lbl_tempo, 4, 27, 1, 20, alignment=Qt.AlignTop)
         self.layout.addWidget(self.val_tempo, 4, 44, 1, 20, alignment=Qt.AlignTop)
         
+        self.progressBar = QProgressBar()
+        self.progressBar.setRange(0, 1000)
+        self.progressBar.setTextVisible(False)
+        self.lbl_progress = QLabel("")
+        self.lbl_progress.setStyleSheet("color: mintcream;")
+        self.btCancel = QPushButton("Cancel")
+        self.btCancel.clicked.connect(self.cancelAuralization)
+        self.layout.addWidget(self.progressBar, 5, 3, 1, 90, alignment=Qt.AlignTop)
+        self.layout.addWidget(self.lbl_progress, 6, 3, 1, 70, alignment=Qt.AlignTop)
+        self.layout.addWidget(self.btCancel, 6, 78, 1, 15, alignment=Qt.AlignTop)
+        self.showProgress(False)
+        self.worker = None
+        
         self.layout.setSpacing(10)
         
-        self.engine = daw.RenderEngine(SAMPLERATE, CHUNKSIZE)
-        self.loadInstrument()
+        # scanning the VST-Path, creating the RenderEngine and loading the first Instrument happen in the background
+        self.auralizer = None
+        self.loader = Loader()
+        self.loader.ready.connect(self.loadingFinished)
+        self.setLoading(True)
+        self.loader.start()
+        
+    def setLoading(self, loading): # shows a busy progressbar while the Render Core is loaded
+        self.setRendering(loading)
+        self.btCancel.setVisible(False)
+        self.progressBar.setRange(0, 0 if loading else 1000)
+        self.lbl_progress.setText("Loading Instruments..." if loading else "")
+        
+    def loadingFinished(self, auralizer, list_instruments, error): # called by the Loader-Thread, sets up the loaded Render Core
+        global instrument
+        self.auralizer = auralizer
+        self.list_instruments = list_instruments
+        self.combo_instruments.blockSignals(True) # the first Instrument has already been loaded
+        self.combo_instruments.addItems(self.list_instruments)
+        self.combo_instruments.blockSignals(False)
+        instrument = self.combo_instruments.currentText()
+        self.setLoading(False)
+        startup_marks["ready"] = time.perf_counter() - startup_time
+        if error == 'Unable to load plugin.':
+            self.errorNoInstruments()
+        elif self.auralizer is None:
+            self.errorLoading(error)
+        elif error:
+            print(f"Error: {error}")
+        else:
+            if LOAD_STATE == True:
+                self.setLastParameters()
+            self.preloadNextInstrument()
+            self.printStatus("App initiated successfully.")
+        if os.environ.get("MIDIAURALIZER_BENCHMARK_STARTUP"): # reports the startup times and quits
+            print(json.dumps(startup_marks))
+            QApplication.quit()
         
     def checkResources(self): # checks if all Resources are located at the right path
         missing_resources = []
@@ -228,6 +296,15 @@ class Main(QMainWindow):
         errorBox.button(QMessageBox.No).setText("Okay")
         errorBox.exec_()
                 
+    def errorLoading(self, error): # gives an Error if the Render Core couldn't be loaded, only the Preferences stay available
+        for i in [self.btAuralize, self.btInstrumentSettings, self.combo_instruments, self.exeAction, self.sweepAction]:
+            i.setEnabled(False)
+        errorBox = QMessageBox()
+        errorBox.setIcon(QMessageBox.Critical)
+        errorBox.setText(f"The Instruments could not be loaded: {error}\n\nPlease check the VST-Path in the Preferences (saving them loads the Instruments again).")
+        errorBox.exec_()
+        self.printStatus("WARNING: Instruments could not be loaded.")
+        
     def errorNoInstruments(self): # gives an Error if there aren't any VSTs in the specified path
         errorBox = QMessageBox(QMessageBox.Question, "No VST Found!", 
                                "No Instruments found in VST-Path! Please select another Path where your VST-Files are located.", 
@@ -251,14 +328,17 @@ class Main(QMainWindow):
         
         self.loadAction = QAction("Load MIDI", self)
         self.exeAction = QAction("Auralize MIDI", self)
+        self.sweepAction = QAction("Parameter Sweep", self)
         
         self.exitAction = QAction("Exit", self)
         self.loadAction.triggered.connect(self.loadMIDI)
         self.exeAction.triggered.connect(self.Auralize)
+        self.sweepAction.triggered.connect(self.Sweep)
         
         self.exitAction.triggered.connect(self.quitApp)
         mainMenu.addAction(self.loadAction)
         mainMenu.addAction(self.exeAction)
+        mainMenu.addAction(self.sweepAction)
         mainMenu.addAction(self.exitAction)
         self.preferencesAction = QAction("Preferences")
         self.preferencesAction.triggered.connect(self.openPreferences)
@@ -266,11 +346,17 @@ class Main(QMainWindow):
         self.listMidisAction.triggered.connect(self.openListMidis)
         self.hashesAction = QAction("Check Hashes", self)
         self.hashesAction.triggered.connect(self.openCheckHashes)
+        self.exportAction = QAction("Export Protocol", self)
+        self.exportAction.triggered.connect(self.openExportProtocol)
+        self.verifyAction = QAction("Verify Folder", self)
+        self.verifyAction.triggered.connect(self.openVerifyFolder)
         self.aboutAction = QAction("About", self)
         self.aboutAction.triggered.connect(self.openAbout)
         toolsMenu.addAction(self.preferencesAction)
         toolsMenu.addAction(self.listMidisAction)
         toolsMenu.addAction(self.hashesAction)
+        toolsMenu.addAction(self.exportAction)
+        toolsMenu.addAction(self.verifyAction)
         toolsMenu.addAction(self.aboutAction)
         
     def createStatusBar(self): # creates statusbar
@@ -283,25 +369,39 @@ class Main(QMainWindow):
 
     def refreshInstrumentsList(self): # reloads the Instruments List, e.g. after changing the VST-Path in Preferences
         global instrument
-        self.list_instruments = []
-        for i in os.listdir(VST_PATH):
-            if i[-4:] == '.dll':
-                self.list_instruments.append(i[:-4])
+        plugin_index.update(VST_PATH)
+        self.list_instruments = plugin_index.instruments(VST_PATH)
         self.combo_instruments.addItems(self.list_instruments)
         instrument = self.combo_instruments.currentText()
         self.loadInstrument()
     
     def loadInstrument(self): # loads an Instrument into the engine
         try:
-            self.synth = self.engine.make_plugin_processor(instrument, VST_PATH + instrument + ".dll")
+            self.updateAuralizer()
+            self.auralizer.loadInstrument(instrument)
+            self.setRendering(False) # enables the controls again after a failed start
             if LOAD_STATE == True:
                 self.setLastParameters()
+            self.preloadNextInstrument()
             self.printStatus("App initiated successfully.")
         except RuntimeError as e:
             if str(e) == 'Unable to load plugin.':
                 self.errorNoInstruments()
             else:
                 print(f"Error: {str(e)}")
+                
+    def updateAuralizer(self): # passes the current Preferences to the Render Core, the engine is only recreated if samplerate or chunksize changed
+        if self.auralizer is None or (self.auralizer.samplerate, self.auralizer.chunksize) != (SAMPLERATE, CHUNKSIZE):
+            self.auralizer = createAuralizer()
+        else:
+            self.auralizer.vst_path = VST_PATH
+            self.auralizer.out_path = OUT_PATH
+            self.auralizer.bitdepth = BIT_DEPTH
+            self.auralizer.dither = DITHER
+            self.auralizer.hash_algorithm = HASH_ALGORITHM
+            self.auralizer.setCache(cacheConfig())
+            self.auralizer.tail = tailConfig()
+            self.auralizer.processors.setLimits(PLUGIN_CACHE_SIZE, PLUGIN_MEMORY)
         
     def loadPathVST(self): # opens a File Dialog to choose a new VST Path and dump it in the Settings
         global VST_PATH
@@ -317,15 +417,20 @@ class Main(QMainWindow):
         global instrument
         instrument = self.combo_instruments.currentText()
         self.printStatus("Loading Instrument...", timer=3000)
-        self.synth = self.engine.make_plugin_processor(instrument, VST_PATH + instrument + ".dll")
+        self.auralizer.loadInstrument(instrument)
+        self.preloadNextInstrument()
         self.printStatus(f"Instrument {instrument} successfully loaded!")
+        
+    def preloadNextInstrument(self): # warms the Plugin-Cache with the Instrument following the current one in the list
+        if not PRELOAD or PLUGIN_CACHE_SIZE < 2 or self.combo_instruments.count() < 2:
+            return
+        next_instrument = self.combo_instruments.itemText((self.combo_instruments.currentIndex() + 1) % self.combo_instruments.count())
+        self.auralizer.preloadInstrument(next_instrument)
             
     def setLastParameters(self): # load last parameters for selected instrument, this can be set optional in settings
         if LOAD_STATE == True:
             if instrument in json_settings['pluginSettings']:
-                for i in range(0, len(json_settings['pluginSettings'][instrument])):
-                    paramName = self.synth.get_parameter_name(i)
-                    self.synth.set_parameter(i, json_settings['pluginSettings'][instrument][paramName])
+                self.auralizer.setParameters(json_settings['pluginSettings'][instrument])
         
     def dragEnterEvent(self, event): # checks if dragged data are files
         if event.mimeData().hasUrls():
@@ -361,35 +466,21 @@ class Main(QMainWindow):
         if not self.midifiles:
             self.printStatus("No MIDI-File selected.")
             
-    def setTempo(self, midi, tempo): # sets Tempo of current MIDI-File & saves temporary version for processing
-        midi_pathdata = os.path.split(midi)
-        mid = mido.MidiFile(midi)
-        new_mid = mido.MidiFile()
-        new_track = mido.MidiTrack()
-        new_mid.tracks.append(new_track)
-        for i, track in enumerate(mid.tracks):
-            for msg in track:
-                if msg.type == 'set_tempo':
-                    new_tempo = int(mido.bpm2tempo(tempo))
-                    msg.tempo = new_tempo
-                new_track.append(msg)
-        new_mid.save(f"{midi_pathdata[0]}\\{midi_pathdata[1][:-4]}_temp.mid")
-            
     def Auralize(self): # starts Auralization process and saves hash codes of generated files into .json
-        global instrument, dict_parameters, json_settings, json_protocol
+        global instrument, dict_parameters, json_settings
         if not self.midifiles:
             errorBox = QMessageBox()
             errorBox.setIcon(QMessageBox.Critical)
             errorBox.setText("No MIDI-File loaded. Please select a MIDI-File!")
             errorBox.exec_()
             return
+        if not self.checkOutputs():
+            return
         Main.auralized_files = []
         instrument = self.combo_instruments.currentText()
-        assert self.synth.get_name() == instrument
+        assert self.auralizer.instrument == instrument
         tempo = int(self.val_tempo.text())
         
-        filesize_threshold = 500 # threshold in bytes for checking the successful processing (simple)
-        
         if instrument in json_settings['pluginSettings']:
             dict_parameters = json_settings['pluginSettings'][instrument]
         else:
@@ -397,101 +488,167 @@ class Main(QMainWindow):
             jsonDump("settings")
             dict_parameters = json_settings['pluginSettings'][instrument]
             
-        plugin_version = getPluginVersion(instrument)
         json_settings['audioSettings']['samplerate'] = str(SAMPLERATE)
         json_settings['audioSettings']['bitdepth'] = str(BIT_DEPTH)
         jsonDump("settings")
+        if not self.setFormats():
+            return
+        
+        global PROFILE
+        profile = None
+        if PROFILE:
+            profile = os.path.join(DB_PATH, PROFILE_FOLDER, f"{datetime.now():%Y-%m-%d_%H-%M-%S}_{os.path.basename(self.midifiles[0])[:-4]}")
+            PROFILE = False
+        self.metrics = MetricsLog(os.path.join(DB_PATH, METRICS_FOLDER), instrument=instrument, files=len(self.midifiles), tempo=tempo,
+                                  samplerate=SAMPLERATE, bitdepth=BIT_DEPTH, workers=1)
+        
+        # the batch runs in a worker thread, its signals are handled here in the GUI thread (the only protocol writer)
+        self.worker = AuralizeWorker(self.auralizer, list(self.midifiles), tempo, dict_parameters, profile)
+        self.worker.fileStarted.connect(self.auralizationProgress)
+        self.worker.blockWritten.connect(self.auralizationBlockProgress)
+        self.worker.entryReady.connect(self.protocolEntry)
+        self.worker.fileFailed.connect(self.auralizationFailed)
+        self.worker.finished.connect(self.auralizationFinished)
+        self.progress_start = time.monotonic()
+        self.progress_file = 0
+        self.setRendering(True)
+        self.worker.start()
+        
+    def checkOutputs(self): # False if loaded MIDI-Files would be rendered to the same output file (e.g. same name in different folders)
+        duplicates = duplicateOutputs(self.midifiles)
+        if duplicates:
+            errorBox = QMessageBox()
+            errorBox.setIcon(QMessageBox.Critical)
+            errorBox.setText("These MIDI-Files would overwrite each other's output, please rename them or render them separately:\n\n"
+                             + "\n".join(f"{name}: {', '.join(files)}" for name, files in duplicates.items()))
+            errorBox.exec_()
+            return False
+        return True
+        
+    def setFormats(self): # passes the additional Output Formats to the Render Core, False if ffmpeg isn't available
+        try:
+            self.auralizer.setFormats(FORMATS)
+        except EncoderError as e:
+            errorBox = QMessageBox()
+            errorBox.setIcon(QMessageBox.Critical)
+            errorBox.setText(f"{e} Please install ffmpeg or disable the additional Output Formats in the Preferences!")
+            errorBox.exec_()
+            return False
+        return True
         
+    def Sweep(self): # renders the loaded MIDI-Files with every Instrument & parameter variant of a sweep spec (.json)
+        global instrument
+        from midiAuralize.sweep import loadSweep, expandVariants
         if not self.midifiles:
-            self.printStatus("No MIDI-File selected for Auralization.")
-        for midi in self.midifiles:
-            self.setTempo(midi, tempo)
-            midipath = midi[:-4] + "_temp.mid"
-            outpath = f'{OUT_PATH}{os.path.basename(midipath.replace("_temp.mid", ""))}.wav'
-            self.synth.load_midi(midipath, clear_previous=True, beats=False, all_events=True)
-            graph = [(self.synth, [])]
-            self.engine.load_graph(graph)
-            midi_endtime = mido.MidiFile(midipath).length
-            self.renderAudio(engine=self.engine, file_path=outpath, duration=midi_endtime+5.)
-            timestamp = datetime.now()
+            errorBox = QMessageBox()
+            errorBox.setIcon(QMessageBox.Critical)
+            errorBox.setText("No MIDI-File loaded. Please select a MIDI-File!")
+            errorBox.exec_()
+            return
+        if not self.checkOutputs():
+            return
+        spec_path = QFileDialog.getOpenFileName(self, "Choose Sweep Spec", DB_PATH, "Sweep Spec (*.json)")[0]
+        if not spec_path:
+            return
+        try:
+            spec = loadSweep(spec_path)
+            variants = expandVariants(spec)
+        except (OSError, ValueError) as e:
+            errorBox = QMessageBox()
+            errorBox.setIcon(QMessageBox.Critical)
+            errorBox.setText(f"Sweep Spec could not be loaded: {e}")
+            errorBox.exec_()
+            return
+        if not self.setFormats():
+            return
+        instrument = self.combo_instruments.currentText()
+        if instrument not in json_settings['pluginSettings']: # the current parameters are restored after the sweep
+            json_settings['pluginSettings'][instrument] = self.getPluginParameters()
+            jsonDump("settings")
+        instruments = spec.get("instruments") or [instrument]
+        tempo = int(self.val_tempo.text())
+        Main.auralized_files = []
+        self.metrics = MetricsLog(os.path.join(DB_PATH, METRICS_FOLDER), instruments=instruments, variants=variants, files=len(self.midifiles),
+                                  tempo=tempo, samplerate=SAMPLERATE, bitdepth=BIT_DEPTH, workers=1)
+        self.worker = SweepWorker(self.auralizer, list(self.midifiles), tempo, instruments, variants,
+                                  {i: json_settings['pluginSettings'].get(i) for i in instruments})
+        self.worker.fileStarted.connect(self.auralizationProgress)
+        self.worker.blockWritten.connect(self.auralizationBlockProgress)
+        self.worker.entryReady.connect(self.protocolEntry)
+        self.worker.fileFailed.connect(self.auralizationFailed)
+        self.worker.finished.connect(self.auralizationFinished)
+        self.progress_start = time.monotonic()
+        self.progress_file = 0
+        self.setRendering(True)
+        self.worker.start()
+        
+    def setRendering(self, rendering): # (de-)activates all controls that must not be used during an Auralization
+        for i in [self.btAuralize, self.btInstrumentSettings, self.combo_instruments, self.val_tempo, self.exeAction, self.sweepAction, self.preferencesAction]:
+            i.setEnabled(not rendering)
+        self.btCancel.setEnabled(True)
+        self.showProgress(rendering)
+        
+    def showProgress(self, visible): # shows or hides the progressbar, its label and the cancel button
+        self.progressBar.setValue(0)
+        self.lbl_progress.setText("")
+        for i in [self.progressBar, self.lbl_progress, self.btCancel]:
+            i.setVisible(visible)
             
-            if os.path.exists(outpath):
-                if os.path.getsize(outpath) > filesize_threshold:
-                    Main.auralized_files.append(outpath)
-                    
-                    hashes = getHashes(audiofile=outpath, midifile=midipath)
-                    hash_audio = str(hashes[0])
-                    hash_midi = str(hashes[1])
-                    
-                    json_protocol[hash_audio] = {
-                        "filename": os.path.basename(outpath), 
-                        "created": str(timestamp), 
-                        "samplerate": str(SAMPLERATE), 
-                        "bitdepth": str(BIT_DEPTH),
-                        "midi": {
-                            "filename": os.path.basename(midipath.replace("_temp", "")),
-                            "tempo": tempo,
-                            "hash": hash_midi
-                            },
-                        "tempo": str(tempo),
-                        "plugin": {
-                            "name": str(instrument),
-                            "version": plugin_version,
-                            "parameters": dict_parameters}
-                        }
-                    jsonDump("protocol")
-                else:
-                    self.printStatus(f"Output-File {os.path.basename(outpath)} seems to be corrupted or empty.")
-            else:
-                self.printStatus("Output File has not been created. Auralization failed!")
-            if os.path.isfile(midipath):
-                os.remove(midipath)
-        
-        if os.path.exists(outpath):
-            if os.path.getsize(outpath) > filesize_threshold:
-                self.printStatus(f"Auralization on {instrument} successful!")
+    def auralizationProgress(self, index, total, midi): # called before every file of the batch
+        self.progress_file = index
+        self.progress_total = total
+        self.updateProgress(0.)
+        self.printStatus(f"Auralizing <{os.path.basename(midi)}> ({index + 1}/{total})...", timer=0)
+        
+    def auralizationBlockProgress(self, frames_written, frames): # called after every written block of the current file
+        self.updateProgress(frames_written / max(frames, 1))
+        
+    def updateProgress(self, file_progress): # sets the progressbar and the estimated time remaining
+        done = (self.progress_file + file_progress) / self.progress_total
+        self.progressBar.setValue(int(done * 1000))
+        elapsed = time.monotonic() - self.progress_start
+        eta = ""
+        if done > 0:
+            remaining = int(elapsed / done - elapsed)
+            eta = f", ETA {remaining // 3600:d}:{remaining // 60 % 60:02d}:{remaining % 60:02d}"
+        self.lbl_progress.setText(f"File {self.progress_file + 1}/{self.progress_total}{eta}")
+        
+    def cancelAuralization(self): # stops the running batch after the current block
+        self.auralizer.cancel()
+        self.btCancel.setEnabled(False)
+        self.printStatus("Cancelling Auralization after the current block...", timer=0)
+            
+    def protocolEntry(self, outpath, hash_audio, entry): # called by the Render Core after every rendered file
+        getProtocol().add(hash_audio, entry)
+        self.metrics.entry(outpath, entry)
+        
+    def auralizationFailed(self, midi, error): # called by the Render Core after every failed file
+        self.metrics.error(midi, error)
+        self.printStatus(str(error))
+        
+    def auralizationFinished(self): # called after the batch has been finished or cancelled
+        Main.auralized_files = self.worker.auralized_files
+        cancelled = self.auralizer.cancelled
+        self.metrics.close(cancelled)
+        if isinstance(self.worker, SweepWorker): # the sweep has loaded other Instruments & parameters
+            try:
+                self.auralizer.loadInstrument(instrument, json_settings['pluginSettings'].get(instrument))
+            except RuntimeError as e:
+                print(f"Error: {str(e)}")
+        self.worker = None
+        self.setRendering(False)
+        if cancelled:
+            self.printStatus(f"Auralization cancelled, {len(Main.auralized_files)} files have been rendered.")
+            if Main.auralized_files:
                 self.openResults()
+        elif Main.auralized_files:
+            self.printStatus(f"Auralization on {instrument} successful!")
+            self.openResults()
         else:
             self.printStatus(f"Auralization on {instrument} probably failed, please check the Output-Files.")
-        
-    def renderAudio(self, engine, file_path, duration):
-        assert(self.engine.render(duration))
-        audio_output = self.engine.get_audio()
-
-        # Handle channel configuration
-        if audio_output.shape[0] != CHANNELS:
-            if CHANNELS == 2 and audio_output.shape[0] > 2:
-                # If stereo is required, select the first two channels
-                audio_output = audio_output[:2, :]
-            elif CHANNELS == 1:
-                # If mono is required, mix down the channels
-                audio_output = np.mean(audio_output, axis=0, keepdims=True)
-            else:
-                raise ValueError("Unsupported channel configuration. Available channels: {}".format(audio_output.shape[0]))
-
-        # Determine the maximum value for the given bit depth
-        max_val = 2**(BITDEPTH - 1) - 1
-
-        # Scale and convert the audio output to the desired bit depth
-        if BITDEPTH == 16:
-            audio_output = (audio_output * max_val).astype(np.int16)
-        elif BITDEPTH == 24:
-            audio_output = (audio_output * max_val).astype(np.int32)  # 24-bit audio is typically stored in 32-bit containers
-        elif BITDEPTH == 32:
-            audio_output = (audio_output * max_val).astype(np.int32)  # assuming 32-bit integer
-        else:
-            raise ValueError("Unsupported bit depth: {}".format(BITDEPTH))
-
-        if file_path is not None:
-            wavfile.write(file_path, SAMPLERATE, audio_output.transpose())
             
     def getPluginParameters(self): # returns plugin parameters
-        params_length = self.synth.get_plugin_parameter_size()
-        decoded_parameters = {}
-        for i in range(0, params_length):
-            paramName = self.synth.get_parameter_name(i)
-            decoded_parameters[paramName] = self.synth.get_parameter(i)
-        return decoded_parameters    
+        return self.auralizer.getPluginParameters()
         
     def openResults(self): # opens window with auralization results
         dlg_results = Results()
@@ -508,6 +665,17 @@ class Main(QMainWindow):
         if dlg_instrument.exec():
             self.printStatus("Hashes Checked.")
             
+    def openExportProtocol(self): # opens window to export filtered protocol entries
+        dlg_export = ExportProtocol()
+        if dlg_export.exec():
+            self.printStatus(f"{dlg_export.count} protocol entries exported to {dlg_export.path}.")
+            
+    def openVerifyFolder(self): # opens window to verify a folder of rendered files against the protocol
+        dlg_verify = VerifyFolder()
+        dlg_verify.exec()
+        if dlg_verify.results is not None:
+            self.printStatus("Folder verified: " + ", ".join(f"{len(dlg_verify.results[i])} {i}" for i in VERIFY_RESULTS) + ".")
+            
     def openPreferences(self): # opens preferences window
         dlg_preferences = Preferences()
         
@@ -526,20 +694,20 @@ class Main(QMainWindow):
         dlg_about.exec()
             
     def openPlugin(self): # opens vst window and saves changed parameters
-        self.synth.open_editor()
+        self.auralizer.synth.open_editor()
         statenum = 1
         savestate_path = f'{userpath}\\OneDrive\\2022\\Scripts\\midi_to_mp3\\states\\{instrument}\\state{statenum}'
         initial_save = False
         if os.path.exists(f'{userpath}\\OneDrive\\2022\\Scripts\\midi_to_mp3\\states\\{instrument}\\') == False:
             os.mkdir(f'{userpath}\\OneDrive\\2022\\Scripts\\midi_to_mp3\\states\\{instrument}\\')
-            self.synth.save_state(f'{userpath}\\OneDrive\\2022\\Scripts\\midi_to_mp3\\states\\{instrument}\\state0')
+            self.auralizer.synth.save_state(f'{userpath}\\OneDrive\\2022\\Scripts\\midi_to_mp3\\states\\{instrument}\\state0')
             initial_save = True
         
         if initial_save == False:
             while os.path.exists(f'{userpath}\\OneDrive\\2022\\Scripts\\midi_to_mp3\\states\\{instrument}\\state{statenum}') == True:
                 statenum += 1
                 savestate_path = f'{userpath}\\OneDrive\\2022\\Scripts\\midi_to_mp3\\states\\{instrument}\\state{statenum}'
-            self.synth.save_state(savestate_path)
+            self.auralizer.synth.save_state(savestate_path)
         
         dict_parameters = self.getPluginParameters()
         json_settings['pluginSettings'][instrument] = dict_parameters
@@ -549,6 +717,69 @@ class Main(QMainWindow):
     def quitApp(self): # quits App
         mwin.close()
         
+class AuralizeWorker(QtCore.QThread): # runs a batch of the Render Core outside of the GUI thread and reports its progress through signals
+    fileStarted = QtCore.pyqtSignal(int, int, str)
+    blockWritten = QtCore.pyqtSignal(int, int)
+    entryReady = QtCore.pyqtSignal(str, str, object)
+    fileFailed = QtCore.pyqtSignal(str, object)
+    
+    def __init__(self, auralizer, midifiles, tempo, parameters, profile=None):
+        super().__init__()
+        self.auralizer = auralizer
+        self.midifiles = midifiles
+        self.tempo = tempo
+        self.parameters = parameters
+        self.profile = profile
+        self.auralized_files = []
+        
+    def run(self):
+        self.auralizer.onBlock = self.blockWritten.emit
+        try:
+            self.auralized_files = self.auralizer.auralizeBatch(self.midifiles, self.tempo, self.parameters,
+                                                                onEntry=self.entryReady.emit, onError=self.fileFailed.emit,
+                                                                onFile=lambda index, midi: self.fileStarted.emit(index, len(self.midifiles), midi),
+                                                                profile=self.profile)
+        finally:
+            self.auralizer.onBlock = None
+        
+class SweepWorker(AuralizeWorker): # runs a Parameter-Sweep on the RenderEngine of the GUI, reports its progress like an AuralizeWorker
+    def __init__(self, auralizer, midifiles, tempo, instruments, variants, base_parameters):
+        super().__init__(auralizer, midifiles, tempo, None)
+        self.instruments = instruments
+        self.variants = variants
+        self.base_parameters = base_parameters
+        
+    def run(self):
+        from midiAuralize.sweep import runSweep
+        self.auralizer.onBlock = self.blockWritten.emit
+        try:
+            config = {"out_path": OUT_PATH, "hash_algorithm": HASH_ALGORITHM} # the RenderEngine of the GUI is used
+            self.auralized_files = runSweep(config, self.instruments, self.variants, self.midifiles, self.tempo, self.base_parameters,
+                                            auralizer=self.auralizer, onEntry=self.entryReady.emit, onError=self.fileFailed.emit,
+                                            onJob=self.fileStarted.emit)
+        finally:
+            self.auralizer.onBlock = None
+        
+class VerifyWorker(QtCore.QThread): # hashes the files of a folder on a thread pool and matches them against the protocol
+    fileVerified = QtCore.pyqtSignal(int, int, str)
+    
+    def __init__(self, folder):
+        super().__init__()
+        self.folder = folder
+        self.results = None
+        self.error = None
+        
+    def run(self):
+        protocol_thread = openProtocol(DB_PATH) # SQLite connections can't be shared with the GUI thread
+        cache = HashCache(DB_PATH)
+        try:
+            self.results = verifyFiles(protocol_thread, self.folder, cache=cache, onFile=self.fileVerified.emit)
+        except (OSError, ValueError) as e:
+            self.error = str(e)
+        finally:
+            cache.close()
+            protocol_thread.close()
+        
 class ListMidis(QDialog): # window which includes currently loaded MIDIs
     def __init__(self):
         super().__init__()
@@ -647,7 +878,7 @@ class Preferences(QDialog): # preferences window
         self.combo_samplerates = QComboBox()
         self.combo_samplerates.addItems(list(self.dict_samplerates.keys()))
         self.combo_samplerates.setCurrentIndex(self.dict_samplerates[str(SAMPLERATE)])
-        self.dict_bitdepths = {'8': 0, '16': 1, '24': 2, '32': 3}
+        self.dict_bitdepths = {j: i for i, j in enumerate(BIT_DEPTHS)} # 32f: 32-bit float
         self.lbl_bitdepth = QLabel("Bit Depth")
         self.lbl_bitdepth.setAlignment(Qt.AlignCenter)
         self.combo_bitdepths = QComboBox()
@@ -660,6 +891,44 @@ class Preferences(QDialog): # preferences window
         self.val_chunksize = QLineEdit(str(CHUNKSIZE))
         self.intValidator = QIntValidator()
         self.val_chunksize.setValidator(self.intValidator)
+        self.lbl_hashalgorithm = QLabel("Hash Algorithm")
+        self.combo_hashalgorithms = QComboBox()
+        self.combo_hashalgorithms.addItems(availableAlgorithms())
+        self.combo_hashalgorithms.setCurrentText(HASH_ALGORITHM)
+        self.combo_hashalgorithms.setToolTip("md5 is compatible with older Protocols, blake2b & xxhash are faster")
+        self.combo_hashalgorithms.setStyleSheet("padding-left: 3px;")
+        self.lbl_cachesize = QLabel("Render-Cache (MB)")
+        self.val_cachesize = QLineEdit(str(CACHE_SIZE))
+        self.val_cachesize.setValidator(self.intValidator)
+        self.val_cachesize.setToolTip("Identical Renders are restored from the Cache instead of rendered again, 0 disables the Cache")
+        self.lbl_dither = QLabel("Dither (TPDF)")
+        self.cb_dither = QCheckBox(self)
+        self.cb_dither.setChecked(DITHER)
+        self.cb_dither.setToolTip("Adds TPDF-Dither when converting to 8-, 16- or 24-bit")
+        self.lbl_formats = QLabel("Additional Output Formats")
+        self.layout_formats = QHBoxLayout()
+        self.cb_formats = {}
+        for i in OUTPUT_FORMATS:
+            self.cb_formats[i] = QCheckBox(i.upper(), self)
+            self.cb_formats[i].setChecked(i in FORMATS)
+            self.cb_formats[i].setToolTip("Encoded with ffmpeg from the same Render as the .wav, no Post-Processing needed")
+            self.layout_formats.addWidget(self.cb_formats[i])
+        self.lbl_tailmode = QLabel("Adaptive Tail")
+        self.cb_tailmode = QCheckBox(self)
+        self.cb_tailmode.setChecked(TAIL_MODE == "adaptive")
+        self.cb_tailmode.setToolTip("Render until the Instrument is silent instead of 5 seconds after the last MIDI-Event")
+        self.lbl_plugincache = QLabel("Loaded Instruments")
+        self.val_plugincache = QLineEdit(str(PLUGIN_CACHE_SIZE))
+        self.val_plugincache.setValidator(self.intValidator)
+        self.val_plugincache.setToolTip("Number of Instruments kept loaded, switching back to one of them is instant")
+        self.lbl_preload = QLabel("Preload next Instrument")
+        self.cb_preload = QCheckBox(self)
+        self.cb_preload.setChecked(PRELOAD)
+        self.cb_preload.setToolTip("Loads the next Instrument of the list in the background")
+        self.lbl_profile = QLabel("Profile next Auralization")
+        self.cb_profile = QCheckBox(self)
+        self.cb_profile.setChecked(PROFILE)
+        self.cb_profile.setToolTip("Captures the first file of the next Auralization with cProfile & tracemalloc (db\\profiles)")
         self.lbl_loadstate = QLabel("Load last Instrument-State")
         self.cb_loadstate = QCheckBox(self)
         self.cb_loadstate.setChecked(LOAD_STATE)
@@ -673,8 +942,16 @@ class Preferences(QDialog): # preferences window
         self.layout.addRow(self.lbl_statespath, self.val_statespath)
         self.layout.addRow(self.lbl_samplerate, self.combo_samplerates)
         self.layout.addRow(self.lbl_bitdepth, self.combo_bitdepths)
+        self.layout.addRow(self.lbl_dither, self.cb_dither)
+        self.layout.addRow(self.lbl_formats, self.layout_formats)
         self.layout.addRow(self.lbl_chunksize, self.val_chunksize)
+        self.layout.addRow(self.lbl_hashalgorithm, self.combo_hashalgorithms)
+        self.layout.addRow(self.lbl_cachesize, self.val_cachesize)
+        self.layout.addRow(self.lbl_tailmode, self.cb_tailmode)
+        self.layout.addRow(self.lbl_plugincache, self.val_plugincache)
+        self.layout.addRow(self.lbl_preload, self.cb_preload)
         self.layout.addRow(self.lbl_loadstate, self.cb_loadstate)
+        self.layout.addRow(self.lbl_profile, self.cb_profile)
         self.layout.addRow(self.lbl_empty)
         self.layout.addRow(self.buttonBox)
         
@@ -695,24 +972,46 @@ class Preferences(QDialog): # preferences window
                 self.val_statespath.setText(path.replace("/", "\\") + "\\")
         
     def savePreferences(self):
-        global SAMPLERATE, VST_PATH, OUT_PATH, BIT_DEPTH, CHUNKSIZE, LOAD_STATE, STATES_PATH
+        global SAMPLERATE, VST_PATH, OUT_PATH, BIT_DEPTH, CHUNKSIZE, LOAD_STATE, STATES_PATH, HASH_ALGORITHM, CACHE_SIZE, TAIL_MODE, DITHER
+        global PLUGIN_CACHE_SIZE, PRELOAD, PROFILE, FORMATS
         VST_PATH = self.val_vstpath.text()
         OUT_PATH = self.val_outpath.text()
         STATES_PATH = self.val_statespath.text()
         SAMPLERATE = int(self.combo_samplerates.currentText())
-        BIT_DEPTH = int(self.combo_bitdepths.currentText())
+        BIT_DEPTH = parseBitDepth(self.combo_bitdepths.currentText())
+        DITHER = bool(self.cb_dither.isChecked())
         CHUNKSIZE = int(self.val_chunksize.text())
         LOAD_STATE = bool(self.cb_loadstate.isChecked())
+        HASH_ALGORITHM = self.combo_hashalgorithms.currentText()
+        CACHE_SIZE = int(self.val_cachesize.text() or 0)
+        TAIL_MODE = "adaptive" if self.cb_tailmode.isChecked() else "fixed"
+        PLUGIN_CACHE_SIZE = max(int(self.val_plugincache.text() or 1), 1)
+        PRELOAD = bool(self.cb_preload.isChecked())
+        PROFILE = bool(self.cb_profile.isChecked())
+        FORMATS = [i for i, cb in self.cb_formats.items() if cb.isChecked()]
         
         json_settings['pathSettings']['vstpath'] = VST_PATH
         json_settings['pathSettings']['outpath'] = OUT_PATH
         json_settings['pathSettings']['statespath'] = STATES_PATH
         json_settings['audioSettings']['samplerate'] = SAMPLERATE
         json_settings['audioSettings']['bitdepth'] = BIT_DEPTH
+        json_settings['audioSettings']['dither'] = DITHER
         json_settings['audioSettings']['chunksize'] = CHUNKSIZE
         json_settings['audioSettings']['loadstate'] = LOAD_STATE
+        json_settings['audioSettings']['hashalgorithm'] = HASH_ALGORITHM
+        json_settings['audioSettings']['cachesize'] = CACHE_SIZE
+        json_settings['audioSettings']['tailmode'] = TAIL_MODE
+        json_settings['audioSettings']['plugincache'] = PLUGIN_CACHE_SIZE
+        json_settings['audioSettings']['preload'] = PRELOAD
+        json_settings['audioSettings']['formats'] = FORMATS
         jsonDump("settings")
             
+def renderTime(entry): # duration & realtime factor of a protocol entry, "unknown" for entries without performance
+    performance = entry.get('performance')
+    if not performance:
+        return "unknown"
+    return f"{performance['seconds']} ({performance['realtime_factor']}x realtime)"
+    
 class CheckHashes(QDialog): # window to check protocol/parameters by generated hashes 
     def __init__(self):
         super().__init__()
@@ -761,15 +1060,12 @@ class CheckHashes(QDialog): # window to check protocol/parameters by generated h
             audiohash = self.getHash()
             self.genInfo(self.audiopath, audiohash)
         
-    def getHash(self): # called in genInfo: creates parameter infos and sets them in current window
-        blocksize = 65536
-        hash_audio = hashlib.md5()
-        with open(self.audiopath, "rb") as file_audio:
-            fb = file_audio.read(blocksize)
-            while len(fb) > 0:
-                hash_audio.update(fb)
-                fb = file_audio.read(blocksize)
-        return str(hash_audio.hexdigest())
+    def getHash(self): # hashes the audiofile once with every available algorithm and returns the hashcode found in the protocol
+        hashes = hashFile(self.audiopath, availableAlgorithms())
+        for audiohash in hashes.values():
+            if audiohash in getProtocol():
+                return audiohash
+        return hashes[DEFAULT_HASH]
     
     def genParamInfo(self, val_text):
         if self.tmp_elements:
@@ -796,10 +1092,11 @@ self.tmp_elements.append('self.val_a{j}')
         
     def genInfo(self, audiopath, audiohash): # generates file info and sets/replaces them in current window
         try:
-            entry = json_protocol[audiohash]
+            entry = getProtocol().get(audiohash)
             outdict = {
                 "Audio Filepath: ": str(audiopath),
                 "Audio Hashcode: ": str(audiohash),
+                "Hash Algorithm: ": entry.get('hashalgorithm', DEFAULT_HASH),
                 "Original Filename: ": entry['filename'],
                 "Date of Creation: ": entry['created'],
                 "Original Samplerate: ": entry['samplerate'],
@@ -807,6 +1104,8 @@ self.tmp_elements.append('self.val_a{j}')
                 "MIDI for Auralization: ": entry['midi']['filename'],
                 "MIDI Hashcode: ": entry['midi']['hash'],
                 "BPM of Rendering: ": entry['tempo'],
+                "Tail (s): ": str(entry.get('tail', 5.0)),
+                "Render Time (s): ": renderTime(entry),
                 "Plugin: ": entry['plugin']['name'],
                 "Plugin Ver.: ": entry['plugin']['version'],
                 "Plugin Parameters: ": entry['plugin']['parameters']
@@ -849,6 +1148,145 @@ else:
             errorBox.setText("Hashcode not found in the Database. Load another DB or try another file.")
             errorBox.exec_()
             
+class ExportProtocol(QDialog): # window to export the protocol entries matching a filter as CSV or JSONL
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Export Protocol")
+        self.setWindowIcon(QIcon(ICON_PATH))
+        self.setFixedWidth(450)
+        self.count = 0
+        self.path = None
+        buttons = QDialogButtonBox.Ok | QDialogButtonBox.Cancel
+        self.buttonBox = QDialogButtonBox(buttons)
+        self.buttonBox.button(QDialogButtonBox.Ok).setText("Export")
+        self.buttonBox.accepted.connect(self.exportProtocol)
+        self.buttonBox.rejected.connect(self.reject)
+        
+        self.layout = QFormLayout()
+        self.setLayout(self.layout)
+        self.val_midi = QLineEdit()
+        self.val_midi.setToolTip("MIDI-Filename, wildcards * and ? are allowed (e.g. scan_12*.mid)")
+        self.val_plugin = QLineEdit()
+        self.val_version = QLineEdit()
+        self.val_tempo = QLineEdit()
+        self.val_tempo.setValidator(QIntValidator())
+        self.val_samplerate = QLineEdit()
+        self.val_samplerate.setValidator(QIntValidator())
+        self.val_since = QLineEdit()
+        self.val_since.setPlaceholderText("YYYY-MM-DD")
+        self.val_before = QLineEdit()
+        self.val_before.setPlaceholderText("YYYY-MM-DD")
+        self.combo_format = QComboBox()
+        self.combo_format.addItems(EXPORT_FORMATS)
+        self.combo_format.setStyleSheet("padding-left: 3px;")
+        self.lbl_empty = QLabel("Empty fields aren't filtered.")
+        
+        self.layout.setSpacing(13)
+        self.layout.addRow(QLabel("MIDI-File"), self.val_midi)
+        self.layout.addRow(QLabel("Instrument"), self.val_plugin)
+        self.layout.addRow(QLabel("Instrument Version"), self.val_version)
+        self.layout.addRow(QLabel("Tempo (BPM)"), self.val_tempo)
+        self.layout.addRow(QLabel("Samplerate"), self.val_samplerate)
+        self.layout.addRow(QLabel("Rendered since"), self.val_since)
+        self.layout.addRow(QLabel("Rendered before"), self.val_before)
+        self.layout.addRow(QLabel("Format"), self.combo_format)
+        self.layout.addRow(self.lbl_empty)
+        self.layout.addRow(self.buttonBox)
+        
+    def exportProtocol(self): # streams the matching entries into the chosen file
+        export_format = self.combo_format.currentText()
+        path = QFileDialog.getSaveFileName(self, "Export Protocol", f"{cwd}\\protocol.{export_format}", f"{export_format.upper()} (*.{export_format})")[0]
+        if not path:
+            return
+        text = lambda field: field.text().strip() or None
+        filters = {"midi_filename": text(self.val_midi), "plugin_name": text(self.val_plugin), "plugin_version": text(self.val_version),
+                   "tempo": float(self.val_tempo.text()) if self.val_tempo.text() else None,
+                   "samplerate": int(self.val_samplerate.text()) if self.val_samplerate.text() else None,
+                   "since": text(self.val_since), "before": text(self.val_before)}
+        with open(path, "w", encoding='UTF-8', newline="") as export_file:
+            self.count = getProtocol().export(export_file, export_format, **filters)
+        self.path = path
+        self.accept()
+        
+class VerifyFolder(QDialog): # window to verify all rendered files of a folder (and its subfolders) against the protocol
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Verify Folder")
+        self.setWindowIcon(QIcon(ICON_PATH))
+        self.setFixedWidth(600)
+        self.results = None
+        self.worker = None
+        buttons = QDialogButtonBox.Ok | QDialogButtonBox.Cancel
+        self.buttonBox = QDialogButtonBox(buttons)
+        self.buttonBox.button(QDialogButtonBox.Ok).setText("Verify")
+        self.buttonBox.button(QDialogButtonBox.Cancel).setText("Close")
+        self.buttonBox.accepted.connect(self.verifyFolder)
+        self.buttonBox.rejected.connect(self.reject)
+        
+        self.layout = QFormLayout()
+        self.setLayout(self.layout)
+        self.val_folder = QLineEdit(OUT_PATH)
+        self.bt_folder = QPushButton("...")
+        self.bt_folder.setFixedWidth(30)
+        self.bt_folder.clicked.connect(self.selectFolder)
+        folder_row = QHBoxLayout()
+        folder_row.addWidget(self.val_folder)
+        folder_row.addWidget(self.bt_folder)
+        self.progressBar = QProgressBar()
+        self.lbl_summary = QLabel("Unchanged files are looked up in the hash cache, all others are hashed in parallel.")
+        self.txt_files = QPlainTextEdit()
+        self.txt_files.setReadOnly(True)
+        self.txt_files.setFixedHeight(200)
+        self.txt_files.setPlaceholderText("Modified, unknown & unreadable files")
+        
+        self.layout.setSpacing(13)
+        self.layout.addRow(QLabel("Folder"), folder_row)
+        self.layout.addRow(self.progressBar)
+        self.layout.addRow(self.lbl_summary)
+        self.layout.addRow(self.txt_files)
+        self.layout.addRow(self.buttonBox)
+        
+    def selectFolder(self): # opens folder dialog to select the folder of rendered files
+        folder = QFileDialog.getExistingDirectory(self, "Select Folder", self.val_folder.text() or cwd)
+        if folder:
+            self.val_folder.setText(folder.replace("/", "\\"))
+            
+    def verifyFolder(self): # starts the VerifyWorker, the dialog stays open for the results
+        folder = self.val_folder.text().strip()
+        if not os.path.isdir(folder):
+            self.lbl_summary.setText(f"{folder} not found.")
+            return
+        self.buttonBox.setEnabled(False)
+        self.progressBar.setRange(0, 0)
+        self.txt_files.clear()
+        self.lbl_summary.setText("Searching files...")
+        self.worker = VerifyWorker(folder)
+        self.worker.fileVerified.connect(self.fileVerified)
+        self.worker.finished.connect(self.verificationFinished)
+        self.worker.start()
+        
+    def fileVerified(self, done, total, path):
+        self.progressBar.setRange(0, total)
+        self.progressBar.setValue(done)
+        self.lbl_summary.setText(f"{done} / {total}: {os.path.basename(path)}")
+        
+    def verificationFinished(self):
+        self.buttonBox.setEnabled(True)
+        self.progressBar.setRange(0, 1)
+        self.progressBar.setValue(1)
+        if self.worker.error is not None:
+            self.lbl_summary.setText(f"Verification failed: {self.worker.error}")
+            return
+        self.results = self.worker.results
+        self.lbl_summary.setText(", ".join(f"{len(self.results[i])} {i}" for i in VERIFY_RESULTS) + ".")
+        self.txt_files.setPlainText("\n".join([f"{result.capitalize()}: {path}" for result in ["modified", "unknown"] for path, hash_audio in self.results[result]]
+                                              + [f"Unreadable: {path} ({error})" for path, error in self.results["unreadable"]]))
+        
+    def reject(self): # the dialog can't be closed while the worker is running
+        if self.worker is not None and self.worker.isRunning():
+            return
+        super().reject()
+        
 class About(QDialog): # window with information about the project
     def __init__(self):
         super().__init__()
@@ -954,7 +1392,10 @@ style_main = f"""
         text-align: center;}}
 """
         
-if __name__ == "__main__": # calls the start of the application
+if __name__ == "__main__": # calls the start of the application, or the Commandline-Version (e.g. midiAuralizer render ...)
+    multiprocessing.freeze_support() # needed for the render processes of the frozen executable
+    if len(sys.argv) > 1 and sys.argv[1] in cli.COMMANDS:
+        sys.exit(cli.main(sys.argv[1:]))
     app = QApplication(sys.argv)
     app.setStyleSheet(style_main)
     win = Start()
@@ -1,130 +1,330 @@
 """
-This script does the following:
-1) Renaming of files to musiXplora Catalogus AURAL IDs depending on the defined parameters.
-2) Conversion of all WAV files into MP3 files with 320kbps.
+This script does the following for every WAV file in the processing directory, file by file:
+1) Renaming of files to musiXplora Catalogus AURAL IDs depending on the defined parameters (indexed catalogue, collision check).
+2) Conversion of all WAV files into MP3 files with 320kbps (parallel ffmpeg encoders, up-to-date MP3s are skipped).
 3) Translocation of all files (WAV & MP3) into directories based on their IDs.
-4) Archiving the whole structure into a .zip file with the MP3 only for an mXp import.
+4) Adding the MP3 to a .zip file (with the MP3 only) for an mXp import.
+Every completed step is appended to a manifest, a re-run only processes new files and continues failed or interrupted ones.
+
+Usage: python diskos_postProcessing.py <processing dir> [--excel "Notenrollen 20231102.xlsx"] [--zip IMPORT_midiExp4.zip] [--workers 8]
 """
 
 import os
-import pandas as pd
-from pathlib import Path
-from pydub import AudioSegment
+import sys
+import json
+import time
+import pickle
+import shutil
+import argparse
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import zlib
 import zipfile
 
-PROCESSING_DIR = 'C:/Users/Dominik/Desktop/GitProjects/midiAuralizer/output'
-zip_filename = "IMPORT_midiExp4.zip"
+FFMPEG = shutil.which("ffmpeg") or "ffmpeg"
+MP3_WORKERS = os.cpu_count() or 1 # number of ffmpeg encoders running at the same time
+MANIFEST_FILENAME = "postProcessing_manifest.jsonl"
+STEPS = ["rename", "encode", "move", "archive"]
+ZIP_FILENAME = "IMPORT_midiExp4.zip" # expected by the mXp import
 
-def rename_files():
-    # Load the Excel file
-    excel_path = 'C:/Users/Dominik/Desktop/Notenrollen 20231102.xlsx'  # Excel file path
-    column_1 = 'Cat. SCAN'      # <-- Enter Input Column Name 1
-    column_2 = 'Cat. MIDI'      # <-- Enter Input Column Name 2
-    target_column = 'CAT AURAL' # <-- Enter Target Column (renames file to corresponding value in this column)
-    
-    print(f"Step 1: Renaming of files based on {excel_path} /nSearching in Columns '{column_1}' and '{column_2}'...")
+def load_catalogue_index(excel_path, column_1, column_2, target_column, sheet_name='MIDI'):
+    # Builds {SCAN ID / MIDI ID: AURAL ID} from the Excel sheet once, the first matching row wins and SCAN IDs win over MIDI IDs
+    # The index is cached as pickle next to the Excel file and only rebuilt if the Excel file or the columns change
+    cache_path = excel_path + ".index.pkl"
+    stat = os.stat(excel_path)
+    cache_key = [stat.st_mtime, stat.st_size, sheet_name, column_1, column_2, target_column]
+    if os.path.exists(cache_path):
+        with open(cache_path, "rb") as cache_file:
+            cached = pickle.load(cache_file)
+        if cached["key"] == cache_key:
+            print(f"Using cached catalogue index {cache_path}")
+            return cached["index"]
 
-    df = pd.read_excel(excel_path, sheet_name='MIDI').fillna(0)  # Excel sheet name
+    import pandas as pd # only needed to rebuild the index
+    df = pd.read_excel(excel_path, sheet_name=sheet_name).fillna(0)
+    # every column is converted once, not once per file
+    targets = df[target_column].values
+    index = {}
+    for key, target in zip(df[column_2].astype(int).astype(str).values, targets):
+        index.setdefault(key, target)
+    scan_index = {}
+    for key, target in zip(df[column_1].astype(str).values, targets):
+        scan_index.setdefault(key, target)
+    index.update(scan_index)
 
-    # Define the directory containing the files
-    directory_path = PROCESSING_DIR
-    
-    # List all files in the directory
-    files_in_directory = os.listdir(directory_path)
-    print(f'Found {len(files_in_directory)} files in the directory.')
-
-    # Function to get the base name without extension
-    def get_base_name(file_name):
-        return os.path.splitext(file_name)[0]
-
-    # Rename the files
-    for file in files_in_directory:
-        base_name = get_base_name(file)
-        extension = os.path.splitext(file)[1]
-
-        match_1 = df[df[column_1].astype(str) == base_name]
-        match_2 = df[df[column_2].astype(int).astype(str) == base_name]
-
-        if not match_1.empty:
-            new_name = match_1[target_column].values[0]
-            new_file_name = f'{new_name}{extension}'
-            os.rename(os.path.join(directory_path, file), os.path.join(directory_path, new_file_name))
-            print(f'Renamed "{file}" to "{new_file_name}".')
-        elif not match_2.empty:
-            new_name = match_2[target_column].values[0]
-            new_file_name = f'{new_name}{extension}'
-            os.rename(os.path.join(directory_path, file), os.path.join(directory_path, new_file_name))
-            print(f'Renamed "{file}" to "{new_file_name}".')
-        else:
-            print(f'No match found for "{file}" in columns "{column_1}" and "{column_2}".')
+    with open(cache_path, "wb") as cache_file:
+        pickle.dump({"key": cache_key, "index": index}, cache_file)
+    return index
+
+def plan_renames(files, index, existing=None):
+    # Returns [[old name, new name]] for all files with a catalogue match, the files without a match and the collisions
+    # existing are all names in the directory (default: files)
+    existing = set(files if existing is None else existing)
+    renames = []
+    unmatched = []
+    for file in files:
+        base_name, extension = os.path.splitext(file)
+        if base_name not in index:
+            unmatched.append(file)
+            continue
+        new_file_name = f'{index[base_name]}{extension}'
+        if new_file_name != file:
+            renames.append([file, new_file_name])
+
+    sources = {old for old, new in renames}
+    targets = {}
+    for old, new in renames:
+        targets.setdefault(new, []).append(old)
+    collisions = [[new, olds] for new, olds in targets.items() if len(olds) > 1]
+    # an existing file can only be replaced if it is renamed itself
+    collisions += [[new, olds] for new, olds in targets.items() if len(olds) == 1 and new in existing and new not in sources]
+    return renames, unmatched, collisions
+
+def apply_renames(directory_path, renames, on_renamed=None):
+    # Renames all files in two passes: every source is moved to a temporary name first, then all temporary names to the new names,
+    # so chained or cyclic plans (a -> b, b -> c) never overwrite a file that hasn't been moved yet
+    # on_renamed(old, new) is called after every rename
+    pending = []
+    for old, new in renames:
+        temporary = f'{old}.renaming'
+        os.rename(os.path.join(directory_path, old), os.path.join(directory_path, temporary))
+        pending.append([temporary, new, old])
+    for temporary, new, old in pending:
+        os.rename(os.path.join(directory_path, temporary), os.path.join(directory_path, new))
+        print(f'Renamed "{old}" to "{new}".')
+        if on_renamed is not None:
+            on_renamed(old, new)
+
+def encode_mp3(wav_path, mp3_path):
+    # ffmpeg reads the WAV itself, nothing is decoded into Python memory
+    # the MP3 is written to a temporary file first, so an aborted run never leaves a truncated MP3 that looks up to date
+    part_path = mp3_path + ".part"
+    result = subprocess.run([FFMPEG, "-y", "-loglevel", "error", "-i", wav_path, "-ac", "2", "-codec:a", "libmp3lame", "-b:a", "320k",
+                             "-f", "mp3", part_path], stdin=subprocess.DEVNULL, capture_output=True, text=True)
+    if result.returncode != 0:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise RuntimeError(result.stderr.strip() or f"ffmpeg exited with code {result.returncode}")
+    os.replace(part_path, mp3_path)
 
-def convert_to_mp3():
-    print(f"Step 2: Converting WAV to MP3...")
+def file_crc(path):
+    # CRC-32 of a file, compared with the CRC stored in the archive to find outdated MP3s
+    crc = 0
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1048576), b""):
+            crc = zlib.crc32(block, crc)
+    return crc
 
-    # Convert WAV to MP3
-    for filename in os.listdir(PROCESSING_DIR):
-        if filename.endswith(".wav"):
-            wav_path = os.path.join(PROCESSING_DIR, filename)
-            mp3_path = os.path.join(PROCESSING_DIR, filename.replace(".wav", ".mp3"))
+def rebuild_archive(zip_path, replacements):
+    # writes a fresh archive with all entries of zip_path, replacements {arcname: path} are taken from the files instead
+    # entries of a zip can't be replaced in place, appending a second entry of the same name would keep the outdated one
+    part_path = zip_path + ".part"
+    with zipfile.ZipFile(zip_path) as zip_in, zipfile.ZipFile(part_path, 'w') as zip_out:
+        for info in zip_in.infolist():
+            if info.filename not in replacements:
+                with zip_in.open(info) as source, zip_out.open(info, 'w') as target:
+                    shutil.copyfileobj(source, target)
+        for arcname, path in replacements.items():
+            zip_out.write(path, arcname)
+    os.replace(part_path, zip_path)
 
-            # Print the name of the file being processed
-            print(f"Processing file: {filename}")
 
-            # Load WAV file
-            audio = AudioSegment.from_wav(wav_path)
+class Manifest:
+    # Append-only log (one JSON object per line) of the completed steps of every file, replayed on start
+    # Files are identified by their original name, "name" is their current name without extension, "id" their directory
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        if os.path.exists(path):
+            with open(path, encoding='UTF-8') as manifest_file:
+                for line in manifest_file:
+                    try:
+                        self.apply(json.loads(line))
+                    except json.JSONDecodeError: # last line of an interrupted run
+                        continue
+        self.file = open(path, "a", encoding='UTF-8')
 
-            # Export as MP3 (320kbps, 2 Channels Stereo)
-            audio.export(mp3_path, format="mp3", bitrate="320k", parameters=["-ac", "2"])
+    def apply(self, record):
+        if record["step"] == "start" or record["file"] not in self.files:
+            self.files[record["file"]] = {"name": record["file"], "steps": [], "id": None, "error": None}
+        state = self.files[record["file"]]
+        if record["step"] == "failed":
+            state["error"] = record["error"]
+        elif record["step"] != "start":
+            state["steps"].append(record["step"])
+            state["error"] = None
+        for key in ["name", "id"]:
+            if key in record:
+                state[key] = record[key]
 
-    # Print completion message
-    print("Conversion complete. All WAV files have been converted to MP3.")
+    def record(self, file, step, **values):
+        record = dict(file=file, step=step, time=str(datetime.now()), **values)
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        self.apply(record)
+
+    def close(self):
+        self.file.close()
+
+def file_id(name):
+    # ID directory of a file, e.g. AURAL_0001_2 -> AURAL_0001
+    return name.rsplit('_', 1)[0]
+
+def process(args):
+    directory_path = args.directory
+    manifest = Manifest(args.manifest or os.path.join(directory_path, MANIFEST_FILENAME))
+    start_time = time.perf_counter()
+
+    # New WAV files in the processing directory start the pipeline, a WAV with the name of an already moved file is a new render
+    files_in_directory = os.listdir(directory_path)
+    current_names = {state["name"]: file for file, state in manifest.files.items() if "move" not in state["steps"]}
+    for filename in files_in_directory:
+        if filename.endswith(".wav") and filename[:-4] not in current_names:
+            manifest.record(filename[:-4], "start")
+    pending = [file for file, state in manifest.files.items() if "archive" not in state["steps"]]
+    print(f'Found {len(files_in_directory)} files in the directory, {len(pending)} files to process '
+          f'({len(manifest.files) - len(pending)} already processed).')
+
+    # Step 1: Renaming, all renames are planned first, nothing is renamed if two files would get the same name
+    to_rename = [file for file in pending if "rename" not in manifest.files[file]["steps"]]
+    if to_rename:
+        if args.excel:
+            print(f"Step 1: Renaming of files based on {args.excel}, searching in Columns '{args.scan_column}' and '{args.midi_column}'...")
+            index = load_catalogue_index(args.excel, args.scan_column, args.midi_column, args.target_column, args.sheet)
+        else:
+            print("Step 1: No catalogue given (--excel), all files keep their names.")
+            index = {}
+        by_filename = {f'{manifest.files[file]["name"]}.wav': file for file in to_rename}
+        renames, unmatched, collisions = plan_renames(list(by_filename), index, files_in_directory)
+        if collisions:
+            for new_file_name, files in collisions:
+                print(f'Collision: {", ".join(files)} would be renamed to existing or shared name "{new_file_name}".')
+            manifest.close()
+            raise RuntimeError(f"{len(collisions)} rename collisions found, no file has been renamed.")
+        for filename in unmatched:
+            if args.excel:
+                print(f'No match found for "{filename}" in columns "{args.scan_column}" and "{args.midi_column}", the name is kept.')
+            manifest.record(by_filename[filename], "rename", name=filename[:-4])
+        apply_renames(directory_path, renames, lambda old, new: manifest.record(by_filename[old], "rename", name=new[:-4]))
+        renamed = {old for old, new in renames}
+        for filename in by_filename: # the catalogue name is already the current name
+            if filename not in renamed and filename not in unmatched:
+                manifest.record(by_filename[filename], "rename", name=filename[:-4])
 
-def move_into_directories():
-    source_path = Path(PROCESSING_DIR)
-    created_directories = set()
+    # Steps 2-4: every finished encoder is followed by moving the files and adding the MP3 to the archive
+    print(f"Steps 2-4: Converting WAV to MP3 with {args.workers} encoders, moving into ID directories & archiving...")
+    zip_path = args.zip if os.path.isabs(args.zip) else os.path.join(directory_path, args.zip)
+    created_directories = []
+    counts = {"done": 0, "failed": 0, "encoded_bytes": 0}
 
-    print(f"Step 3: Moving WAV & MP3 files into ID directories...")
+    def finish(zipf, archived, outdated, file):
+        # moves WAV & MP3 of an encoded file into its ID directory and adds the MP3 to the archive
+        # an MP3 that differs from the archived one of its name (e.g. of a re-rendered WAV) is added when the archive is rebuilt
+        state = manifest.files[file]
+        name = state["name"]
+        if "move" not in state["steps"]:
+            target_dir = os.path.join(directory_path, file_id(name))
+            if not os.path.exists(target_dir):
+                os.mkdir(target_dir)
+                created_directories.append(target_dir)
+            for extension in [".wav", ".mp3"]:
+                source = os.path.join(directory_path, name + extension)
+                if os.path.exists(source):
+                    os.replace(source, os.path.join(target_dir, name + extension))
+            manifest.record(file, "move", id=file_id(name))
+        arcname = f'{state["id"]}/{name}.mp3'
+        mp3_path = os.path.join(directory_path, state["id"], name + ".mp3")
+        if arcname not in archived:
+            zipf.write(mp3_path, arcname)
+            archived[arcname] = zipf.getinfo(arcname).CRC
+        elif archived[arcname] != file_crc(mp3_path): # the same MP3 is already there if an interrupted run has added it
+            outdated[arcname] = [file, mp3_path]
+            return
+        manifest.record(file, "archive")
+        counts["done"] += 1
 
-    for file in source_path.iterdir():
-        if file.suffix in ['.mp3', '.wav']:
-            file_id = file.stem.rsplit('_', 1)[0]
-            target_dir = source_path / file_id
-            if not target_dir.exists():
-                created_directories.add(target_dir)
-            target_dir.mkdir(exist_ok=True)
-            file.rename(target_dir / file.name)
+    with zipfile.ZipFile(zip_path, 'a') as zipf, ThreadPoolExecutor(max_workers=args.workers) as pool:
+        archived = {info.filename: info.CRC for info in zipf.infolist()}
+        outdated = {}
+        futures = {}
+        for file in pending:
+            state = manifest.files[file]
+            if "rename" not in state["steps"]:
+                continue
+            if "encode" in state["steps"]:
+                continue
+            wav_path = os.path.join(directory_path, state["name"] + ".wav")
+            mp3_path = os.path.join(directory_path, state["name"] + ".mp3")
+            if not os.path.exists(wav_path):
+                counts["failed"] += 1
+                manifest.record(file, "failed", error=f"{wav_path} not found")
+                print(f"FAILED {state['name']}: {wav_path} not found")
+                continue
+            if os.path.exists(mp3_path) and os.path.getmtime(mp3_path) >= os.path.getmtime(wav_path):
+                manifest.record(file, "encode", skipped=True)
+                continue
+            futures[pool.submit(encode_mp3, wav_path, mp3_path)] = [file, wav_path]
 
-    # Writing the list of directories to a file
-    with open(source_path / 'created_directories.txt', 'w') as f:
-        for dir in sorted(created_directories):
-            f.write(f"{dir}\n")
+        # files that have been encoded before (or are up to date) don't wait for the encoders
+        for file in pending:
+            state = manifest.files[file]
+            if "encode" in state["steps"]:
+                try:
+                    finish(zipf, archived, outdated, file)
+                except OSError as e:
+                    counts["failed"] += 1
+                    manifest.record(file, "failed", error=str(e))
+                    print(f"FAILED {state['name']}: {e}")
 
-    print("Movement complete. All files have been moved to their corresponding ID directories.")
+        for future in as_completed(futures):
+            file, wav_path = futures[future]
+            try:
+                wav_size = os.path.getsize(wav_path)
+                future.result()
+                manifest.record(file, "encode")
+                counts["encoded_bytes"] += wav_size
+                finish(zipf, archived, outdated, file)
+            except Exception as e:
+                counts["failed"] += 1
+                manifest.record(file, "failed", error=str(e))
+                print(f"[{counts['done'] + counts['failed']}/{len(pending)}] FAILED {os.path.basename(wav_path)}: {e}")
+                continue
+            elapsed = time.perf_counter() - start_time
+            print(f"[{counts['done'] + counts['failed']}/{len(pending)}] {manifest.files[file]['name']} "
+                  f"({counts['encoded_bytes'] / 1048576 / elapsed:.1f} MB/s WAV)")
 
-def zip_for_import():
-    # Path to the output zip file
-    zip_path = os.path.join(PROCESSING_DIR, zip_filename)
+    if outdated:
+        print(f"Rebuilding {zip_path} with {len(outdated)} updated MP3s...")
+        rebuild_archive(zip_path, {arcname: mp3_path for arcname, [file, mp3_path] in outdated.items()})
+        for file, mp3_path in outdated.values():
+            manifest.record(file, "archive")
+            counts["done"] += 1
 
-    print(f"Step 4: Creating .zip-Archive for musiXplora Import...")
+    if created_directories:
+        with open(os.path.join(directory_path, 'created_directories.txt'), 'a') as f:
+            for dir in sorted(created_directories):
+                f.write(f"{dir}\n")
+    manifest.close()
 
-    # Create a zip file
-    with zipfile.ZipFile(zip_path, 'w') as zipf:
-        # Walk through all directories and files in the parent directory
-        for root, dirs, files in os.walk(PROCESSING_DIR):
-            for file in files:
-                # Check if the file is an MP3
-                if file.endswith(".mp3"):
-                    # Create the full file path
-                    filepath = os.path.join(root, file)
-                    # Create the arcname (path within the zip file)
-                    arcname = os.path.relpath(filepath, PROCESSING_DIR)
-                    # Add the file to the zip, maintaining its directory structure
-                    zipf.write(filepath, arcname)
+    elapsed = time.perf_counter() - start_time
+    print(f"Post-Processing complete: {counts['done']} files processed, {counts['failed']} failed in {elapsed:.1f} s "
+          f"({counts['done'] / elapsed if elapsed else 0:.2f} files/s, {counts['encoded_bytes'] / 1048576 / elapsed if elapsed else 0:.1f} MB/s WAV encoded).")
+    print(f"The resulting .zip can be found at {zip_path}")
+    return 1 if counts["failed"] else 0
 
-    print(f"Archiving complete, the resulting .zip can be found at {zip_path}")
+def build_parser():
+    parser = argparse.ArgumentParser(description="DISKOS Post-Processing: rename, convert to MP3, move into ID directories & archive")
+    parser.add_argument("directory", help="processing directory with the rendered WAV files (e.g. the output folder of midiAuralizer)")
+    parser.add_argument("--excel", help="catalogue (.xlsx) to rename the files to AURAL IDs, files keep their names without it")
+    parser.add_argument("--sheet", default="MIDI", help="sheet of the catalogue (default: MIDI)")
+    parser.add_argument("--scan-column", default="Cat. SCAN", help="input column 1 (default: 'Cat. SCAN')")
+    parser.add_argument("--midi-column", default="Cat. MIDI", help="input column 2 (default: 'Cat. MIDI')")
+    parser.add_argument("--target-column", default="CAT AURAL", help="target column, files are renamed to its values (default: 'CAT AURAL')")
+    parser.add_argument("--zip", default=ZIP_FILENAME, help=f"archive for the mXp import, relative to the directory (default: {ZIP_FILENAME})")
+    parser.add_argument("--workers", type=int, default=MP3_WORKERS, help=f"number of ffmpeg encoders (default: {MP3_WORKERS})")
+    parser.add_argument("--manifest", help=f"manifest of the completed steps (default: <directory>/{MANIFEST_FILENAME})")
+    return parser
 
 if __name__ == "__main__":
-    rename_files()
-    convert_to_mp3()
-    move_into_directories()
-    zip_for_import()
\ No newline at end of file
+    sys.exit(process(build_parser().parse_args()))
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+@description: Tests of the Render-Cache (midiAuralize/cache.py)
+"""
+import os
+import sys
+import itertools
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from midiAuralize import cache
+from midiAuralize.cache import RenderCache, renderKey, linkFile
+
+KEY_INPUTS = {"midi": "abc", "plugin": "Piano", "version": "1.0.0.0", "parameters": {"0": 0.5, "1": 0.25}, "tempo": 120.0,
+              "samplerate": 44100, "bitdepth": 16}
+
+class RenderCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.out_path = os.path.join(self.directory.name, "out")
+        os.makedirs(self.out_path)
+        self.cache = RenderCache(self.directory.name, os.path.join(self.directory.name, "cache"), max_size=1)
+        self.clock = mock.patch.object(cache.time, "time", side_effect=itertools.count(1000)) # distinct last_used times
+        self.clock.start()
+
+    def tearDown(self):
+        self.clock.stop()
+        self.cache.close()
+        self.directory.cleanup()
+
+    def render(self, name, size, extension=".wav"): # writes a rendered file of size bytes into the output folder
+        path = os.path.join(self.out_path, name + extension)
+        with open(path, "wb") as file:
+            file.write(name.encode('UTF-8').ljust(size, b'\0'))
+        return path
+
+    def testLookup(self):
+        path = self.render("a", 1000)
+        mp3 = self.render("a", 100, ".mp3")
+        self.cache.store("key_a", path, "hash_a", {"filename": "a.wav"}, outputs=[mp3])
+        cached_path, hash_audio, entry, outputs = self.cache.lookup("key_a")
+        self.assertEqual([hash_audio, entry], ["hash_a", {"filename": "a.wav"}])
+        self.assertTrue(os.path.samefile(cached_path, path))
+        self.assertEqual([os.path.basename(i) for i in outputs], ["key_a.mp3"])
+        self.assertEqual(self.cache.size(), 1100)
+        self.assertIsNone(self.cache.lookup("key_b"))
+        os.remove(outputs[0]) # removed outside of the cache
+        self.assertIsNone(self.cache.lookup("key_a"))
+        self.assertEqual(self.cache.size(), 0)
+
+    def testEvictLeastRecentlyUsed(self):
+        paths = {name: self.render(name, 400000) for name in "abc"}
+        self.cache.store("key_a", paths["a"], "hash_a", {})
+        self.cache.store("key_b", paths["b"], "hash_b", {})
+        self.assertIsNotNone(self.cache.lookup("key_a")) # b is the least recently used render now
+        self.cache.store("key_c", paths["c"], "hash_c", {}) # 1.2 MB exceed the limit of 1 MB
+        self.assertIsNone(self.cache.lookup("key_b"))
+        self.assertFalse(os.path.exists(os.path.join(self.cache.cache_path, "key_b.wav")))
+        self.assertIsNotNone(self.cache.lookup("key_a"))
+        self.assertIsNotNone(self.cache.lookup("key_c"))
+        self.assertLessEqual(self.cache.size(), 1048576)
+        for name, path in paths.items(): # the rendered files are hardlinks, evicting removes only the cached link
+            with open(path, "rb") as file:
+                self.assertTrue(file.read().startswith(name.encode('UTF-8')))
+
+class LinkFileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.directory.name, "source.wav")
+        self.target = os.path.join(self.directory.name, "target.wav")
+        with open(self.source, "wb") as file:
+            file.write(b"audio")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testHardlink(self):
+        linkFile(self.source, self.target)
+        self.assertTrue(os.path.samefile(self.source, self.target))
+        linkFile(self.source, self.target) # already linked
+        self.assertEqual(os.stat(self.source).st_nlink, 2)
+
+    def testCopyFallback(self): # e.g. the cache folder is on another drive
+        with mock.patch.object(cache.os, "link", side_effect=OSError("Invalid cross-device link")):
+            linkFile(self.source, self.target)
+        self.assertFalse(os.path.samefile(self.source, self.target))
+        with open(self.target, "rb") as file:
+            self.assertEqual(file.read(), b"audio")
+
+    def testReplaceTarget(self):
+        with open(self.target, "wb") as file:
+            file.write(b"outdated")
+        linkFile(self.source, self.target)
+        self.assertTrue(os.path.samefile(self.source, self.target))
+
+class RenderKeyTest(unittest.TestCase):
+    def testStable(self): # keys of existing caches must stay valid
+        self.assertEqual(renderKey(**KEY_INPUTS), "7bbb023fed4ca41fd4555cb23ff4ccd7beaaa57ec51378da431ff4a5ee5ae1da")
+
+    def testCanonical(self):
+        reordered = dict(reversed(list(KEY_INPUTS.items())), parameters={"1": 0.25, "0": 0.5})
+        self.assertEqual(renderKey(**reordered), renderKey(**KEY_INPUTS))
+
+    def testInputsChangeKey(self):
+        for name, value in [["tempo", 121.0], ["bitdepth", "32f"], ["parameters", {"0": 0.5, "1": 0.26}], ["version", "1.0.0.1"]]:
+            with self.subTest(name=name):
+                self.assertNotEqual(renderKey(**dict(KEY_INPUTS, **{name: value})), renderKey(**KEY_INPUTS))
+        self.assertNotEqual(renderKey(**dict(KEY_INPUTS, formats=["mp3"])), renderKey(**KEY_INPUTS))
+
+if __name__ == "__main__":
+    unittest.main()
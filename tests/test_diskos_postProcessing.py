@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+@description: Tests of the renaming of scripts/diskos_postProcessing.py
+"""
+import os
+import sys
+import zipfile
+import tempfile
+import unittest
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+from diskos_postProcessing import apply_renames, build_parser, process, ZIP_FILENAME
+
+class ApplyRenamesTest(unittest.TestCase):
+    def rename(self, files, renames): # writes files {name: data}, applies renames and returns {name: data} of the directory
+        with tempfile.TemporaryDirectory() as directory:
+            for name, data in files.items():
+                with open(os.path.join(directory, name), "wb") as file:
+                    file.write(data)
+            apply_renames(directory, renames)
+            result = {}
+            for name in os.listdir(directory):
+                with open(os.path.join(directory, name), "rb") as file:
+                    result[name] = file.read()
+            return result
+
+    def testChainedPlan(self): # 333 takes the name of 222 before 222 has been moved
+        result = self.rename({"333.wav": b"333", "222.wav": b"222"}, [["333.wav", "222.wav"], ["222.wav", "AUR.wav"]])
+        self.assertEqual(result, {"222.wav": b"333", "AUR.wav": b"222"})
+
+    def testCyclicPlan(self):
+        result = self.rename({"a.wav": b"a", "b.wav": b"b", "c.wav": b"c"}, [["a.wav", "b.wav"], ["b.wav", "c.wav"], ["c.wav", "a.wav"]])
+        self.assertEqual(result, {"b.wav": b"a", "c.wav": b"b", "a.wav": b"c"})
+
+class ArchiveTest(unittest.TestCase):
+    def render(self, directory, name, data): # writes a WAV with an up-to-date MP3, so no encoder is needed
+        for extension in [".wav", ".mp3"]:
+            with open(os.path.join(directory, name + extension), "wb") as file:
+                file.write(data)
+        mtime = os.path.getmtime(os.path.join(directory, name + ".wav"))
+        os.utime(os.path.join(directory, name + ".mp3"), (mtime + 10, mtime + 10))
+
+    def process(self, directory):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            return process(build_parser().parse_args([directory]))
+
+    def testDefaultArchive(self):
+        self.assertEqual(build_parser().parse_args(["."]).zip, "IMPORT_midiExp4.zip")
+
+    def testRerenderedFileReplacesArchivedMp3(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.render(directory, "AURAL_0001_1", b"first")
+            self.render(directory, "AURAL_0002_1", b"other")
+            self.assertEqual(self.process(directory), 0)
+            self.render(directory, "AURAL_0001_1", b"second")
+            self.assertEqual(self.process(directory), 0)
+            with zipfile.ZipFile(os.path.join(directory, ZIP_FILENAME)) as zipf:
+                self.assertEqual(sorted(zipf.namelist()), ["AURAL_0001/AURAL_0001_1.mp3", "AURAL_0002/AURAL_0002_1.mp3"])
+                self.assertEqual(zipf.read("AURAL_0001/AURAL_0001_1.mp3"), b"second")
+                self.assertEqual(zipf.read("AURAL_0002/AURAL_0002_1.mp3"), b"other")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+@description: Tests of the Protocol-Store (midiAuralize/protocol.py)
+"""
+import io
+import os
+import csv
+import sys
+import json
+import sqlite3
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from midiAuralize.protocol import ProtocolStore, openProtocol, PROTOCOL_FILE, LEGACY_PROTOCOL_FILE
+
+def protocolEntry(midi_filename, created, parameters=None, filename=None): # entry as written by the Render Core
+    return {"filename": filename or midi_filename[:-4] + ".wav", "created": created, "samplerate": 44100, "bitdepth": 16,
+            "midi": {"filename": midi_filename, "hash": "m_" + midi_filename, "tempo": 120.0},
+            "plugin": {"name": "Piano", "version": "1.0.0.0", "parameters": parameters or {"0": 0.5, "1": 0.25}}}
+
+class ProtocolTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = ProtocolStore(os.path.join(self.directory.name, PROTOCOL_FILE))
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def rows(self, hash_audio): # [current, entry] of all stored rows of a hash
+        return [[current, json.loads(entry)] for current, entry in self.store.connection.execute(
+            "SELECT current, entry FROM entries WHERE hash = ? ORDER BY id", (hash_audio,))]
+
+    def testMigrate(self):
+        self.store.close()
+        legacy = {"h1": protocolEntry("a_01.mid", "2024-01-01 10:00:00"), "h2": protocolEntry("a_02.mid", "2024-01-02 10:00:00")}
+        with open(os.path.join(self.directory.name, LEGACY_PROTOCOL_FILE), "w", encoding="UTF-8") as file:
+            json.dump(legacy, file)
+        self.store = openProtocol(self.directory.name)
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual(self.store["h1"], legacy["h1"])
+        self.assertTrue(self.store.hasFilename("a_02.wav"))
+        self.assertEqual(self.store.parameterSets(), 1)
+        self.assertEqual(self.store.migrate(os.path.join(self.directory.name, LEGACY_PROTOCOL_FILE)), 0) # only once
+        self.assertEqual(len(self.store), 2)
+
+    def testCompact(self):
+        parameters = {"0": 0.5, "1": 0.25}
+        entries = {"h1": protocolEntry("a_01.mid", "2024-01-01 10:00:00", parameters), "h2": protocolEntry("a_02.mid", "2024-01-02 10:00:00", parameters)}
+        with self.store.connection: # entries written before parameter sets were referenced
+            for hash_audio, entry in entries.items():
+                self.store.connection.execute("INSERT INTO entries (hash, entry) VALUES (?, ?)", (hash_audio, json.dumps(entry)))
+        self.assertEqual(self.store.compact(), 2)
+        self.assertEqual(self.store.compact(), 0)
+        self.assertEqual(self.store.parameterSets(), 1)
+        key = self.store.connection.execute("SELECT key FROM parameter_sets").fetchone()[0]
+        for hash_audio, entry in entries.items():
+            self.assertEqual(self.rows(hash_audio)[0][1]["plugin"]["parameters"], {"$ref": key})
+            self.assertEqual(self.store[hash_audio], entry)
+        exported = io.StringIO()
+        self.store.export(exported, "jsonl")
+        self.assertEqual([json.loads(i)["entry"]["plugin"]["parameters"] for i in exported.getvalue().splitlines()], [parameters, parameters])
+
+    def testRenderedTwice(self):
+        first = protocolEntry("a_01.mid", "2024-01-01 10:00:00")
+        second = protocolEntry("a_01.mid", "2024-01-02 10:00:00", {"0": 1.0})
+        self.store.add("h1", first)
+        self.store.add("h1", second)
+        self.assertEqual([i[0] for i in self.rows("h1")], [0, 1])
+        self.assertEqual(len(self.store), 1)
+        self.assertEqual(self.store["h1"], second)
+        self.assertEqual(list(self.store.items()), [["h1", second]])
+        self.assertEqual(self.store.count(midi_filename="a_01.mid"), 1)
+
+    def testExportFilters(self):
+        self.store.add("h1", protocolEntry("a_01.mid", "2024-01-01 10:00:00"))
+        self.store.add("h2", protocolEntry("a_02.mid", "2024-01-15 10:00:00"))
+        self.store.add("h3", protocolEntry("b_01.mid", "2024-02-01 10:00:00"))
+        self.assertEqual(self.store.count(midi_filename="a_*"), 2)
+        self.assertEqual(self.store.count(midi_filename="?_01.mid"), 2)
+        self.assertEqual(self.store.count(midi_filename="a_0[2-9].mid"), 1)
+        self.assertEqual(self.store.count(midi_filename="a_*.wav"), 0)
+        self.assertEqual([i[0] for i in self.store.query(since="2024-01-15")], ["h2", "h3"])
+        self.assertEqual([i[0] for i in self.store.query(before="2024-01-15")], ["h1"])
+        exported = io.StringIO()
+        self.assertEqual(self.store.export(exported, "csv", midi_filename="a_*", since="2024-01-10", before="2024-02-01"), 1)
+        rows = list(csv.DictReader(io.StringIO(exported.getvalue())))
+        self.assertEqual([[i["hash"], i["midi_filename"], i["hashalgorithm"]] for i in rows], [["h2", "a_02.mid", "md5"]])
+        with self.assertRaises(ValueError):
+            self.store.export(io.StringIO(), "xlsx")
+
+    def testHashAlgorithms(self):
+        self.assertEqual(self.store.hashAlgorithms(), [])
+        self.store.add("h1", protocolEntry("a_01.mid", "2024-01-01 10:00:00")) # entries without "hashalgorithm" are md5
+        self.store.add("h2", dict(protocolEntry("a_02.mid", "2024-01-02 10:00:00"), hashalgorithm="sha256"))
+        self.store.add("h3", dict(protocolEntry("a_03.mid", "2024-01-03 10:00:00"), hashalgorithm="md5"))
+        self.assertEqual(self.store.hashAlgorithms(), ["md5", "sha256"])
+
+    def testUpgrade(self): # the current flag & indexed columns added later are filled from the stored entries
+        self.store.close()
+        path = os.path.join(self.directory.name, "upgrade.sqlite")
+        entries = [["h1", dict(protocolEntry("a_01.mid", "2024-01-01 10:00:00"), hashalgorithm="sha256")],
+                   ["h2", protocolEntry("a_02.mid", "2024-01-02 10:00:00")], ["h2", protocolEntry("a_02.mid", "2024-01-03 10:00:00")]]
+        with sqlite3.connect(path) as connection: # protocol written before the indexed columns existed
+            connection.execute("CREATE TABLE entries (id INTEGER PRIMARY KEY AUTOINCREMENT, hash TEXT NOT NULL, entry TEXT NOT NULL)")
+            connection.executemany("INSERT INTO entries (hash, entry) VALUES (?, ?)", [[i, json.dumps(j)] for i, j in entries])
+        connection.close()
+        self.store = ProtocolStore(path)
+        self.assertEqual(self.store.hashAlgorithms(), ["md5", "sha256"])
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual(self.store["h2"], entries[2][1])
+        self.assertEqual([i[0] for i in self.store.query(midi_filename="a_02.mid")], ["h2"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+@description: Tests of the Parameter-Sweep (midiAuralize/sweep.py) and its shared protocol entries (ProtocolStore.sweepVariants)
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from midiAuralize.protocol import ProtocolStore, PROTOCOL_FILE
+try:
+    from midiAuralize.sweep import expandVariants, planJobs, variantName
+except ImportError: # the Render Core needs mido, dawdreamer & numpy, the planning tests are skipped without them
+    expandVariants = None
+
+def sweepEntry(instrument, variant, overrides): # protocol entry of a rendered sweep job
+    return {"filename": "a_01.wav", "created": "2024-01-01 10:00:00", "midi": {"filename": "a_01.mid", "hash": "m1", "tempo": 120.0},
+            "plugin": {"name": instrument, "version": "1.0.0.0", "parameters": dict({"Condition": 0.0}, **overrides)},
+            "sweep": {"variant": variant, "overrides": overrides}}
+
+@unittest.skipIf(expandVariants is None, "the Render Core can't be imported")
+class ExpandVariantsTest(unittest.TestCase):
+    def testDefault(self):
+        self.assertEqual(expandVariants({}), [{"name": "default", "overrides": {}}])
+
+    def testGrid(self):
+        variants = expandVariants({"grid": {"Condition": [0.0, 1.0], "Mic Position": [0.5]}})
+        self.assertEqual(variants, [{"name": "Condition=0.0_Mic-Position=0.5", "overrides": {"Condition": 0.0, "Mic Position": 0.5}},
+                                    {"name": "Condition=1.0_Mic-Position=0.5", "overrides": {"Condition": 1.0, "Mic Position": 0.5}}])
+
+    def testGridTimesList(self): # every listed variant is combined with every point of the grid, the grid overrides the list
+        variants = expandVariants({"grid": {"Condition": [0.0, 1.0]},
+                                   "variants": [{"name": "close", "parameters": {"Mic Position": 0.2, "Condition": 0.5}},
+                                                {"parameters": {"Mic Position": 0.9}}]})
+        self.assertEqual([i["name"] for i in variants], ["close_Condition=0.0", "close_Condition=1.0",
+                                                         "Mic-Position=0.9_Condition=0.0", "Mic-Position=0.9_Condition=1.0"])
+        self.assertEqual(variants[1]["overrides"], {"Mic Position": 0.2, "Condition": 1.0})
+
+    def testDuplicateNames(self):
+        with self.assertRaises(ValueError):
+            expandVariants({"variants": [{"name": "close", "parameters": {"Mic Position": 0.2}}, {"name": "close", "parameters": {"Mic Position": 0.3}}]})
+        with self.assertRaises(ValueError):
+            expandVariants({"variants": [{"parameters": {"Mic Position": 0.2}}, {"parameters": {"Mic Position": 0.2}}]})
+
+    def testVariantName(self): # valid folder name on Windows
+        self.assertEqual(variantName({"Reverb: Room/Hall": "a|b"}), "Reverb-Room-Hall=a-b")
+        self.assertEqual(len(variantName({"Condition": "x" * 200})), 120)
+
+    def testPlanJobs(self): # grouped by Instrument & variant, so parameters are only applied when the variant changes
+        variants = [{"name": "a", "overrides": {}}, {"name": "b", "overrides": {}}]
+        jobs = planJobs(["Piano", "Organ"], variants, 2)
+        self.assertEqual([[instrument, variant["name"], index] for instrument, variant, index in jobs],
+                         [["Piano", "a", 0], ["Piano", "a", 1], ["Piano", "b", 0], ["Piano", "b", 1],
+                          ["Organ", "a", 0], ["Organ", "a", 1], ["Organ", "b", 0], ["Organ", "b", 1]])
+        self.assertEqual(planJobs(["Piano"], variants, 0), [])
+
+class SweepVariantsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = ProtocolStore(os.path.join(self.directory.name, PROTOCOL_FILE))
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def variants(self, hash_audio): # [instrument, variant, parameters] of the variants listed by the entry of a hash
+        return [[i["instrument"], i["variant"], i["parameters"]] for i in self.store[hash_audio]["sweep"]["variants"]]
+
+    def testIdenticalAudio(self): # a variant without audible effect renders the same audio as another one
+        self.store.add("h1", sweepEntry("Piano", "close", {"Mic Position": 0.2}))
+        self.store.add("h1", sweepEntry("Piano", "far", {"Mic Position": 0.9}))
+        self.assertEqual(len(self.store), 1)
+        self.assertEqual(self.store["h1"]["sweep"]["variant"], "far")
+        self.assertEqual(self.variants("h1"), [["Piano", "close", {"Condition": 0.0, "Mic Position": 0.2}],
+                                               ["Piano", "far", {"Condition": 0.0, "Mic Position": 0.9}]])
+        self.assertEqual(self.store.parameterSets(), 2)
+
+    def testRenderedAgain(self): # the variant isn't listed twice, its record moves to the end
+        self.store.add("h1", sweepEntry("Piano", "close", {"Mic Position": 0.2}))
+        self.store.add("h1", sweepEntry("Piano", "far", {"Mic Position": 0.9}))
+        self.store.add("h1", sweepEntry("Piano", "close", {"Mic Position": 0.2}))
+        self.assertEqual([i[1] for i in self.variants("h1")], ["far", "close"])
+        self.store.add("h2", sweepEntry("Piano", "close", {"Mic Position": 0.2}))
+        self.store.add("h2", sweepEntry("Piano", "close", {"Mic Position": 0.2}))
+        self.assertNotIn("variants", self.store["h2"]["sweep"])
+
+    def testOtherInstrument(self): # variants of the same name are kept per Instrument
+        self.store.add("h1", sweepEntry("Piano", "close", {"Mic Position": 0.2}))
+        self.store.add("h1", sweepEntry("Organ", "close", {"Mic Position": 0.2}))
+        self.assertEqual([i[:2] for i in self.variants("h1")], [["Piano", "close"], ["Organ", "close"]])
+
+    def testWithoutSweep(self): # entries of regular renders aren't merged
+        entry = sweepEntry("Piano", "close", {})
+        del entry["sweep"]
+        self.store.add("h1", entry)
+        self.store.add("h1", sweepEntry("Piano", "far", {"Mic Position": 0.9}))
+        self.assertNotIn("variants", self.store["h1"]["sweep"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+@description: Tests of the Output-Format Engine (midiAuralize/formats.py) and the streaming .wav-Writer (midiAuralize/wav.py)
+"""
+import os
+import sys
+import wave
+import struct
+import hashlib
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+try:
+    import numpy as np
+    from midiAuralize.formats import SampleConverter
+    from midiAuralize.wav import WavWriter, WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT
+except ImportError: # the Render Core needs numpy, the tests are skipped without it
+    np = None
+
+def readChunks(path): # returns the RIFF size and {chunk id: [declared size, data]} of a .wav-File, checking the word alignment
+    with open(path, "rb") as file:
+        data = file.read()
+    riff, riff_size, wave_id = struct.unpack('<4sI4s', data[:12])
+    chunks = {}
+    position = 12
+    while position < len(data):
+        chunk_id, size = struct.unpack('<4sI', data[position:position+8])
+        chunks[chunk_id] = [size, data[position+8:position+8+size]]
+        position += 8 + size + size % 2
+    if [riff, wave_id, position] != [b'RIFF', b'WAVE', len(data)]:
+        raise ValueError(f"{path} isn't a valid RIFF/WAVE-File.")
+    return riff_size, chunks
+
+def readSamples(path): # reads a PCM .wav-File with the wave module, returns [sampwidth, samples (frames x channels) as integers]
+    with wave.open(path, "rb") as wav_file:
+        channels, sampwidth = wav_file.getnchannels(), wav_file.getsampwidth()
+        data = wav_file.readframes(wav_file.getnframes())
+    if sampwidth == 1:
+        samples = np.frombuffer(data, dtype=np.uint8).astype(np.int64) - 128
+    elif sampwidth == 3:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3).astype(np.int64)
+        samples = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        samples = np.where(samples >= 2**23, samples - 2**24, samples)
+    else:
+        samples = np.frombuffer(data, dtype='<i2' if sampwidth == 2 else '<i4').astype(np.int64)
+    return sampwidth, samples.reshape(-1, channels)
+
+@unittest.skipIf(np is None, "numpy isn't installed")
+class SampleConverterTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.audio = np.random.default_rng(1).uniform(-1, 1, (2, 1000)).astype(np.float32) # channels x frames
+        self.audio[:, :4] = [[1.0, -1.0, 1.5, -1.5], [0.0, 0.5, -0.5, 0.25]] # full scale & clipped samples
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def render(self, bitdepth, blocksize=256, dither=False): # converts & writes the audio block by block like the Render Core
+        path = os.path.join(self.directory.name, f"{bitdepth}{'_dither' if dither else ''}.wav")
+        converter = SampleConverter(bitdepth, self.audio.shape[0], blocksize, dither, seed=1)
+        with WavWriter(path, 44100, self.audio.shape[0], converter.sampwidth, self.audio.shape[1], format_tag=converter.format_tag,
+                       hasher=hashlib.md5()) as writer:
+            for start in range(0, self.audio.shape[1], blocksize):
+                writer.write(converter.convert(self.audio[:, start:start+blocksize]))
+        return path, converter
+
+    def expected(self, bitdepth): # samples (frames x channels) scaled to the bit depth, before rounding
+        max_val = 2**(bitdepth - 1) - 1
+        return np.clip(self.audio.T.astype(np.float64) * max_val, -max_val - 1, max_val)
+
+    def testPcmRoundTrip(self):
+        for bitdepth in [8, 16, 24, 32]:
+            with self.subTest(bitdepth=bitdepth):
+                path, converter = self.render(bitdepth)
+                sampwidth, samples = readSamples(path)
+                self.assertEqual([sampwidth, converter.format_tag], [bitdepth // 8, WAVE_FORMAT_PCM])
+                self.assertEqual(samples.shape, (1000, 2))
+                self.assertLessEqual(np.abs(samples - self.expected(bitdepth)).max(), 1)
+                self.assertEqual(samples[:4, 0].tolist(), [2**(bitdepth - 1) - 1, -(2**(bitdepth - 1) - 1), 2**(bitdepth - 1) - 1, -2**(bitdepth - 1)])
+
+    def testFloatRoundTrip(self):
+        path, converter = self.render("32f")
+        riff_size, chunks = readChunks(path)
+        self.assertEqual(struct.unpack('<HHIIHH', chunks[b'fmt '][1][:16]), (WAVE_FORMAT_IEEE_FLOAT, 2, 44100, 44100 * 8, 8, 32))
+        self.assertEqual(struct.unpack('<I', chunks[b'fact'][1])[0], 1000)
+        samples = np.frombuffer(chunks[b'data'][1], dtype='<f4').reshape(-1, 2)
+        np.testing.assert_array_equal(samples, self.audio.T) # not clipped
+
+    def testDither(self):
+        samples = readSamples(self.render(16, dither=True)[0])[1]
+        self.assertFalse(np.array_equal(samples, readSamples(self.render(16)[0])[1]))
+        self.assertLessEqual(np.abs(samples - self.expected(16)).max(), 1.5) # TPDF: +-1 LSB before rounding
+        self.assertFalse(SampleConverter("32", 2, 256, dither=True).dither)
+
+@unittest.skipIf(np is None, "numpy isn't installed")
+class WavWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "out.wav")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testChunkedWrite(self): # header sizes are declared in advance, blocks of any size (arrays or bytes) fill the data chunk
+        samples = np.arange(-500, 500, dtype='<i2').reshape(-1, 2)
+        with WavWriter(self.path, 48000, 2, 2, samples.shape[0]) as writer:
+            writer.write(samples[:1])
+            writer.write(samples[1:300])
+            writer.write(samples[300:].tobytes())
+        riff_size, chunks = readChunks(self.path)
+        self.assertEqual(riff_size, os.path.getsize(self.path) - 8)
+        self.assertEqual(chunks[b'data'][0], samples.nbytes)
+        self.assertEqual(chunks[b'data'][1], samples.tobytes())
+        with wave.open(self.path, "rb") as wav_file:
+            self.assertEqual([wav_file.getnchannels(), wav_file.getsampwidth(), wav_file.getframerate(), wav_file.getnframes()], [2, 2, 48000, 500])
+
+    def testOddDataSize(self): # 8-bit mono with an odd number of frames gets a pad byte
+        with WavWriter(self.path, 44100, 1, 1, 3, hasher=hashlib.sha256()) as writer:
+            writer.write(np.array([[0], [128], [255]], dtype=np.uint8))
+        riff_size, chunks = readChunks(self.path)
+        self.assertEqual(chunks[b'data'][0], 3)
+        self.assertEqual(os.path.getsize(self.path), 44 + 3 + 1)
+        self.assertEqual(riff_size, os.path.getsize(self.path) - 8)
+
+    def testStreamedHash(self):
+        for bitdepth, frames in [[16, 1000], [8, 7]]:
+            with self.subTest(bitdepth=bitdepth):
+                with WavWriter(self.path, 44100, 1, bitdepth // 8, frames, hasher=hashlib.sha256()) as writer:
+                    writer.write(np.zeros((frames, 1), dtype=np.uint8 if bitdepth == 8 else '<i2'))
+                with open(self.path, "rb") as file:
+                    self.assertEqual(writer.hexdigest(), hashlib.sha256(file.read()).hexdigest())
+
+    def testFrameCountMismatch(self):
+        writer = WavWriter(self.path, 44100, 2, 2, 100)
+        writer.write(np.zeros((99, 2), dtype='<i2'))
+        with self.assertRaises(ValueError):
+            writer.close()
+        self.assertTrue(writer.file.closed)
+
+if __name__ == "__main__":
+    unittest.main()